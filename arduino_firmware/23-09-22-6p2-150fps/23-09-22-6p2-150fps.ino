@@ -10,6 +10,14 @@
 
 const int SERIAL_START_DELAY = 100;
 
+// Set to 1 to send input events as 16 byte binary records instead of
+// "input: ..." text lines (acquire_video(..., serial_protocol="binary")).
+// See multicamera_acquisition/interfaces/serial_protocol.py for the layout.
+#define BINARY_INPUT_EVENTS 0
+const byte EVENT_SYNC_0 = 0xA5;
+const byte EVENT_SYNC_1 = 0x5A;
+const byte EVENT_PROTOCOL_VERSION = 1;
+
 // HARDCODED PINS
 
 // LED trigger pins
@@ -97,8 +105,34 @@ int done = 0;
 int input_state[4] = {0, 0, 0, 0};
 int input_state_prev[4] = {0, 0, 0, 0};
 
-// check if input pins have flipped and print to serial
-// TODO: make this use Serial.write(), which will be much faster.
+// send the input pin states as a binary record
+void writeInputEvent(unsigned long current_cycle)
+{
+    byte record[16];
+    uint32_t pulse_id = current_cycle;
+    uint32_t arduino_ms = millis();
+    uint16_t states = 0;
+    for (int pin_i = 0; pin_i < num_input; pin_i++)
+    {
+        states |= (input_state[pin_i] & 1) << pin_i;
+    }
+    record[0] = EVENT_SYNC_0;
+    record[1] = EVENT_SYNC_1;
+    record[2] = EVENT_PROTOCOL_VERSION;
+    record[3] = num_input;
+    memcpy(&record[4], &pulse_id, 4); // little endian, like the host
+    memcpy(&record[8], &arduino_ms, 4);
+    memcpy(&record[12], &states, 2);
+    uint16_t checksum = 0;
+    for (int i = 2; i < 14; i++)
+    {
+        checksum += record[i];
+    }
+    memcpy(&record[14], &checksum, 2);
+    Serial.write(record, 16);
+}
+
+// check if input pins have flipped and send them to serial
 void checkInputPins(int current_cycle)
 {
     bool state_change = false;
@@ -115,6 +149,10 @@ void checkInputPins(int current_cycle)
     // compare the buttonState to its previous state
     if (state_change == true)
     {
+#if BINARY_INPUT_EVENTS
+        writeInputEvent(current_cycle);
+        return;
+#endif
         Serial.print("input: ");
         for (int pin_i = 0; pin_i < 4; pin_i++)
         {
@@ -1,13 +1,30 @@
-from multicamera_acquisition.interfaces import get_camera
+from multicamera_acquisition.interfaces import (
+    CACHED_BRANDS,
+    get_camera,
+    get_device_cache,
+    resolve_device_indices,
+)
 from multicamera_acquisition.video_io_ffmpeg import write_frame
 from multicamera_acquisition.paths import ensure_dir
 from multicamera_acquisition.interfaces.arduino import (
     packIntAsLong,
     wait_for_serial_confirmation,
-    find_serial_ports,
+    SerialReader,
+    find_arduino,
+    DEFAULT_PORT_CACHE,
 )
-from multicamera_acquisition.visualization import MultiDisplay
 from multicamera_acquisition.writer import Writer
+from multicamera_acquisition.ring_buffer import SharedMemoryRingBuffer
+from multicamera_acquisition.tracing import FrameTracer, ACQUISITION_STAGES
+from multicamera_acquisition.drop_monitor import DropCounters
+from multicamera_acquisition.trigger_data import TriggerDataLogger
+from multicamera_acquisition.memory_budget import BudgetedQueue, MemoryBudget
+from multicamera_acquisition.session_metadata import update_session_metadata
+from multicamera_acquisition.affinity import (
+    apply_process_settings,
+    log_process_layout,
+    plan_affinity,
+)
 
 import multiprocessing as mp
 import csv
@@ -20,11 +37,21 @@ import logging
 from tqdm import tqdm
 import numpy as np
 import sys
+import os
+import queue
+import threading
 
 import serial
 from pathlib import Path
 from multicamera_acquisition.video_io_ffmpeg import count_frames
 
+# brands that return (depth, ir, timestamp) and get a second (depth) writer
+AZURE_BRANDS = ["azure", "synthetic_azure"]
+# brands that generate frames without a camera SDK
+SYNTHETIC_BRANDS = ["synthetic", "synthetic_azure"]
+# seconds to wait for a free ring buffer slot before checking for a stop again
+RESERVE_TIMEOUT_S = 0.5
+
 
 class AcquisitionLoop(mp.Process):
     """A process that acquires images from a camera and writes them to a queue."""
@@ -40,12 +67,17 @@ class AcquisitionLoop(mp.Process):
         dropped_frame_warnings=False,
         write_queue_depth=None,
         cam=None,
+        trace_file=None,
+        cpu_affinity=None,
+        realtime_priority=None,
+        nice=None,
+        grab_mode="poll",
         **camera_params,
     ):
         """
         Parameters
         ----------
-        write_queue : multiprocessing.Queue
+        write_queue : multiprocessing.Queue or SharedMemoryRingBuffer
             A queue to which frames will be written.
         display_queue : multiprocessing.Queue
             A queue from which frames will be read for display.
@@ -59,6 +91,24 @@ class AcquisitionLoop(mp.Process):
             The number of frames to skip between displaying frames.
         dropped_frame_warnings: bool
             Whether to issue a warning when frame grabbing times out
+        write_queue_depth : multiprocessing.Queue or SharedMemoryRingBuffer
+            A queue to which depth frames will be written (azure only).
+        trace_file : str or Path (default: None)
+            If not None, per-frame grab and enqueue times are written to this
+            file (see tracing.py).
+        cpu_affinity : list of int or str (default: None)
+            If not None, the cpus the loop (and the camera SDK threads it
+            starts) run on.
+        realtime_priority : int (default: None)
+            If not None, grab with SCHED_FIFO scheduling at this priority.
+        nice : int (default: None)
+            If not None, the niceness of the loop (see affinity.py).
+        grab_mode : str (default: 'poll')
+            'poll' waits for each frame with `get_array`. 'callback' has the
+            camera SDK push each frame to the queues from its own thread as
+            it arrives (see `BaseCamera.start_callback`), falling back to
+            polling for cameras without a callback mode. Frames are numbered
+            the same way in both modes (see `_enqueue`).
         **camera_params
             Keyword arguments to pass to the camera interface.
         """
@@ -67,6 +117,21 @@ class AcquisitionLoop(mp.Process):
         self.ready = mp.Event()
         self.primed = mp.Event()
         self.stopped = mp.Event()
+        # set by `drain`, and by the child process once it has drained
+        self.draining = mp.Event()
+        self.drained = mp.Event()
+        self.expected_frames = mp.Value("q", -1, lock=False)
+        self.drain_idle_s = mp.Value("d", 1.0, lock=False)
+        self.drain_requested = mp.Value("d", 0.0, lock=False)
+        # frames grabbed so far and time.monotonic() of the last one
+        self.frames_grabbed = mp.Value("q", 0, lock=False)
+        self.last_frame_time = mp.Value("d", 0.0, lock=False)
+        # seconds spent initializing the camera, set by the child process
+        self.init_duration = mp.Value("d", float("nan"))
+        # the camera's stream statistics, sent by the child process at the end
+        self._stream_stats_recv, self._stream_stats_send = mp.Pipe(duplex=False)
+        # the device cache counters of the child process, sent once the camera is open
+        self._device_cache_recv, self._device_cache_send = mp.Pipe(duplex=False)
         self.write_queue = write_queue
         self.display_queue = display_queue
         self.camera_params = camera_params
@@ -77,35 +142,140 @@ class AcquisitionLoop(mp.Process):
         self.dropped_frame_warnings = dropped_frame_warnings
         self.write_queue_depth = write_queue_depth
         self.cam = cam
+        self.trace_file = trace_file
+        self.cpu_affinity = cpu_affinity
+        self.realtime_priority = realtime_priority
+        self.nice = nice
+        if grab_mode not in ["poll", "callback"]:
+            raise ValueError("grab_mode must be 'poll' or 'callback'")
+        self.grab_mode = grab_mode
 
     def stop(self):
         self.stopped.set()
 
+    def drain(self, expected_frames=None, idle_s=1.0):
+        """Finish once the remaining frames have been grabbed.
+
+        The loop stops (and sets `drained`) once it has grabbed
+        `expected_frames` frames in total, or once no frame has arrived for
+        `idle_s` seconds.
+
+        Parameters
+        ----------
+        expected_frames : int (default: None)
+            Frames the camera is expected to deliver (e.g. the number of
+            triggers). If None, the loop stops once it is idle.
+        idle_s : float (default: 1.0)
+            Seconds without a frame after which the loop is idle.
+        """
+        self.expected_frames.value = -1 if expected_frames is None else expected_frames
+        self.drain_idle_s.value = idle_s
+        self.drain_requested.value = time.monotonic()
+        self.draining.set()
+
+    def _is_drained(self):
+        expected_frames = self.expected_frames.value
+        if expected_frames >= 0 and self.frames_grabbed.value >= expected_frames:
+            return True
+        last_activity = max(self.last_frame_time.value, self.drain_requested.value)
+        return time.monotonic() - last_activity > self.drain_idle_s.value
+
     def prime(self):
         self.ready.clear()
         self.primed.set()
 
-    def run(self):
-        """Acquire frames. This is run when mp.Process.start() is called.
+    def get_stream_stats(self, timeout=0):
+        """The camera SDK's stream statistics, reported when the loop ends.
+
+        Returns
+        -------
+        stats : dict or None
+            See `BaseCamera.stream_stats`. None if the loop has not ended,
+            or the camera has no statistics.
         """
+        if self._stream_stats_recv.poll(timeout):
+            self.stream_stats = self._stream_stats_recv.recv()
+        return getattr(self, "stream_stats", None)
+
+    def get_device_cache_stats(self, timeout=0):
+        """The device cache counters of the loop's process, once its camera
+        is open (see `DeviceCache.stats`).
+
+        Returns
+        -------
+        stats : dict or None
+            None if the camera is not open yet, or its brand has no cache.
+        """
+        if self._device_cache_recv.poll(timeout):
+            self.device_cache_stats = self._device_cache_recv.recv()
+        return getattr(self, "device_cache_stats", None)
+
+    def _report_stream_stats(self, cam):
+        """Log the camera's stream statistics and send them to the main process."""
+        name = self.camera_params["name"]
+        try:
+            stats = cam.stream_stats()
+        except NotImplementedError:
+            stats = None
+        except Exception as e:
+            logging.log(logging.WARNING, f"{name}: could not read stream stats: {e}")
+            stats = None
+        if stats is not None:
+            message = f"{name} stream: " + ", ".join(f"{k} {v}" for k, v in stats.items())
+            losses = ["failed_buffers", "buffer_underruns", "lost_frames", "dropped_frames"]
+            if any(stats.get(key, 0) > 0 for key in losses):
+                logging.log(logging.WARNING, message)
+            else:
+                logging.log(logging.INFO, message)
+        self._stream_stats_send.send(stats)
 
-        # get the camera if it hasn't been passed in (e.g. for azure)
-        if self.cam is None:
-            try:
-                cam = get_camera(brand=self.brand, **self.camera_params)
-            except Exception as e:
-                logging.log(logging.ERROR, f"{self.brand}:{e}")
-                raise e
-        else:
-            cam = self.cam
-        self.ready.set()  # report to the main loop that the camera is ready
-        self.primed.wait()  # wait until the main loop is ready to start
+    def _enqueue(self, data, current_frame, copy_for_display=False):
+        """Put a grabbed frame on the write (and display) queues.
 
-        # tell the camera to start grabbing
-        cam.start()
-        # once the camera is started grabbing, allow the main
-        # process to continue
-        self.ready.set()  # report to the main loop that the camera is ready
+        Parameters
+        ----------
+        data : tuple
+            (img, camera_timestamp), or (depth, ir, camera_timestamp) for
+            azure cameras.
+        current_frame : int
+            The frame index (frame_id in the metadata): the number of frames
+            the camera delivered before this one, in either grab mode.
+            Timeouts do not advance it; frames the camera lost show up as
+            gaps in the camera timestamps (see drop_monitor.py).
+        copy_for_display : bool (default: False)
+            Copy the image before it is sent to the display, as the write
+            queue may reuse its memory.
+        """
+        self.frames_grabbed.value += 1
+        self.last_frame_time.value = time.monotonic()
+        # if this is an azure camera, we write the depth data to a separate queue
+        if self.brand in AZURE_BRANDS:
+            depth, ir, camera_timestamp = data
+
+            self.write_queue.put(tuple([ir, camera_timestamp, current_frame]))
+            self.write_queue_depth.put(tuple([depth, camera_timestamp, current_frame]))
+            if self.display_frames:
+                if current_frame % self.display_frequency == 0:
+                    self.display_queue.put(
+                        tuple([depth, camera_timestamp, current_frame])
+                    )
+        else:
+            data = data + tuple([current_frame])
+            self.write_queue.put(data)
+            if self.display_frames:
+                if current_frame % self.display_frequency == 0:
+                    if copy_for_display and data[0] is not None:
+                        data = (data[0].copy(),) + data[1:]
+                    self.display_queue.put(data)
+
+    def _grab_with_polling(self, cam, tracer):
+        """Grab frames by waiting on the camera, until stopped or drained."""
+        # if the write queue is a ring buffer, frames are grabbed straight into
+        # its slots once the frame shape is known (from the first frame)
+        grab_into_queue = (
+            hasattr(self.write_queue, "reserve") and self.brand not in AZURE_BRANDS
+        )
+        frame_layout = None
 
         current_frame = 0
         initialized = False
@@ -115,36 +285,49 @@ class AcquisitionLoop(mp.Process):
                 # logging.debug(
                 #    f"Getting frame, camera, {self.camera_params['name']}, current frame: {current_frame}"
                 # )
-                if initialized:
-                    data = cam.get_array(timeout=self.frame_timeout, get_timestamp=True)
+                # if this is the first frame, give time for serial to connect
+                timeout = (
+                    self.frame_timeout
+                    if initialized or self.draining.is_set()
+                    else 10000
+                )
+                if tracer is not None:
+                    t_grab_start = time.monotonic_ns()
+                if frame_layout is not None:
+                    # a stalled or dead writer must not keep this loop from
+                    # seeing that it was stopped or is draining
+                    try:
+                        out = self.write_queue.reserve(
+                            *frame_layout, timeout=RESERVE_TIMEOUT_S
+                        )
+                    except queue.Full:
+                        logging.log(
+                            logging.DEBUG, f"{self.brand}: no free ring buffer slot"
+                        )
+                        data = ()
+                    else:
+                        data = cam.get_array(
+                            timeout=timeout, get_timestamp=True, out=out
+                        )
                 else:
-                    # if this is the first frame, give time for serial to connect
-                    data = cam.get_array(timeout=10000, get_timestamp=True)
+                    data = cam.get_array(timeout=timeout, get_timestamp=True)
+                    if grab_into_queue and len(data) != 0 and data[0] is not None:
+                        frame_layout = (data[0].shape, data[0].dtype)
                 # logging.debug(
                 #    f"Got frame, camera, {self.camera_params['name']}, current frame: {current_frame}"
                 # )
+                if tracer is not None:
+                    t_grab = time.monotonic_ns()
                 if len(data) != 0:
-                    # if this is an azure camera, we write the depth data to a separate queue
-                    if self.brand == "azure":
-                        depth, ir, camera_timestamp = data
-
-                        self.write_queue.put(
-                            tuple([ir, camera_timestamp, current_frame])
-                        )
-                        self.write_queue_depth.put(
-                            tuple([depth, camera_timestamp, current_frame])
+                    # the ring buffer slot is reused once the writer is done with it
+                    self._enqueue(
+                        data, current_frame, copy_for_display=frame_layout is not None
+                    )
+                    if tracer is not None:
+                        tracer.record(
+                            current_frame, t_grab_start, t_grab, time.monotonic_ns()
                         )
-                        if self.display_frames:
-                            if current_frame % self.display_frequency == 0:
-                                self.display_queue.put(
-                                    tuple([depth, camera_timestamp, current_frame])
-                                )
-                    else:
-                        data = data + tuple([current_frame])
-                        self.write_queue.put(data)
-                        if self.display_frames:
-                            if current_frame % self.display_frequency == 0:
-                                self.display_queue.put(data)
+                    current_frame += 1
                 initialized = True
 
             except Exception as e:
@@ -167,17 +350,136 @@ class AcquisitionLoop(mp.Process):
             # logging.debug(
             #    f"finished loop, {self.camera_params['name']}, current frame: {current_frame}, stopped: {self.stopped.is_set()}"
             # )
-            current_frame += 1
+
+            if self.draining.is_set() and self._is_drained():
+                self.drained.set()
+                break
+
+    def _grab_with_callback(self, cam, tracer):
+        """Grab frames delivered by the camera SDK, until stopped or drained.
+
+        Frames are put on the queues from the SDK's callback thread as they
+        arrive. This thread only waits to be stopped, and checks whether the
+        loop has drained.
+
+        Returns
+        -------
+        grabbed : bool
+            False if the camera has no callback mode (and nothing was
+            grabbed).
+        """
+        # frames are copied once: into the ring buffer slot by `put`, or
+        # out of the SDK buffer, which is reused once the callback returns
+        copy_into_queue = hasattr(self.write_queue, "reserve")
+        lock = threading.Lock()
+        state = {"accepting": True, "current_frame": 0, "error": None}
+        finished = threading.Event()
+
+        def on_frame(img, camera_timestamp):
+            t_grab = time.monotonic_ns()
+            with lock:
+                if not state["accepting"]:
+                    return
+                try:
+                    if img is not None and not copy_into_queue:
+                        img = np.array(img)
+                    current_frame = state["current_frame"]
+                    self._enqueue(
+                        (img, camera_timestamp),
+                        current_frame,
+                        copy_for_display=copy_into_queue,
+                    )
+                    if tracer is not None:
+                        tracer.record(
+                            current_frame, t_grab, t_grab, time.monotonic_ns()
+                        )
+                    state["current_frame"] += 1
+                except Exception as e:
+                    state["error"] = e
+                    state["accepting"] = False
+                    finished.set()
+
+        try:
+            cam.start_callback(on_frame)
+        except NotImplementedError:
+            logging.log(
+                logging.WARNING,
+                f"{self.brand} cameras have no callback mode, polling instead",
+            )
+            return False
+        self.ready.set()  # report to the main loop that the camera is ready
+
+        while not (self.stopped.is_set() or finished.is_set()):
+            if self.draining.is_set() and self._is_drained():
+                self.drained.set()
+                break
+            self.stopped.wait(0.05)
+
+        # no frames are queued after the stop signal
+        with lock:
+            state["accepting"] = False
+        cam.stop_callback()
+        if state["error"] is not None:
+            raise state["error"]
+        return True
+
+    def run(self):
+        """Acquire frames. This is run when mp.Process.start() is called.
+        """
+
+        # pin before the camera is opened, so that SDK threads are pinned too
+        apply_process_settings(
+            cpu_affinity=self.cpu_affinity,
+            realtime_priority=self.realtime_priority,
+            nice=self.nice,
+        )
+
+        # get the camera if it hasn't been passed in (e.g. for azure)
+        init_start = time.perf_counter()
+        if self.cam is None:
+            try:
+                cam = get_camera(brand=self.brand, **self.camera_params)
+            except Exception as e:
+                logging.log(logging.ERROR, f"{self.brand}:{e}")
+                raise e
+        else:
+            cam = self.cam
+        self.init_duration.value = time.perf_counter() - init_start
+        if self.brand in CACHED_BRANDS:
+            self._device_cache_send.send(get_device_cache(self.brand).stats())
+        self.ready.set()  # report to the main loop that the camera is ready
+        self.primed.wait()  # wait until the main loop is ready to start
+
+        tracer = None
+        if self.trace_file is not None:
+            tracer = FrameTracer(self.trace_file, ACQUISITION_STAGES)
+
+        grabbed_with_callback = False
+        if self.grab_mode == "callback" and self.brand not in AZURE_BRANDS:
+            grabbed_with_callback = self._grab_with_callback(cam, tracer)
+        if not grabbed_with_callback:
+            # tell the camera to start grabbing
+            cam.start()
+            # once the camera is started grabbing, allow the main
+            # process to continue
+            self.ready.set()  # report to the main loop that the camera is ready
+            self._grab_with_polling(cam, tracer)
 
         logging.debug(f"Writing empties to queue, {self.camera_params['name']}")
 
-        if self.brand == "azure":
+        if self.brand in AZURE_BRANDS:
             self.write_queue_depth.put(tuple())
 
         self.write_queue.put(tuple())
         if self.display_frames:
             self.display_queue.put(tuple())
 
+        if tracer is not None:
+            tracer.close()
+
+        if cam is not None:
+            self._report_stream_stats(cam)
+
         logging.log(logging.INFO, f"Closing camera {self.camera_params['name']}")
         if cam is not None:
             cam.close()
@@ -185,47 +487,322 @@ class AcquisitionLoop(mp.Process):
         logging.debug(f"Acquisition run finished, {self.camera_params['name']}")
 
 
-def end_processes(acquisition_loops, writers, disp, writer_timeout=60):
-    # end acquisition loops
+def drain_acquisition_loops(
+    acquisition_loops, expected_frames, idle_s=1.0, timeout=30, poll_interval=0.05
+):
+    """Wait for acquisition loops to grab the frames that are still coming.
+
+    Each loop stops on its own once it has grabbed its expected number of
+    frames or gone idle (see `AcquisitionLoop.drain`).
+
+    Parameters
+    ----------
+    acquisition_loops : list of AcquisitionLoop
+    expected_frames : dict
+        Frames expected from each camera, keyed by camera name. Cameras that
+        are missing stop once idle.
+    idle_s : float (default: 1.0)
+        Seconds without a frame after which a camera is done.
+    timeout : float (default: 30)
+        Maximum seconds to wait for all cameras.
+    poll_interval : float (default: 0.05)
+        Seconds between checks on the acquisition loops.
+
+    Returns
+    -------
+    drain_time : float
+        Seconds spent waiting.
+    """
+    start = time.monotonic()
+    for acquisition_loop in acquisition_loops:
+        acquisition_loop.drain(
+            expected_frames.get(acquisition_loop.camera_params["name"]), idle_s
+        )
+    deadline = start + timeout
+    while time.monotonic() < deadline:
+        if all(
+            loop.drained.is_set() or not loop.is_alive() for loop in acquisition_loops
+        ):
+            break
+        time.sleep(poll_interval)
+
+    drain_time = time.monotonic() - start
+    for acquisition_loop in acquisition_loops:
+        name = acquisition_loop.camera_params["name"]
+        expected = expected_frames.get(name)
+        grabbed = acquisition_loop.frames_grabbed.value
+        if not acquisition_loop.drained.is_set() and acquisition_loop.is_alive():
+            status = f"still grabbing after {timeout} s"
+        elif expected is not None and grabbed >= expected:
+            status = "all expected frames grabbed"
+        else:
+            status = "idle"
+        logging.log(
+            logging.INFO,
+            f"{name}: {grabbed}/{expected} frames grabbed, {status}",
+        )
+    logging.log(logging.INFO, f"Acquisition loops drained in {drain_time:.2f} s")
+    return drain_time
+
+
+def end_processes(
+    acquisition_loops, writers, disp, writer_timeout=60, loop_timeout=5, poll_interval=0.05
+):
+    """Stop acquisition loops, then wait for the writers to finish their files.
+
+    Parameters
+    ----------
+    acquisition_loops : list of AcquisitionLoop
+    writers : list of Writer
+    disp : MultiDisplay or None
+    writer_timeout : float (default: 60)
+        Give up on the writers once none of them has written a frame for
+        this many seconds. Writers that are still writing are waited for.
+    loop_timeout : float (default: 5)
+        Seconds to wait for the acquisition loops to exit before they are
+        terminated.
+    poll_interval : float (default: 0.05)
+        Seconds between checks on the processes.
+
+    Returns
+    -------
+    timings : dict
+        Seconds spent on each stage ('acquisition_loops', 'writers',
+        'display').
+    """
+    timings = {}
+
+    # end acquisition loops, all at once
+    start = time.monotonic()
     for acquisition_loop in acquisition_loops:
         if acquisition_loop.is_alive():
             logging.log(
                 logging.DEBUG,
                 f"stopping acquisition loop ({acquisition_loop.camera_params['name']})",
             )
-            # stop writinacquire_videog
             acquisition_loop.stop()
-            # kill thread
-            logging.log(
-                logging.DEBUG,
-                f"joining acquisition loop ({acquisition_loop.camera_params['name']})",
-            )
-            acquisition_loop.join(timeout=1)
+    deadline = start + loop_timeout
+    for acquisition_loop in acquisition_loops:
+        if acquisition_loop.is_alive():
+            acquisition_loop.join(timeout=max(0, deadline - time.monotonic()))
             # kill if necessary
             if acquisition_loop.is_alive():
-                # debug: notify user we had to terminate the acq loop
-                logging.debug("Terminating acquisition loop (join timed out)")
+                logging.log(
+                    logging.WARNING,
+                    f"Terminating acquisition loop "
+                    f"({acquisition_loop.camera_params['name']}), join timed out",
+                )
                 acquisition_loop.terminate()
-
-    # end writers
+    timings["acquisition_loops"] = time.monotonic() - start
+
+    # end writers, once each has written its queue and closed its files
+    start = time.monotonic()
+    frames_written = sum(writer.frames_written.value for writer in writers)
+    deadline = start + writer_timeout
+    while time.monotonic() < deadline:
+        if all(
+            writer.finalized.is_set() or not writer.is_alive() for writer in writers
+        ):
+            break
+        time.sleep(poll_interval)
+        # keep waiting as long as frames are being written
+        written = sum(writer.frames_written.value for writer in writers)
+        if written != frames_written:
+            frames_written = written
+            deadline = time.monotonic() + writer_timeout
     for writer in writers:
-        if writer.is_alive():
-            #     # wait to finish writing
-            #     while writer.queue.qsize() > 0:
-            #         print(writer.queue.qsize())
-            #         time.sleep(0.1)
-            writer.join(timeout=writer_timeout)
-
-    # Debug: printer the writer's exitcode
-    logging.debug(f"Writer exitcode: {writer.exitcode}")
+        if writer.finalized.is_set():
+            writer.join(timeout=max(1, poll_interval))
+        elif writer.is_alive():
+            logging.log(
+                logging.WARNING,
+                f"Writer ({writer.camera_name}) has not finished after "
+                f"{writer_timeout} s without progress",
+            )
+        logging.debug(f"Writer exitcode: {writer.exitcode}")
+    timings["writers"] = time.monotonic() - start
 
     # end display
+    start = time.monotonic()
     if disp is not None:
         # TODO figure out why display.join hangs when there is >1 azure
         if disp.is_alive():
             disp.join(timeout=1)
         if disp.is_alive():
             disp.terminate()
+    timings["display"] = time.monotonic() - start
+
+    logging.log(
+        logging.INFO,
+        "Shutdown: "
+        + ", ".join(f"{stage} {seconds:.2f} s" for stage, seconds in timings.items()),
+    )
+    return timings
+
+
+def initialize_acquisition_loops(acquisition_loops, init_timeout=60, poll_interval=0.05):
+    """Start acquisition loops and wait until their cameras are initialized.
+
+    Each camera is initialized in its own AcquisitionLoop process, so cameras
+    are initialized concurrently. All FLIR cameras are initialized before any
+    other camera is started, because the Basler SDK has to be initialized
+    after PySpin.
+
+    Parameters
+    ----------
+    acquisition_loops : list of AcquisitionLoop
+        Acquisition loops that have not been started yet.
+    init_timeout : float (default: 60)
+        Seconds to wait for each group of cameras to initialize.
+    poll_interval : float (default: 0.05)
+        Seconds between checks on the acquisition loops.
+
+    Returns
+    -------
+    init_times : dict
+        Seconds taken to initialize each camera, keyed by camera name.
+
+    Raises
+    ------
+    RuntimeError
+        If any camera fails to initialize or times out. The message lists
+        each failed camera. Later groups are not started after a failure.
+    """
+    groups = [
+        [loop for loop in acquisition_loops if loop.brand == "flir"],
+        [loop for loop in acquisition_loops if loop.brand != "flir"],
+    ]
+    init_times = {}
+    failed = []
+    for group in groups:
+        for acquisition_loop in group:
+            acquisition_loop.start()
+
+        pending = list(group)
+        deadline = time.perf_counter() + init_timeout
+        while len(pending) > 0:
+            for acquisition_loop in list(pending):
+                name = acquisition_loop.camera_params["name"]
+                if acquisition_loop.ready.is_set():
+                    init_times[name] = acquisition_loop.init_duration.value
+                    logging.info(
+                        f"Initialized {name} "
+                        f"({acquisition_loop.camera_params.get('serial')}) "
+                        f"in {init_times[name]:.2f}s"
+                    )
+                    pending.remove(acquisition_loop)
+                elif not acquisition_loop.is_alive():
+                    failed.append(
+                        f"{name} ({acquisition_loop.camera_params.get('serial')}): "
+                        f"exited with code {acquisition_loop.exitcode}"
+                    )
+                    pending.remove(acquisition_loop)
+            if time.perf_counter() > deadline:
+                for acquisition_loop in pending:
+                    failed.append(
+                        f"{acquisition_loop.camera_params['name']} "
+                        f"({acquisition_loop.camera_params.get('serial')}): "
+                        f"not ready after {init_timeout}s"
+                    )
+                break
+            if len(pending) > 0:
+                time.sleep(poll_interval)
+
+        if len(failed) > 0:
+            raise RuntimeError(
+                "Cameras failed to initialize (see log for details):\n  "
+                + "\n  ".join(failed)
+            )
+
+    return init_times
+
+
+def create_write_queue(
+    transport="queue",
+    max_frame_bytes=1920 * 1200 * 2,
+    ring_buffer_slots=32,
+    memory_budget=None,
+    camera_name=None,
+    queue_policy="block",
+):
+    """Create the queue that carries frames from an AcquisitionLoop to a Writer.
+
+    Parameters
+    ----------
+    transport : str (default: 'queue')
+        'queue' for a multiprocessing.Queue, which pickles every frame, or
+        'shared_memory' for a SharedMemoryRingBuffer, which copies each frame
+        once into a preallocated shared memory slot.
+    max_frame_bytes : int (default: 1920 * 1200 * 2)
+        The largest frame (in bytes) the ring buffer must hold.
+    ring_buffer_slots : int (default: 32)
+        The number of frames the ring buffer can hold.
+    memory_budget : MemoryBudget (default: None)
+        If not None, frames in a 'queue' are charged to this budget (ring
+        buffers are allocated up front, and already bounded).
+    camera_name : str (default: None)
+        The camera the frames are charged to.
+    queue_policy : str (default: 'block')
+        What to do when the budget is full (see memory_budget.py).
+
+    Returns
+    -------
+    write_queue : multiprocessing.Queue, BudgetedQueue or SharedMemoryRingBuffer
+    """
+    if transport == "queue":
+        if memory_budget is not None:
+            return BudgetedQueue(memory_budget, camera_name, policy=queue_policy)
+        return mp.Queue()
+    elif transport == "shared_memory":
+        return SharedMemoryRingBuffer(slot_bytes=max_frame_bytes, n_slots=ring_buffer_slots)
+    else:
+        raise ValueError("transport must be 'queue' or 'shared_memory'")
+
+
+def release_write_queues(write_queues):
+    """Free the shared memory held by any ring buffer write queues."""
+    for write_queue in write_queues:
+        if isinstance(write_queue, SharedMemoryRingBuffer):
+            write_queue.unlink()
+
+
+def handle_serial_event(event, trigger_logger, verbose=False):
+    """Handle an event from the arduino's SerialReader.
+
+    Input events are logged to the trigger data file (malformed ones are
+    counted), other lines are printed.
+
+    Returns
+    -------
+    finished : bool
+        Whether the arduino reported that it has finished.
+
+    Raises
+    ------
+    serial.SerialException
+        If the serial connection failed.
+    """
+    if event.kind == "input":
+        trigger_logger.log(
+            event.pulse_id, event.arduino_ms, event.states, event.host_monotonic_ns
+        )
+        return False
+    if event.kind == "input_batch":
+        trigger_logger.log_batch(
+            event.pulse_id, event.arduino_ms, event.states, event.host_monotonic_ns
+        )
+        return False
+    if event.kind == "malformed":
+        trigger_logger.n_malformed += 1
+        logging.log(logging.WARNING, f"Malformed line from the arduino: {event.text!r}")
+        return False
+    if event.kind == "error":
+        raise serial.SerialException(event.text)
+    if len(event.text) > 0:
+        print(event.text)
+        if verbose:
+            logging.log(logging.INFO, f"confirmation")
+    return event.kind == "finished"
 
 
 def acquire_video(
@@ -247,7 +824,132 @@ def acquire_video(
     max_video_frames="default",  # after this many frames, a new video file will be created
     ffmpeg_options={},
     arduino_args=[],
+    transport="queue",
+    ring_buffer_slots=32,
+    camera_init_timeout_s=60,
+    trace=False,
+    detect_dropped_frames=True,
+    max_dropped_frames=None,
+    metadata_format="csv",
+    triggerdata_format="csv",
+    serial_protocol="text",
+    arduino_port=None,
+    arduino_vid=None,
+    arduino_pid=None,
+    arduino_serial_number=None,
+    arduino_port_cache=DEFAULT_PORT_CACHE,
+    drain_idle_s=1.0,
+    drain_timeout_s=30,
+    writer_timeout_s=60,
+    memory_budget_bytes=None,
+    queue_policy="block",
+    cpu_affinity=None,
+    realtime_priority=None,
+    acquisition_nice=None,
+    grab_mode="poll",
 ):
+    """Record video from a list of cameras triggered by an arduino.
+
+    Parameters
+    ----------
+    save_location : str or Path
+        Directory in which the recording is saved.
+    camera_list : list of dicts
+        One dict per camera, with at least 'name', 'serial' and 'brand'. The
+        remaining entries are passed to `get_camera`. An 'encoder' entry
+        selects how the camera's video is encoded (see `Writer`).
+    recording_duration_s : int
+        Length of the recording in seconds.
+    framerate : int (default: 30)
+        Frame rate of the arduino trigger.
+    max_video_frames : int (default: 'default')
+        After this many frames, a new video file is started. Defaults to one
+        hour of frames.
+    arduino_args : list of ints (default: [])
+        Extra parameters sent to the arduino after num_cycles and
+        inv_framerate.
+    transport : str (default: 'queue')
+        How frames are passed from the acquisition loops to the writers.
+        'queue' uses a multiprocessing.Queue per camera; 'shared_memory' uses a
+        SharedMemoryRingBuffer per camera (see `create_write_queue`). The
+        largest frame per camera can be set with a 'max_frame_bytes' entry in
+        its camera dict (default: 1920 * 1200 * 2).
+    ring_buffer_slots : int (default: 32)
+        Number of frames each ring buffer can hold when transport is
+        'shared_memory'.
+    camera_init_timeout_s : float (default: 60)
+        Seconds to wait for the cameras to initialize before giving up.
+    trace : bool (default: False)
+        If True, write per-frame latency traces for each camera (see
+        tracing.py), summarized with `python -m multicamera_acquisition.tracing`.
+    detect_dropped_frames : bool (default: True)
+        If True, writers detect dropped frames from gaps in the camera
+        timestamps while recording. Counts are shown on the progress bar and
+        each gap is logged to {name}.{serial}.drops.csv.
+    max_dropped_frames : int (default: None)
+        If not None, stop the recording once any camera has dropped more than
+        this many frames.
+    metadata_format : str (default: 'csv')
+        'csv' or 'binary' per-frame metadata (see `Writer` and
+        metadata_store.py).
+    triggerdata_format : str (default: 'csv')
+        'csv' or 'binary' log of the arduino input pins, written to
+        triggerdata.csv or triggerdata.bin (see trigger_data.py).
+    serial_protocol : str (default: 'text')
+        How the arduino firmware reports input events: 'text' lines, or
+        'binary' records when built with BINARY_INPUT_EVENTS (see
+        interfaces/serial_protocol.py).
+    arduino_port : str (default: None)
+        Serial port of the arduino (e.g. that of an ArduinoEmulator, see
+        interfaces/arduino_emulator.py). By default the serial ports are
+        searched for a waiting arduino (see `find_arduino`).
+    arduino_vid, arduino_pid : int (default: None)
+        If set, only USB serial devices with this vendor / product id are
+        searched.
+    arduino_serial_number : str (default: None)
+        If set, only the USB serial device with this serial number is
+        searched.
+    arduino_port_cache : str or Path (default: DEFAULT_PORT_CACHE)
+        File in which the arduino's port is remembered and tried first next
+        time. None to disable.
+    drain_idle_s : float (default: 1.0)
+        After the arduino has finished, each camera keeps grabbing until it
+        has delivered one frame per trigger, or no frame has arrived for
+        this many seconds.
+    drain_timeout_s : float (default: 30)
+        Maximum seconds to wait for the cameras after the arduino has
+        finished.
+    writer_timeout_s : float (default: 60)
+        Stop waiting for the writers once none has written a frame for this
+        many seconds.
+    memory_budget_bytes : int (default: None)
+        If not None, the most bytes of frames that can wait in the write and
+        display queues of all cameras together (with transport 'queue').
+        Usage and the actions taken when it is full are written to
+        session_metadata.json (see memory_budget.py).
+    queue_policy : str (default: 'block')
+        What a camera does when the memory budget is full: 'block',
+        'drop_oldest', 'drop_newest' or 'decimate_display'. Can be set per
+        camera with a 'queue_policy' entry in its camera dict.
+    cpu_affinity : str (default: None)
+        'auto' pins each acquisition loop to a core of its own and each
+        camera's writers to the remaining cores of the same NUMA node (see
+        affinity.py). None leaves scheduling to the OS. A camera dict can set
+        'cpu_affinity' and 'writer_cpu_affinity' (e.g. [2] or '4-7')
+        explicitly. The layout that was applied is logged and written to
+        session_metadata.json.
+    realtime_priority : int (default: None)
+        If not None, acquisition loops grab with SCHED_FIFO scheduling at
+        this priority (needs CAP_SYS_NICE). Can be set per camera with
+        'realtime_priority'.
+    acquisition_nice : int (default: None)
+        If not None, the niceness of the acquisition loops. Can be set per
+        camera with 'nice'.
+    grab_mode : str (default: 'poll')
+        'poll' waits for each frame in the acquisition loop, 'callback' has
+        the camera SDK push frames as they arrive (see AcquisitionLoop). Can
+        be set per camera with 'grab_mode'.
+    """
     if azure_framerate != 30:
         raise ValueError("Azure framerate must be 30")
 
@@ -279,7 +981,7 @@ def acquire_video(
     camera_brands = np.array([i["brand"] for i in camera_list])
     # if there are cameras that are not flir or basler, raise an error
     for i in camera_brands:
-        if i not in ["flir", "basler", "azure", "lucid"]:
+        if i not in ["flir", "basler", "azure", "lucid"] + SYNTHETIC_BRANDS:
             raise ValueError(
                 "Camera brand must be either 'flir' or 'basler', azure, not {}".format(
                     i
@@ -319,6 +1021,8 @@ def acquire_video(
         raise ValueError(f"Save location {save_location} does not exist")
     
     triggerdata_file = save_location / "triggerdata.csv"
+    if triggerdata_format == "binary":
+        triggerdata_file = triggerdata_file.with_suffix(".bin")
     if triggerdata_file.exists() and (overwrite == False):
         raise FileExistsError(f"CSV file {triggerdata_file} already exists")
 
@@ -326,191 +1030,289 @@ def acquire_video(
     if verbose:
         logging.log(logging.INFO, f"Initializing Arduino...")
 
-    # Find the arduino to be used for triggering
-    # TODO: allow user to specify a port
-    ports = find_serial_ports()
-    found_arduino = False
-    for port in ports:
-        with serial.Serial(port=port, timeout=0.1) as arduino:
-            try:
-                wait_for_serial_confirmation(
-                    arduino, 
-                    expected_confirmation="Waiting...", 
-                    seconds_to_wait=2
-                    )
-                found_arduino = True
-                break
-            except ValueError:
-                continue
-    if found_arduino is False:
-        raise RuntimeError("Could not find waiting arduino to do triggers!")
-    else:
-        logging.info(f"Using port {port} for arduino.")
-    arduino = serial.Serial(port=port, timeout=serial_timeout_duration_s)
-
-    # delay recording to allow serial connection to connect
-    sleep_duration = 2
-    logging.log(
-        logging.INFO, f"Waiting {sleep_duration}s to wait for arduino to connect..."
+    # Find the arduino to be used for triggering, and keep the connection
+    # that found it open
+    arduino = find_arduino(
+        ports=None if arduino_port is None else [arduino_port],
+        vid=arduino_vid,
+        pid=arduino_pid,
+        serial_number=arduino_serial_number,
+        port_cache=arduino_port_cache,
+        timeout=serial_timeout_duration_s,
     )
-    time.sleep(sleep_duration)
-
-    # create a triggerdata file
-    with open(triggerdata_file, "w") as triggerdata_f:
-        triggerdata_writer = csv.writer(triggerdata_f)
-        triggerdata_writer.writerow(
-            ["pulse_id", "arduino_ms"]
-            + [f"flag_{i}" for i in range(n_input_trigger_states)]
-        )
 
-    if verbose:
-        logging.log(logging.INFO, "Initializing cameras...")
-    # initialize cameras
+    # everything set up from here on is released again if any camera
+    # fails, so that a retry in the same interpreter can reclaim the port
     writers = []
+    write_queues = []
     acquisition_loops = []
-    display_queues = []
-    camera_names = []
-    display_ranges = []  # range for displaying (for azure mm)
+    trigger_logger = None
+    try:
+        # create a triggerdata file, kept open (and written in batches) while recording
+        trigger_logger = TriggerDataLogger(
+            triggerdata_file, n_input_trigger_states, file_format=triggerdata_format
+        )
 
-    num_azures = len([v for v in camera_list if "azure" in v["brand"]])
-    num_baslers = len(camera_list) - num_azures
+        if verbose:
+            logging.log(logging.INFO, "Initializing cameras...")
+        # initialize cameras
+        display_queues = []
+        camera_names = []
+        display_ranges = []  # range for displaying (for azure mm)
+
+        def trace_file(stem, process):
+            if not trace:
+                return None
+            return save_location / f"{stem}.trace.{process}.bin"
+
+        drop_counters = None
+        if detect_dropped_frames:
+            drop_counters = DropCounters([cd["name"] for cd in camera_list])
+
+        memory_budget = None
+        if memory_budget_bytes is not None:
+            memory_budget = MemoryBudget(
+                memory_budget_bytes, [cd["name"] for cd in camera_list]
+            )
 
-    # create acquisition loops
-    for camera_dict in camera_list:
-        name = camera_dict["name"]
-        serial_number = camera_dict["serial"]
+        if cpu_affinity not in [None, "auto"]:
+            raise ValueError("cpu_affinity must be None or 'auto'")
+        affinity_plan = {"acquisition": {}, "writers": {}, "other": None}
+        if cpu_affinity == "auto":
+            affinity_plan = plan_affinity([cd["name"] for cd in camera_list])
+            logging.log(logging.DEBUG, f"Affinity plan: {affinity_plan}")
 
-        camera_framerate = (
-            azure_framerate if camera_dict["brand"] == "azure" else framerate
-        )
+        # enumerate each brand once here, instead of once per acquisition loop
+        device_indices, device_cache_stats = resolve_device_indices(camera_list)
 
-        ffmpeg_options = {}
-        for key in ["gpu", "quality"]:
-            if key in camera_dict:
-                ffmpeg_options[key] = camera_dict[key]
+        num_azures = len([v for v in camera_list if "azure" in v["brand"]])
+        num_baslers = len(camera_list) - num_azures
 
-        if "display" in camera_dict.keys():
-            display_frames = camera_dict["display"]
-        else:
-            display_frames = False
+        # create acquisition loops
+        for camera_dict in camera_list:
+            name = camera_dict["name"]
+            serial_number = camera_dict["serial"]
 
-        if verbose:
-            logging.log(logging.INFO, f"Camera {name}...")
+            camera_framerate = (
+                azure_framerate if camera_dict["brand"] in AZURE_BRANDS else framerate
+            )
+
+            ffmpeg_options = {}
+            for key in ["gpu", "quality"]:
+                if key in camera_dict:
+                    ffmpeg_options[key] = camera_dict[key]
+
+            if "display" in camera_dict.keys():
+                display_frames = camera_dict["display"]
+            else:
+                display_frames = False
 
+            camera_queue_policy = camera_dict.get("queue_policy", queue_policy)
+            acquisition_cpus = camera_dict.get(
+                "cpu_affinity", affinity_plan["acquisition"].get(name)
+            )
+            writer_cpus = camera_dict.get(
+                "writer_cpu_affinity", affinity_plan["writers"].get(name)
+            )
+
+            if verbose:
+                logging.log(logging.INFO, f"Camera {name}...")
 
-        # create a writer queue
-        if camera_dict["brand"] == "lucid":
+
+            # create a writer queue (lucid and 16 bit synthetic cameras write 16 bit video)
+            if camera_dict["brand"] == "lucid" or camera_dict.get("bit_depth") == 16:
             
-            video_file = save_location / f"{name}.{serial_number}.avi"
-            metadata_file = save_location / f"{name}.{serial_number}.metadata.csv"
+                video_file = save_location / f"{name}.{serial_number}.avi"
+                metadata_file = save_location / f"{name}.{serial_number}.metadata.csv"
 
-            if video_file.exists() and (overwrite == False):
-                raise FileExistsError(f"Video file {video_file} already exists")
+                if video_file.exists() and (overwrite == False):
+                    raise FileExistsError(f"Video file {video_file} already exists")
 
             
-            write_queue = mp.Queue()
-            writer = Writer(
-                queue=write_queue,
-                video_file_name=video_file,
-                metadata_file_name=metadata_file,
-                camera_serial=serial_number,
-                fps=camera_framerate,
-                camera_name=name,
-                camera_brand=camera_dict["brand"],
-                max_video_frames=max_video_frames,
-                ffmpeg_options=ffmpeg_options,
-                depth = True # uses 16 bit depth
-            )
-        else:
+                write_queue = create_write_queue(
+                    transport,
+                    max_frame_bytes=camera_dict.get("max_frame_bytes", 1920 * 1200 * 2),
+                    ring_buffer_slots=ring_buffer_slots,
+                    memory_budget=memory_budget,
+                    camera_name=name,
+                    queue_policy=camera_queue_policy,
+                )
+                write_queues.append(write_queue)
+                writer = Writer(
+                    queue=write_queue,
+                    video_file_name=video_file,
+                    metadata_file_name=metadata_file,
+                    camera_serial=serial_number,
+                    fps=camera_framerate,
+                    camera_name=name,
+                    camera_brand=camera_dict["brand"],
+                    max_video_frames=max_video_frames,
+                    metadata_format=metadata_format,
+                    ffmpeg_options=ffmpeg_options,
+                    encoder=camera_dict.get("encoder"),
+                    trace_file=trace_file(f"{name}.{serial_number}", "writer"),
+                    drop_counters=drop_counters,
+                    drop_log_file=save_location / f"{name}.{serial_number}.drops.csv",
+                    cpu_affinity=writer_cpus,
+                    depth = True # uses 16 bit depth
+                )
+            else:
             
-            video_file = save_location / f"{name}.{serial_number}.mp4"
-            metadata_file = save_location / f"{name}.{serial_number}.metadata.csv"
-
-            if video_file.exists() and (overwrite == False):
-                raise FileExistsError(f"Video file {video_file} already exists")
-
-            write_queue = mp.Queue()
-            writer = Writer(
-                queue=write_queue,
-                video_file_name=video_file,
-                metadata_file_name=metadata_file,
-                camera_serial=serial_number,
-                fps=camera_framerate,
-                camera_name=name,
-                camera_brand=camera_dict["brand"],
-                max_video_frames=max_video_frames,
-                ffmpeg_options=ffmpeg_options,
-            )
+                video_file = save_location / f"{name}.{serial_number}.mp4"
+                metadata_file = save_location / f"{name}.{serial_number}.metadata.csv"
+
+                if video_file.exists() and (overwrite == False):
+                    raise FileExistsError(f"Video file {video_file} already exists")
+
+                write_queue = create_write_queue(
+                    transport,
+                    max_frame_bytes=camera_dict.get("max_frame_bytes", 1920 * 1200 * 2),
+                    ring_buffer_slots=ring_buffer_slots,
+                    memory_budget=memory_budget,
+                    camera_name=name,
+                    queue_policy=camera_queue_policy,
+                )
+                write_queues.append(write_queue)
+                writer = Writer(
+                    queue=write_queue,
+                    video_file_name=video_file,
+                    metadata_file_name=metadata_file,
+                    camera_serial=serial_number,
+                    fps=camera_framerate,
+                    camera_name=name,
+                    camera_brand=camera_dict["brand"],
+                    max_video_frames=max_video_frames,
+                    metadata_format=metadata_format,
+                    ffmpeg_options=ffmpeg_options,
+                    encoder=camera_dict.get("encoder"),
+                    trace_file=trace_file(f"{name}.{serial_number}", "writer"),
+                    drop_counters=drop_counters,
+                    drop_log_file=save_location / f"{name}.{serial_number}.drops.csv",
+                    cpu_affinity=writer_cpus,
+                )
 
-        if camera_dict["brand"] == "azure":
-            # create asecond write queue for the depth data
-            # create a writer queue
-            video_file_depth = save_location / f"{name}.{serial_number}.depth.avi"
-            metadata_file = save_location / f"{name}.{serial_number}.metadata.depth.csv"
-            write_queue_depth = mp.Queue()
-            writer_depth = Writer(
-                queue=write_queue_depth,
-                video_file_name=video_file_depth,
-                metadata_file_name=metadata_file,
-                camera_serial=serial_number,
-                camera_name=name,
-                fps=camera_framerate,
-                camera_brand=camera_dict["brand"],
-                max_video_frames=max_video_frames,
-                ffmpeg_options=ffmpeg_options,
-                depth=True,
-            )
+            if camera_dict["brand"] in AZURE_BRANDS:
+                # create asecond write queue for the depth data
+                # create a writer queue
+                video_file_depth = save_location / f"{name}.{serial_number}.depth.avi"
+                metadata_file = save_location / f"{name}.{serial_number}.metadata.depth.csv"
+                write_queue_depth = create_write_queue(
+                    transport,
+                    max_frame_bytes=camera_dict.get("max_frame_bytes", 1920 * 1200 * 2),
+                    ring_buffer_slots=ring_buffer_slots,
+                    memory_budget=memory_budget,
+                    camera_name=name,
+                    queue_policy=camera_queue_policy,
+                )
+                write_queues.append(write_queue_depth)
+                writer_depth = Writer(
+                    queue=write_queue_depth,
+                    video_file_name=video_file_depth,
+                    metadata_file_name=metadata_file,
+                    camera_serial=serial_number,
+                    camera_name=name,
+                    fps=camera_framerate,
+                    camera_brand=camera_dict["brand"],
+                    max_video_frames=max_video_frames,
+                    metadata_format=metadata_format,
+                    ffmpeg_options=ffmpeg_options,
+                    encoder=camera_dict.get("encoder"),
+                    trace_file=trace_file(f"{name}.{serial_number}.depth", "writer"),
+                    cpu_affinity=writer_cpus,
+                    depth=True,
+                )
 
-            cam = get_camera(**camera_dict)
+                # azures are opened in the main process and passed to the loop
+                cam = get_camera(**camera_dict) if camera_dict["brand"] == "azure" else None
 
-        else:
-            write_queue_depth = None
-            cam = None
-
-        display_queue = None
-        if display_frames:
-            # create a writer queue
-            display_queue = mp.Queue()
-            camera_names.append(name)
-            if "display_range" in camera_dict:
-                display_ranges.append(camera_dict["display_range"])
             else:
-                display_ranges.append(None)
-            display_queues.append(display_queue)
-
-        # prepare the acuqisition loop in a separate thread
-        acquisition_loop = AcquisitionLoop(
-            write_queue=write_queue,
-            write_queue_depth=write_queue_depth,
-            display_queue=display_queue,
-            display_frames=display_frames,
-            display_frequency=display_frequency,
-            dropped_frame_warnings=dropped_frame_warnings,
-            frame_timeout=frame_timeout,
-            cam=cam,
-            **camera_dict,
-        )
-
-        # initialize acquisition
-        writer.start()
-        writers.append(writer)
-        if camera_dict["brand"] == "azure":
-            writer_depth.start()
-            writers.append(writer_depth)
+                write_queue_depth = None
+                cam = None
+
+            display_queue = None
+            if display_frames:
+                # create a writer queue
+                if memory_budget is not None:
+                    display_queue = BudgetedQueue(
+                        memory_budget, name, policy=camera_queue_policy, display=True
+                    )
+                else:
+                    display_queue = mp.Queue()
+                camera_names.append(name)
+                if "display_range" in camera_dict:
+                    display_ranges.append(camera_dict["display_range"])
+                else:
+                    display_ranges.append(None)
+                display_queues.append(display_queue)
+
+            camera_params = {
+                k: v
+                for k, v in camera_dict.items()
+                if k
+                not in [
+                    "cpu_affinity",
+                    "writer_cpu_affinity",
+                    "realtime_priority",
+                    "nice",
+                    "grab_mode",
+                ]
+            }
+            # synthetic cameras free-run at the trigger rate unless told otherwise,
+            # and the frame rate sizes the camera SDK's buffer pool
+            camera_params.setdefault("fps", camera_framerate)
+            if name in device_indices:
+                camera_params.setdefault("device_index", device_indices[name])
+
+            # prepare the acuqisition loop in a separate thread
+            acquisition_loop = AcquisitionLoop(
+                write_queue=write_queue,
+                write_queue_depth=write_queue_depth,
+                display_queue=display_queue,
+                display_frames=display_frames,
+                display_frequency=display_frequency,
+                dropped_frame_warnings=dropped_frame_warnings,
+                frame_timeout=frame_timeout,
+                cam=cam,
+                trace_file=trace_file(f"{name}.{serial_number}", "acquisition"),
+                cpu_affinity=acquisition_cpus,
+                realtime_priority=camera_dict.get("realtime_priority", realtime_priority),
+                nice=camera_dict.get("nice", acquisition_nice),
+                grab_mode=camera_dict.get("grab_mode", grab_mode),
+                **camera_params,
+            )
 
-        acquisition_loop.start()
-        acquisition_loop.ready.wait()  # blocks until the acq loop reports that it is ready
-        acquisition_loops.append(acquisition_loop)
-        if verbose:
-            logging.info(f"Initialized {name} ({serial_number})")
+            # initialize acquisition
+            writer.start()
+            writers.append(writer)
+            if camera_dict["brand"] in AZURE_BRANDS:
+                writer_depth.start()
+                writers.append(writer_depth)
+
+            acquisition_loops.append(acquisition_loop)
+
+        # initialize all cameras concurrently, each in its own acquisition loop
+        initialize_acquisition_loops(acquisition_loops, init_timeout=camera_init_timeout_s)
+    except BaseException:
+        for process in acquisition_loops + writers:
+            if process.is_alive():
+                process.terminate()
+        release_write_queues(write_queues)
+        if trigger_logger is not None:
+            trigger_logger.close()
+        arduino.close()
+        raise
 
     if len(display_queues) > 0:
+        # imported here, as the display pulls in tkinter and cv2
+        from multicamera_acquisition.visualization import MultiDisplay
+
         # create a display process which recieves frames from the acquisition loops
         disp = MultiDisplay(
             display_queues,
             camera_names,
             display_downsample=display_downsample,
             display_ranges=display_ranges,
+            cpu_affinity=affinity_plan["other"],
         )
         disp.start()
     else:
@@ -570,73 +1372,156 @@ def acquire_video(
     except:
         # kill everything if we can't get confirmation
         end_processes(acquisition_loops, writers, disp)
+        release_write_queues(write_queues)
+        trigger_logger.close()
         return save_location, camera_list
 
     if verbose:
         logging.log(logging.INFO, f"Starting Acquisition...")
 
+    # serial reads happen on their own thread, events are handled here
+    serial_reader = SerialReader(arduino, protocol=serial_protocol)
+    serial_reader.start()
+
+    # log where each process ended up, as applied
+    processes = {"main": os.getpid()}
+    for acquisition_loop in acquisition_loops:
+        processes[f"acquisition {acquisition_loop.camera_params['name']}"] = (
+            acquisition_loop.pid
+        )
+    for writer in writers:
+        processes[f"writer {writer.video_file_name.stem}"] = writer.pid
+    if disp is not None:
+        processes["display"] = disp.pid
+    process_layout = log_process_layout(processes)
+
     try:
         # while current time is less than initial time + recording_duration_s
         pbar = tqdm(total=recording_duration_s, desc="recording progress (s)")
         # how long to record
         datetime_prev = datetime.now()
         endtime = datetime_prev + timedelta(seconds=recording_duration_s + 10)
+        aborted = False
+        finished = False
         while datetime.now() < endtime:
-            confirmation = arduino.readline().decode("utf-8").strip("\r\n")
-            if len(confirmation) > 0:
-                print(confirmation)
-            if confirmation == "Finished":
-                break
+            event = serial_reader.get(timeout=serial_timeout_duration_s)
+            if event is not None:
+                finished = handle_serial_event(event, trigger_logger, verbose)
+                if finished:
+                    break
             if (datetime.now() - datetime_prev).seconds > 0:
                 pbar.update((datetime.now() - datetime_prev).seconds)
                 datetime_prev = datetime.now()
-            # save input data flags
-            if len(confirmation) > 0:
-                # print(confirmation)
-                if confirmation[:7] == "input: ":
-                    with open(triggerdata_file, "a") as triggerdata_f:
-                        triggerdata_writer = csv.writer(triggerdata_f)
-                        states = confirmation[7:].split(",")[:-2]
-                        frame_num = confirmation[7:].split(",")[-2]
-                        arduino_clock = confirmation[7:].split(",")[-1]
-                        triggerdata_writer.writerow([frame_num, arduino_clock] + states)
-                if verbose:
-                    logging.log(logging.INFO, f"confirmation")
+                if drop_counters is not None:
+                    pbar.set_postfix_str(f"dropped/frames {drop_counters.summary()}")
+                    if (
+                        max_dropped_frames is not None
+                        and drop_counters.max_dropped() > max_dropped_frames
+                    ):
+                        logging.error(
+                            f"Aborting recording, too many dropped frames "
+                            f"({drop_counters.summary()})"
+                        )
+                        aborted = True
+                        break
 
         # wait for a confirmation of being finished
-        if confirmation == "Finished":
-            print("Confirmation recieved: {}".format(confirmation))
-        else:
+        if finished:
+            print("Confirmation recieved: Finished")
+        elif not aborted:
             logging.log(logging.INFO, "Waiting for finished confirmation")
-            try:
-                confirmation = wait_for_serial_confirmation(
-                    arduino, expected_confirmation="Finished", seconds_to_wait=10
+            wait_until = time.monotonic() + 10
+            while not finished and time.monotonic() < wait_until:
+                event = serial_reader.get(timeout=serial_timeout_duration_s)
+                if event is not None:
+                    finished = handle_serial_event(event, trigger_logger, verbose)
+            if not finished:
+                logging.log(
+                    logging.WARN,
+                    'Confirmation "Finished" signal never recieved from Arduino',
                 )
-            except ValueError as e:
-                logging.log(logging.WARN, e)
 
         if verbose:
             logging.log(logging.INFO, f"Closing")
 
         # Close the arduino just in case
+        serial_reader.stop()
         arduino.close()
 
-        # TODO wait until all acquisition loops are finished
-        #   the proper way to do this would be to use a event.wait()
-        #   for each camera, to wait until it has no more frames to grab
-        #   (except in the case of azure, where it will always be able) to
-        #   grab more frames because it is not locked to the arduino pulse.
-        #   for now, I've just added a 5 second sleep after the arduino is 'finished'
-        #   which should be enough time for the cameras to finish grabbing frames
-        time.sleep(5)
+        # let each camera grab the frames still coming, then stop
+        if not aborted:
+            expected_frames = {
+                loop.camera_params["name"]: int(
+                    round(
+                        recording_duration_s
+                        * (azure_framerate if loop.brand in AZURE_BRANDS else framerate)
+                    )
+                )
+                for loop in acquisition_loops
+            }
+            drain_acquisition_loops(
+                acquisition_loops,
+                expected_frames,
+                idle_s=drain_idle_s,
+                timeout=drain_timeout_s,
+            )
 
     # unless there is a keyboard interrupt, in which case we should catch the error and still
     #   return the save location
     except (KeyboardInterrupt, serial.SerialException) as e:
         pass
 
-    end_processes(acquisition_loops, writers, disp)
+    serial_reader.stop()
+    # log any input events that arrived after the loop ended
+    while True:
+        event = serial_reader.get(timeout=0)
+        if event is None:
+            break
+        if event.kind in ["input", "input_batch", "malformed"]:
+            handle_serial_event(event, trigger_logger, verbose)
+    trigger_logger.close()
+
+    shutdown_timings = end_processes(
+        acquisition_loops, writers, disp, writer_timeout=writer_timeout_s
+    )
+    release_write_queues(write_queues)
 
     pbar.close()
 
+    session_metadata = {
+        "shutdown_s": shutdown_timings,
+        "stream_stats": {
+            acquisition_loop.camera_params["name"]: acquisition_loop.get_stream_stats()
+            for acquisition_loop in acquisition_loops
+        },
+        "cpu_affinity": cpu_affinity,
+        "process_layout": process_layout,
+        "device_cache": {
+            # the enumeration made before the loops started, and each loop's own
+            "resolve": device_cache_stats,
+            "acquisition": {
+                acquisition_loop.camera_params["name"]: (
+                    acquisition_loop.get_device_cache_stats()
+                )
+                for acquisition_loop in acquisition_loops
+                if acquisition_loop.brand in CACHED_BRANDS
+            },
+        },
+        "writers": {
+            writer.camera_name + (".depth" if writer.depth else ""): writer.stats()
+            for writer in writers
+        },
+    }
+    if memory_budget is not None:
+        logging.info(f"Memory budget: {memory_budget.summary()}")
+        session_metadata["memory_budget"] = memory_budget.as_dict()
+    update_session_metadata(save_location, **session_metadata)
+
+    if drop_counters is not None:
+        for name, counts in drop_counters.as_dict().items():
+            logging.info(
+                f"{name}: {counts['frames']} frames written for {num_cycles} triggers, "
+                f"{counts['dropped']} dropped frames detected from timestamps"
+            )
+
     return save_location, camera_list
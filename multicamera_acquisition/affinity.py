@@ -0,0 +1,263 @@
+""" CPU pinning and scheduling of the acquisition processes.
+
+With many cameras, the acquisition loops, writers, ffmpeg children and the
+display all compete for the same cores, and a grab loop that is moved between
+cores (or waits behind an encoder) grabs with more jitter. `plan_affinity`
+lays the processes out on the available cores:
+
+    - each acquisition loop gets a core of its own, taken from the isolated
+      cores (isolcpus) if there are any, and otherwise from the highest
+      numbered cores, alternating between NUMA nodes
+    - each camera's writers (and their ffmpeg children, which inherit the
+      affinity) share the remaining cores of the NUMA node of its grab core
+    - the display and anything else gets the remaining cores
+
+Each process applies its own settings with `apply_process_settings` when it
+starts, and `describe_process` reads back what was actually applied, so that
+the layout can be logged (see acquire_video).
+
+This uses the Linux scheduling calls in `os`. On other platforms, or without
+the privileges for real-time scheduling, the settings are skipped with a
+warning.
+"""
+
+import logging
+import os
+from pathlib import Path
+
+SCHEDULERS = {
+    getattr(os, name): name[len("SCHED_"):].lower()
+    for name in ["SCHED_OTHER", "SCHED_FIFO", "SCHED_RR", "SCHED_BATCH", "SCHED_IDLE"]
+    if hasattr(os, name)
+}
+
+
+def parse_cpu_list(text):
+    """Parse a cpu list such as '0-3,8,10-11' into a sorted list of ints.
+
+    Lists (or other iterables) of ints are returned sorted.
+    """
+    if not isinstance(text, str):
+        return sorted(int(cpu) for cpu in text)
+    cpus = set()
+    for part in text.strip().split(","):
+        if part == "":
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def format_cpu_list(cpus):
+    """Format cpus as a cpu list, e.g. [0, 1, 2, 3, 8] -> '0-3,8'."""
+    cpus = sorted(cpus)
+    parts = []
+    i = 0
+    while i < len(cpus):
+        j = i
+        while j + 1 < len(cpus) and cpus[j + 1] == cpus[j] + 1:
+            j += 1
+        parts.append(str(cpus[i]) if i == j else f"{cpus[i]}-{cpus[j]}")
+        i = j + 1
+    return ",".join(parts)
+
+
+def available_cpus():
+    """The cpus this process is allowed to run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count()))
+
+
+def isolated_cpus(path="/sys/devices/system/cpu/isolated"):
+    """The available cpus isolated from the scheduler (isolcpus=...)."""
+    try:
+        isolated = parse_cpu_list(Path(path).read_text())
+    except OSError:
+        return []
+    return [cpu for cpu in isolated if cpu in available_cpus()]
+
+
+def numa_nodes(root="/sys/devices/system/node"):
+    """The available cpus of each NUMA node, as {node: [cpus]}."""
+    cpus = available_cpus()
+    nodes = {}
+    for cpulist in sorted(Path(root).glob("node[0-9]*/cpulist")):
+        node = int(cpulist.parent.name[len("node"):])
+        node_cpus = [cpu for cpu in parse_cpu_list(cpulist.read_text()) if cpu in cpus]
+        if len(node_cpus) > 0:
+            nodes[node] = node_cpus
+    if len(nodes) == 0:
+        nodes = {0: cpus}
+    return nodes
+
+
+def _interleave_nodes(cpus, nodes):
+    # take cpus from each node in turn, highest numbered first
+    by_node = [
+        [cpu for cpu in sorted(node_cpus, reverse=True) if cpu in cpus]
+        for node_cpus in nodes.values()
+    ]
+    ordered = []
+    while any(len(node_cpus) > 0 for node_cpus in by_node):
+        for node_cpus in by_node:
+            if len(node_cpus) > 0:
+                ordered.append(node_cpus.pop(0))
+    return ordered
+
+
+def plan_affinity(camera_names, cpus=None, isolated=None, nodes=None):
+    """Lay out acquisition loops and writers on the available cpus.
+
+    Parameters
+    ----------
+    camera_names : list of str
+    cpus : list of int (default: None)
+        The cpus to use, by default all available ones.
+    isolated : list of int (default: None)
+        Isolated cpus, used for the acquisition loops. By default, read from
+        /sys/devices/system/cpu/isolated.
+    nodes : dict (default: None)
+        {node: [cpus]} for each NUMA node, by default read from
+        /sys/devices/system/node.
+
+    Returns
+    -------
+    plan : dict
+        'acquisition' and 'writers' map each camera name to a list of cpus,
+        'other' lists the cpus left for the display and the main process.
+    """
+    cpus = available_cpus() if cpus is None else sorted(cpus)
+    isolated = isolated_cpus() if isolated is None else isolated
+    nodes = numa_nodes() if nodes is None else nodes
+    isolated = [cpu for cpu in isolated if cpu in cpus]
+
+    if len(cpus) < 2:
+        # nothing to separate
+        return {
+            "acquisition": {name: list(cpus) for name in camera_names},
+            "writers": {name: list(cpus) for name in camera_names},
+            "other": list(cpus),
+        }
+
+    if len(isolated) > 0:
+        grab_cpus = _interleave_nodes(isolated, nodes)[: len(camera_names)]
+    else:
+        # leave at least half of the cpus (and cpu 0) for everything else
+        n_grab = min(len(camera_names), len(cpus) // 2)
+        grab_cpus = _interleave_nodes(cpus, nodes)[:n_grab]
+    rest = [cpu for cpu in cpus if cpu not in grab_cpus and cpu not in isolated]
+    if len(rest) == 0:
+        rest = [cpu for cpu in cpus if cpu not in grab_cpus]
+
+    plan = {"acquisition": {}, "writers": {}, "other": rest}
+    for i, name in enumerate(camera_names):
+        grab_cpu = grab_cpus[i % len(grab_cpus)]
+        node_cpus = next(
+            (node_cpus for node_cpus in nodes.values() if grab_cpu in node_cpus), cpus
+        )
+        writer_cpus = [cpu for cpu in rest if cpu in node_cpus]
+        plan["acquisition"][name] = [grab_cpu]
+        plan["writers"][name] = writer_cpus if len(writer_cpus) > 0 else list(rest)
+    return plan
+
+
+def apply_process_settings(cpu_affinity=None, realtime_priority=None, nice=None):
+    """Pin and prioritize the calling process.
+
+    Settings that cannot be applied (e.g. real-time scheduling without the
+    privileges for it) are logged as warnings and skipped.
+
+    Parameters
+    ----------
+    cpu_affinity : list of int or str (default: None)
+        The cpus to run on (see `parse_cpu_list`).
+    realtime_priority : int (default: None)
+        If not None, run with SCHED_FIFO at this priority (1-99). A process
+        with real-time priority must block (e.g. waiting for a frame) to let
+        other processes on its cpus run.
+    nice : int (default: None)
+        If not None, the niceness to run with (ignored by SCHED_FIFO).
+
+    Returns
+    -------
+    applied : bool
+        Whether all settings were applied.
+    """
+    applied = True
+    if cpu_affinity is not None:
+        try:
+            os.sched_setaffinity(0, parse_cpu_list(cpu_affinity))
+        except (AttributeError, OSError, ValueError) as e:
+            logging.warning(f"Could not set cpu affinity {cpu_affinity}: {e}")
+            applied = False
+    if nice is not None:
+        try:
+            os.setpriority(os.PRIO_PROCESS, 0, nice)
+        except (AttributeError, OSError) as e:
+            logging.warning(f"Could not set nice {nice}: {e}")
+            applied = False
+    if realtime_priority is not None:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(realtime_priority))
+        except (AttributeError, OSError) as e:
+            logging.warning(
+                f"Could not set real-time priority {realtime_priority}: {e}"
+            )
+            applied = False
+    return applied
+
+
+def describe_process(pid):
+    """The affinity and scheduling of a process, as applied.
+
+    Returns
+    -------
+    description : dict
+        'pid', 'cpus' (a cpu list), 'scheduler', 'priority' and 'nice'. Values
+        that cannot be read are None.
+    """
+    description = {
+        "pid": pid,
+        "cpus": None,
+        "scheduler": None,
+        "priority": None,
+        "nice": None,
+    }
+    try:
+        description["cpus"] = format_cpu_list(os.sched_getaffinity(pid))
+        description["scheduler"] = SCHEDULERS.get(os.sched_getscheduler(pid))
+        description["priority"] = os.sched_getparam(pid).sched_priority
+        description["nice"] = os.getpriority(os.PRIO_PROCESS, pid)
+    except (AttributeError, OSError):
+        pass
+    return description
+
+
+def log_process_layout(processes):
+    """Log the affinity and scheduling of processes.
+
+    Parameters
+    ----------
+    processes : dict
+        {label: pid}
+
+    Returns
+    -------
+    layout : dict
+        {label: description}, see `describe_process`.
+    """
+    layout = {}
+    for label, pid in processes.items():
+        if pid is None:
+            continue
+        layout[label] = describe_process(pid)
+        d = layout[label]
+        logging.info(
+            f"Process layout: {label} (pid {pid}) on cpus {d['cpus']}, "
+            f"{d['scheduler']} priority {d['priority']}, nice {d['nice']}"
+        )
+    return layout
@@ -0,0 +1,412 @@
+""" Parallel transcode-and-archive of recording sessions.
+
+Finds every video (*.avi, *.mp4) and metadata / trigger data file under a
+session root. Videos are re-encoded into the archive (by default with
+libx265, as in the compress-and-copy notebook), and data files are copied.
+Work is spread over a process pool, one file per task.
+
+The archive keeps a manifest (.archive_manifest.json) recording, for every
+archived file, the source size, mtime and a content fingerprint along with
+the settings used. Files that are already up to date are skipped, so an
+interrupted run can simply be started again. Outputs are written to a
+`.part` file and renamed once complete, so a partial output is never
+mistaken for a finished one.
+
+Usage:
+    python -m multicamera_acquisition.archive /data/recordings/session \
+        /archive/session --codec libx265 --crf 15 --jobs 8
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from fractions import Fraction
+from pathlib import Path
+
+import numpy as np
+
+VIDEO_PATTERNS = ["*.avi", "*.mp4"]
+DATA_PATTERNS = [
+    "*metadata*.csv",
+    "*metadata*.bin",
+    "*triggerdata*.csv",
+    "*triggerdata*.bin",
+]
+MANIFEST_NAME = ".archive_manifest.json"
+
+# streams in these formats (16 bit depth) are copied, not re-encoded, so that
+# they stay lossless
+LOSSLESS_PIX_FMTS = ["gray16le", "gray16be"]
+
+_FINGERPRINT_BYTES = 1024 * 1024
+
+
+def fingerprint(file_name):
+    """A fast content fingerprint: sha1 of the size and the first and last MiB."""
+    size = os.path.getsize(file_name)
+    digest = hashlib.sha1(str(size).encode("ascii"))
+    with open(file_name, "rb") as f:
+        digest.update(f.read(_FINGERPRINT_BYTES))
+        if size > _FINGERPRINT_BYTES:
+            f.seek(max(_FINGERPRINT_BYTES, size - _FINGERPRINT_BYTES))
+            digest.update(f.read(_FINGERPRINT_BYTES))
+    return digest.hexdigest()
+
+
+def part_file_name(destination):
+    """Where an output is written until it is complete, e.g. top.part.mp4"""
+    destination = Path(destination)
+    return destination.with_name(f"{destination.stem}.part{destination.suffix}")
+
+
+def discover_session(session_root, exclude=None):
+    """Find the videos and data files of a session.
+
+    Parameters
+    ----------
+    session_root : str or Path
+    exclude : str or Path (default: None)
+        A directory to ignore (e.g. the archive, if it is inside the session).
+
+    Returns
+    -------
+    videos, data_files : lists of Path
+    """
+    session_root = Path(session_root)
+    exclude = None if exclude is None else Path(exclude).resolve()
+
+    def find(patterns):
+        files = set()
+        for pattern in patterns:
+            for file_name in session_root.rglob(pattern):
+                if ".part." in file_name.name or not file_name.is_file():
+                    continue
+                if exclude is not None and exclude in file_name.resolve().parents:
+                    continue
+                files.add(file_name)
+        return sorted(files)
+
+    return find(VIDEO_PATTERNS), find(DATA_PATTERNS)
+
+
+def transcode_video(
+    source, destination, codec="libx265", crf=15, preset="ultrafast", hflip=False, threads=0
+):
+    """Re-encode a (grayscale) video with PyAV.
+
+    16 bit videos are copied unchanged.
+
+    Returns
+    -------
+    frames_in, frames_out : int
+        Frames decoded from the source and encoded to the destination.
+    """
+    import av
+
+    with av.open(str(source)) as reader:
+        in_stream = reader.streams.video[0]
+        if in_stream.codec_context.pix_fmt in LOSSLESS_PIX_FMTS:
+            shutil.copyfile(source, destination)
+            return in_stream.frames, in_stream.frames
+
+        in_stream.thread_type = "AUTO"
+        rate = Fraction(in_stream.average_rate or in_stream.guessed_rate or 30)
+        time_base = 1 / rate
+        frames_in = 0
+        with av.open(str(destination), "w") as writer:
+            out_stream = writer.add_stream(codec, rate=rate)
+            out_stream.width = in_stream.codec_context.width
+            out_stream.height = in_stream.codec_context.height
+            out_stream.pix_fmt = "yuv420p"
+            options = {"crf": str(crf), "preset": preset}
+            if codec == "libx265":
+                options["x265-params"] = "log-level=error"
+                if Path(destination).suffix in [".mp4", ".mov"]:
+                    # lets QuickTime play hevc
+                    out_stream.codec_tag = "hvc1"
+            out_stream.options = options
+            out_stream.thread_count = threads
+
+            for frame in reader.decode(in_stream):
+                if hflip:
+                    flipped = np.ascontiguousarray(frame.to_ndarray(format="gray")[:, ::-1])
+                    frame = av.VideoFrame.from_ndarray(flipped, format="gray")
+                frame.pts = frames_in
+                frame.time_base = time_base
+                frames_in += 1
+                for packet in out_stream.encode(frame):
+                    writer.mux(packet)
+            for packet in out_stream.encode(None):
+                writer.mux(packet)
+
+    with av.open(str(destination)) as check:
+        frames_out = sum(1 for packet in check.demux(video=0) if packet.size > 0)
+    return frames_in, frames_out
+
+
+def _archive_file(job):
+    """Archive one file (runs in a worker process)."""
+    source, destination = Path(job["source"]), Path(job["destination"])
+    part = part_file_name(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    result = {
+        "source": job["relative_path"],
+        "kind": job["kind"],
+        "bytes_in": source.stat().st_size,
+        "bytes_out": 0,
+        "frames": 0,
+        "error": None,
+    }
+    start = time.perf_counter()
+    try:
+        if job["kind"] == "video":
+            settings = job["settings"]
+            frames_in, frames_out = transcode_video(
+                source,
+                part,
+                codec=settings["codec"],
+                crf=settings["crf"],
+                preset=settings["preset"],
+                hflip=settings["hflip"],
+                threads=job["threads"],
+            )
+            if frames_in != frames_out:
+                raise RuntimeError(f"{frames_in} frames read but {frames_out} written")
+            result["frames"] = frames_out
+        else:
+            shutil.copyfile(source, part)
+        os.replace(part, destination)
+        result["bytes_out"] = destination.stat().st_size
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        if part.exists():
+            part.unlink()
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def load_manifest(output_root):
+    manifest_file = Path(output_root) / MANIFEST_NAME
+    if not manifest_file.exists():
+        return {}
+    with open(manifest_file, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(output_root, manifest):
+    """Write the manifest atomically, so an interruption can't corrupt it."""
+    manifest_file = Path(output_root) / MANIFEST_NAME
+    tmp_file = manifest_file.with_name(manifest_file.name + ".tmp")
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_file, manifest_file)
+
+
+def is_up_to_date(entry, source, destination, settings):
+    """Whether a manifest entry shows that `destination` is current."""
+    if entry is None or entry.get("settings") != settings:
+        return False
+    if not destination.exists() or destination.stat().st_size != entry["output_size"]:
+        return False
+    stat = source.stat()
+    if stat.st_size != entry["size"]:
+        return False
+    if stat.st_mtime_ns == entry["mtime_ns"]:
+        return True
+    # e.g. the session was copied, which changes mtimes but not contents
+    return fingerprint(source) == entry["fingerprint"]
+
+
+def archive_session(
+    session_root,
+    output_root,
+    codec="libx265",
+    crf=15,
+    preset="ultrafast",
+    mirror=(),
+    jobs=None,
+    force=False,
+    delete_source=False,
+):
+    """Transcode the videos of a session and copy its data files, in parallel.
+
+    Parameters
+    ----------
+    session_root : str or Path
+        Directory searched (recursively) for videos and data files.
+    output_root : str or Path
+        The archive. The directory structure under session_root is kept.
+    codec : str (default: 'libx265')
+        Video codec (any encoder known to PyAV, e.g. 'libx264').
+    crf : int (default: 15)
+        Quality (0 = lossless, 51 = worst).
+    preset : str (default: 'ultrafast')
+        Encoder preset.
+    mirror : list of str (default: ())
+        Camera names whose videos are flipped horizontally (e.g. bottom
+        cameras). A video matches if its file name starts with `{name}.`.
+    jobs : int (default: None)
+        Number of worker processes, defaults to the number of CPUs.
+    force : bool (default: False)
+        Archive every file, even if it is up to date.
+    delete_source : bool (default: False)
+        Delete each source file once it has been archived.
+
+    Returns
+    -------
+    report : dict
+        Counts of archived / skipped / failed files, bytes, frames, wall
+        time and aggregate throughput, plus a result per archived file.
+    """
+    session_root, output_root = Path(session_root), Path(output_root)
+    output_root.mkdir(parents=True, exist_ok=True)
+    jobs = jobs or os.cpu_count() or 1
+    manifest = load_manifest(output_root)
+    videos, data_files = discover_session(session_root, exclude=output_root)
+
+    video_settings = {"codec": codec, "crf": crf, "preset": preset}
+    tasks = []
+    skipped = 0
+    for kind, files in [("video", videos), ("copy", data_files)]:
+        for source in files:
+            relative_path = source.relative_to(session_root).as_posix()
+            destination = output_root / relative_path
+            if kind == "video":
+                camera = source.name.split(".")[0]
+                settings = dict(video_settings, hflip=camera in mirror)
+            else:
+                settings = {}
+            # leftovers of an interrupted run
+            if part_file_name(destination).exists():
+                part_file_name(destination).unlink()
+            if not force and is_up_to_date(
+                manifest.get(relative_path), source, destination, settings
+            ):
+                skipped += 1
+                continue
+            tasks.append(
+                {
+                    "source": str(source),
+                    "destination": str(destination),
+                    "relative_path": relative_path,
+                    "kind": kind,
+                    "settings": settings,
+                    # encoder threads, so that the pool doesn't oversubscribe
+                    "threads": max(1, (os.cpu_count() or 1) // jobs),
+                }
+            )
+    logging.log(
+        logging.INFO,
+        f"Archiving {len(tasks)} files ({skipped} up to date) with {jobs} processes",
+    )
+
+    results = []
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(_archive_file, task): task for task in tasks}
+        for future in concurrent.futures.as_completed(futures):
+            task = futures[future]
+            result = future.result()
+            results.append(result)
+            if result["error"] is not None:
+                logging.log(
+                    logging.WARNING, f"Failed to archive {task['relative_path']}: {result['error']}"
+                )
+                continue
+            source = Path(task["source"])
+            stat = source.stat()
+            manifest[task["relative_path"]] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "fingerprint": fingerprint(source),
+                "settings": task["settings"],
+                "output_size": result["bytes_out"],
+            }
+            # saved after every file, so an interrupted run can resume
+            save_manifest(output_root, manifest)
+            if delete_source:
+                source.unlink()
+    wall_time = time.perf_counter() - start
+
+    done = [r for r in results if r["error"] is None]
+    bytes_in = sum(r["bytes_in"] for r in done)
+    bytes_out = sum(r["bytes_out"] for r in done)
+    frames = sum(r["frames"] for r in done)
+    return {
+        "archived": len(done),
+        "skipped": skipped,
+        "failed": len(results) - len(done),
+        "bytes_in": bytes_in,
+        "bytes_out": bytes_out,
+        "frames": frames,
+        "wall_time_s": wall_time,
+        "throughput_mb_s": bytes_in / 1e6 / wall_time if wall_time > 0 else 0.0,
+        "throughput_fps": frames / wall_time if wall_time > 0 else 0.0,
+        "compression_ratio": bytes_in / bytes_out if bytes_out > 0 else None,
+        "jobs": jobs,
+        "files": sorted(results, key=lambda r: r["source"]),
+    }
+
+
+def print_report(report):
+    print(
+        f"archived {report['archived']}, skipped {report['skipped']} (up to date), "
+        f"failed {report['failed']}"
+    )
+    print(
+        f"{report['bytes_in'] / 1e9:.2f} GB in, {report['bytes_out'] / 1e9:.2f} GB out, "
+        f"{report['frames']} frames in {report['wall_time_s']:.1f} s "
+        f"with {report['jobs']} processes"
+    )
+    print(
+        f"throughput: {report['throughput_mb_s']:.1f} MB/s, "
+        f"{report['throughput_fps']:.0f} frames/s"
+    )
+    for result in report["files"]:
+        if result["error"] is not None:
+            print(f"  FAILED {result['source']}: {result['error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Transcode and archive the videos and data files of a session."
+    )
+    parser.add_argument("session_root")
+    parser.add_argument("output_root")
+    parser.add_argument("--codec", default="libx265")
+    parser.add_argument("--crf", type=int, default=15)
+    parser.add_argument("--preset", default="ultrafast")
+    parser.add_argument("--mirror", nargs="*", default=[], help="cameras to flip")
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--force", action="store_true")
+    parser.add_argument("--delete-source", action="store_true")
+    parser.add_argument("--report", default=None, help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    report = archive_session(
+        args.session_root,
+        args.output_root,
+        codec=args.codec,
+        crf=args.crf,
+        preset=args.preset,
+        mirror=args.mirror,
+        jobs=args.jobs,
+        force=args.force,
+        delete_source=args.delete_source,
+    )
+    print_report(report)
+    if args.report is not None:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["failed"] > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
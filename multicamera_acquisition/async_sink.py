@@ -0,0 +1,154 @@
+import logging
+import queue
+import threading
+import time
+
+
+class AsyncFileSink(object):
+    """Writes to a file object from a background thread, in large chunks.
+
+    `write` copies data into a preallocated chunk and returns immediately.
+    Full chunks are written by a background thread, so a slow disk (or a slow
+    ffmpeg pipe) no longer stalls the encoder. Only `max_pending_chunks` chunks
+    exist, so at most that much data is pending: when every chunk is waiting to
+    be written, `write` blocks until one is free.
+
+    With `max_delay_s`, a partly filled chunk is also handed to the background
+    thread once its oldest data is that old, so a reader at the other end of a
+    pipe (ffmpeg) gets a steady stream instead of a burst per chunk.
+
+    Errors raised by the file (e.g. BrokenPipeError) are re-raised by the next
+    call to `write`, `flush` or `close`.
+
+    Attributes
+    ----------
+    bytes_written : int
+        Bytes written to the file so far.
+    peak_pending_bytes : int
+        The most bytes that have been waiting to be written at once.
+    """
+
+    def __init__(
+        self, file, chunk_bytes=8 * 1024 * 1024, max_pending_chunks=4, max_delay_s=None
+    ):
+        """
+        Parameters
+        ----------
+        file : file object
+            An open binary file, or the stdin of a subprocess.
+        chunk_bytes : int (default: 8 MB)
+            Size of each write to the file.
+        max_pending_chunks : int (default: 4)
+            Number of chunks, which bounds the memory used by the sink.
+        max_delay_s : float (default: None)
+            If not None, a partly filled chunk is written once its oldest
+            data has waited this long (checked on each `write`).
+        """
+        self.file = file
+        self.chunk_bytes = int(chunk_bytes)
+        self.max_delay_s = max_delay_s
+        self._chunk_started = None
+        self.bytes_written = 0
+        self.bytes_submitted = 0
+        self.peak_pending_bytes = 0
+        self._error = None
+        self._closed = False
+
+        self._free_chunks = queue.Queue()
+        for _ in range(max_pending_chunks):
+            self._free_chunks.put(bytearray(self.chunk_bytes))
+        self._full_chunks = queue.Queue()
+        self._chunk = self._free_chunks.get()
+        self._position = 0
+
+        self._thread = threading.Thread(target=self._write_chunks, daemon=True)
+        self._thread.start()
+
+    @property
+    def pending_bytes(self):
+        """Bytes accepted by `write` that have not been written to the file."""
+        return self.bytes_submitted - self.bytes_written
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def write(self, data):
+        """Queue data (any contiguous buffer, e.g. a numpy array) for writing."""
+        self._raise_error()
+        view = memoryview(data).cast("B")
+        n_bytes = len(view)
+        offset = 0
+        if self.max_delay_s is not None and self._position == 0:
+            self._chunk_started = time.monotonic()
+        while offset < n_bytes:
+            n_copy = min(self.chunk_bytes - self._position, n_bytes - offset)
+            self._chunk[self._position : self._position + n_copy] = view[
+                offset : offset + n_copy
+            ]
+            self._position += n_copy
+            offset += n_copy
+            if self._position == self.chunk_bytes:
+                self._submit_chunk()
+                if self.max_delay_s is not None:
+                    self._chunk_started = time.monotonic()
+        if (
+            self.max_delay_s is not None
+            and self._position > 0
+            and time.monotonic() - self._chunk_started >= self.max_delay_s
+            # if no chunk is free, the file is behind anyway: keep filling
+            and not self._free_chunks.empty()
+        ):
+            self._submit_chunk()
+        self.bytes_submitted += n_bytes
+        self.peak_pending_bytes = max(self.peak_pending_bytes, self.pending_bytes)
+        return n_bytes
+
+    def _submit_chunk(self):
+        self._full_chunks.put((self._chunk, self._position))
+        # blocks if every chunk is waiting to be written
+        self._chunk = self._free_chunks.get()
+        self._position = 0
+
+    def _write_chunks(self):
+        while True:
+            item = self._full_chunks.get()
+            if item is None:
+                self._full_chunks.task_done()
+                break
+            chunk, n_bytes = item
+            try:
+                if self._error is None:
+                    self.file.write(memoryview(chunk)[:n_bytes])
+            except Exception as e:
+                # keep draining so that write never blocks forever
+                self._error = e
+            finally:
+                self.bytes_written += n_bytes
+                self._free_chunks.put(chunk)
+                self._full_chunks.task_done()
+
+    def flush(self):
+        """Block until everything passed to `write` has been written."""
+        if self._position > 0:
+            self._submit_chunk()
+        self._full_chunks.join()
+        self._raise_error()
+        self.file.flush()
+
+    def close(self):
+        """Flush and stop the background thread. Does not close the file."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.flush()
+        finally:
+            self._full_chunks.put(None)
+            self._thread.join()
+            logging.log(
+                logging.DEBUG,
+                f"Sink closed, {self.bytes_written} bytes written, "
+                f"peak pending {self.peak_pending_bytes} bytes",
+            )
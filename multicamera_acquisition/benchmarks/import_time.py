@@ -0,0 +1,153 @@
+""" Cold import time benchmark.
+
+Measures how long a fresh interpreter takes to `import
+multicamera_acquisition.acquisition` (or any other module), lists the slowest
+imports (from `python -X importtime`), and checks that no heavy or optional
+dependency was imported along the way. Vendor SDKs, the NVIDIA codec and the
+display / plotting libraries should only be imported by the feature that
+needs them.
+
+Usage:
+    python -m multicamera_acquisition.benchmarks.import_time --repeats 5 \
+        --max-seconds 0.5
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+import numpy as np
+
+# modules that importing the acquisition code must not pull in
+HEAVY_MODULES = [
+    "PyNvCodec",
+    "pypylon",
+    "PySpin",
+    "pyk4a",
+    "arena_api",
+    "matplotlib",
+    "pandas",
+    "tkinter",
+    "cv2",
+    "av",
+    "PIL",
+]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure_import(module="multicamera_acquisition.acquisition"):
+    """Import a module in a fresh interpreter.
+
+    Returns
+    -------
+    seconds : float
+        Time taken by the import statement.
+    modules : list of str
+        Every module loaded once the import finished.
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module)],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return result["seconds"], result["modules"]
+
+
+def heavy_imports(modules, heavy_modules=HEAVY_MODULES):
+    """Return the heavy modules (or their submodules) present in `modules`."""
+    return sorted(
+        {m.split(".")[0] for m in modules if m.split(".")[0] in heavy_modules}
+    )
+
+
+def slowest_imports(module="multicamera_acquisition.acquisition", n=15):
+    """Return the n imports with the largest cumulative time (us), from
+    `python -X importtime`."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    times = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times.append((int(cumulative), name.strip()))
+    return sorted(times, reverse=True)[:n]
+
+
+def run_benchmark(module="multicamera_acquisition.acquisition", repeats=5):
+    """Measure the cold import time of a module.
+
+    Returns
+    -------
+    result : dict
+        Median / min / max seconds over the repeats, the heavy modules that
+        were imported and the slowest imports.
+    """
+    seconds = []
+    for _ in range(repeats):
+        elapsed, modules = measure_import(module)
+        seconds.append(elapsed)
+    return {
+        "module": module,
+        "repeats": repeats,
+        "median_s": float(np.median(seconds)),
+        "min_s": float(np.min(seconds)),
+        "max_s": float(np.max(seconds)),
+        "heavy_imports": heavy_imports(modules),
+        "slowest_imports_us": slowest_imports(module),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default="multicamera_acquisition.acquisition")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=None,
+        help="exit with an error if the median import time is longer",
+    )
+    parser.add_argument("--output", default=None, help="write the result as JSON")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.module, args.repeats)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    print(
+        f"import {result['module']}: median {result['median_s'] * 1000:.0f} ms "
+        f"(min {result['min_s'] * 1000:.0f}, max {result['max_s'] * 1000:.0f}, "
+        f"{result['repeats']} runs)"
+    )
+    print("slowest imports (cumulative ms):")
+    for cumulative, name in result["slowest_imports_us"]:
+        print(f"  {cumulative / 1000:>8.1f}  {name}")
+
+    failed = False
+    if len(result["heavy_imports"]) > 0:
+        print(f"heavy modules imported: {', '.join(result['heavy_imports'])}")
+        failed = True
+    if args.max_seconds is not None and result["median_s"] > args.max_seconds:
+        print(f"median import time exceeds {args.max_seconds} s")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
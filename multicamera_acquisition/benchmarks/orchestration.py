@@ -0,0 +1,217 @@
+""" End-to-end benchmark of acquire_video against an emulated arduino.
+
+Runs the whole control path (port discovery, handshake, camera start-up,
+serial reading, trigger logging, shutdown) with synthetic cameras that are
+triggered by an ArduinoEmulator, so no hardware is needed. For each run it
+records the wall time spent outside the recording itself, the frames written
+per camera against the triggers sent, and the input events logged against
+those emitted.
+
+Usage:
+    python -m multicamera_acquisition.benchmarks.orchestration \
+        --cameras 4 --fps 100 --duration 5 --input-event-rate 1000 \
+        --output orchestration.json
+"""
+
+import argparse
+import json
+import logging
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from multicamera_acquisition.acquisition import acquire_video
+from multicamera_acquisition.interfaces.arduino_emulator import ArduinoEmulator
+from multicamera_acquisition.metadata_store import count_rows
+from multicamera_acquisition.trigger_data import read_trigger_data
+
+
+def _count_frames(metadata_file):
+    if metadata_file.suffix == ".bin":
+        return int(count_rows(metadata_file))
+    with open(metadata_file, "r") as f:
+        return max(0, len(f.readlines()) - 1)
+
+
+def run_orchestration(
+    save_location,
+    n_cameras=2,
+    fps=30,
+    duration=2,
+    width=64,
+    height=48,
+    input_event_rate=100,
+    serial_protocol="text",
+    triggerdata_format="csv",
+    metadata_format="csv",
+    encoder=None,
+    memory_budget_bytes=None,
+    queue_policy="block",
+    cpu_affinity=None,
+    realtime_priority=None,
+    grab_mode="poll",
+):
+    """Record with synthetic cameras and an emulated arduino.
+
+    Returns
+    -------
+    result : dict
+    """
+    save_location = Path(save_location)
+    save_location.mkdir(parents=True, exist_ok=True)
+    trigger_clock = save_location / "trigger_clock.json"
+    camera_list = [
+        {
+            "name": f"cam{i}",
+            "serial": f"synthetic{i}",
+            "brand": "synthetic",
+            "width": width,
+            "height": height,
+            "trigger_clock": str(trigger_clock),
+        }
+        for i in range(n_cameras)
+    ]
+    if encoder is not None:
+        for camera_dict in camera_list:
+            camera_dict["encoder"] = encoder
+
+    emulator = ArduinoEmulator(
+        input_event_rate=input_event_rate,
+        protocol=serial_protocol,
+        trigger_clock=trigger_clock,
+        seed=0,
+    )
+    with emulator:
+        start = time.monotonic()
+        acquire_video(
+            save_location,
+            camera_list,
+            recording_duration_s=duration,
+            framerate=fps,
+            display_framerate=fps,
+            append_datetime=False,
+            overwrite=True,
+            verbose=False,
+            arduino_port=emulator.port,
+            arduino_port_cache=None,
+            serial_protocol=serial_protocol,
+            triggerdata_format=triggerdata_format,
+            metadata_format=metadata_format,
+            memory_budget_bytes=memory_budget_bytes,
+            queue_policy=queue_policy,
+            cpu_affinity=cpu_affinity,
+            realtime_priority=realtime_priority,
+            grab_mode=grab_mode,
+        )
+        wall_time = time.monotonic() - start
+
+    n_triggers = int(round(duration * fps))
+    frames = {}
+    for camera_dict in camera_list:
+        stem = f"{camera_dict['name']}.{camera_dict['serial']}"
+        metadata_files = list(save_location.glob(f"{stem}*.metadata.*"))
+        frames[camera_dict["name"]] = sum(_count_frames(f) for f in metadata_files)
+    triggerdata_file = save_location / (
+        "triggerdata.bin" if triggerdata_format == "binary" else "triggerdata.csv"
+    )
+    events_logged = len(read_trigger_data(triggerdata_file)["pulse_id"])
+
+    return {
+        "n_cameras": n_cameras,
+        "fps": fps,
+        "duration": duration,
+        "resolution": f"{width}x{height}",
+        "input_event_rate": input_event_rate,
+        "serial_protocol": serial_protocol,
+        "triggerdata_format": triggerdata_format,
+        "cpu_affinity": cpu_affinity,
+        "realtime_priority": realtime_priority,
+        "grab_mode": grab_mode,
+        "wall_time_s": wall_time,
+        "overhead_s": wall_time - duration,
+        "triggers": n_triggers,
+        "frames": frames,
+        "min_frame_fraction": min(frames.values()) / n_triggers if n_triggers else 0,
+        "input_events_emitted": emulator.n_input_events,
+        "input_events_logged": events_logged,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--cameras", type=int, default=2)
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--duration", type=float, default=2)
+    parser.add_argument("--resolution", default="64x48")
+    parser.add_argument("--input-event-rate", type=float, default=100)
+    parser.add_argument("--serial-protocol", default="text", choices=["text", "binary"])
+    parser.add_argument(
+        "--triggerdata-format", default="csv", choices=["csv", "binary"]
+    )
+    parser.add_argument("--metadata-format", default="csv", choices=["csv", "binary"])
+    parser.add_argument("--encoder", default=None)
+    parser.add_argument("--memory-budget-mb", type=float, default=None)
+    parser.add_argument(
+        "--queue-policy",
+        default="block",
+        choices=["block", "drop_oldest", "drop_newest", "decimate_display"],
+    )
+    parser.add_argument("--cpu-affinity", default=None, choices=["auto"])
+    parser.add_argument("--realtime-priority", type=int, default=None)
+    parser.add_argument("--grab-mode", default="poll", choices=["poll", "callback"])
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--save-location", default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    width, height = [int(v) for v in args.resolution.split("x")]
+    results = []
+    for repeat in range(args.repeats):
+        save_location = Path(
+            tempfile.mkdtemp() if args.save_location is None else args.save_location
+        ) / f"run{repeat}"
+        try:
+            result = run_orchestration(
+                save_location,
+                n_cameras=args.cameras,
+                fps=args.fps,
+                duration=args.duration,
+                width=width,
+                height=height,
+                input_event_rate=args.input_event_rate,
+                serial_protocol=args.serial_protocol,
+                triggerdata_format=args.triggerdata_format,
+                metadata_format=args.metadata_format,
+                encoder=args.encoder,
+                memory_budget_bytes=(
+                    None
+                    if args.memory_budget_mb is None
+                    else int(args.memory_budget_mb * 1e6)
+                ),
+                queue_policy=args.queue_policy,
+                cpu_affinity=args.cpu_affinity,
+                realtime_priority=args.realtime_priority,
+                grab_mode=args.grab_mode,
+            )
+        finally:
+            if args.save_location is None:
+                shutil.rmtree(save_location.parent, ignore_errors=True)
+        results.append(result)
+        print(
+            f"run {repeat}: {result['wall_time_s']:.2f} s wall "
+            f"({result['overhead_s']:.2f} s overhead), "
+            f"frames/triggers {result['min_frame_fraction']:.3f}, "
+            f"input events {result['input_events_logged']}/"
+            f"{result['input_events_emitted']}"
+        )
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
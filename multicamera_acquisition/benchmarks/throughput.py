@@ -0,0 +1,518 @@
+""" End-to-end throughput benchmark for the acquisition pipeline.
+
+Drives AcquisitionLoop -> write queue -> Writer with synthetic cameras over a
+matrix of camera counts, resolutions, pixel formats, encoder backends and grab
+modes (polling or SDK callbacks), and records for each case the sustained
+frame rate, peak queue size, CPU use and context switches per process, bytes
+written per second and dropped frames. Results are written to
+a JSON file so that hosts and releases can be compared with `compare_results`.
+
+Usage:
+    python -m multicamera_acquisition.benchmarks.throughput \
+        --cameras 1 4 8 --resolutions 640x480 1920x1200 \
+        --pixel-formats gray8 gray16 --fps 150 --duration 10 \
+        --grab-modes poll callback --output throughput.json
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from multicamera_acquisition.acquisition import (
+    AcquisitionLoop,
+    Writer,
+    create_write_queue,
+    end_processes,
+    initialize_acquisition_loops,
+    release_write_queues,
+)
+from multicamera_acquisition.encoders import ENCODERS
+
+# Writer ffmpeg_options for encoder backends that need them
+ENCODER_OPTIONS = {
+    "nvenc": {"gpu": 0},
+}
+
+
+def process_cpu_seconds(pid):
+    """Return the user + system CPU seconds used by a process and its children.
+
+    Uses psutil if it is installed, otherwise /proc (Linux only). Returns
+    None if neither is available.
+    """
+    try:
+        import psutil
+
+        process = psutil.Process(pid)
+        processes = [process] + process.children(recursive=True)
+        total = 0.0
+        for p in processes:
+            try:
+                times = p.cpu_times()
+                total += times.user + times.system
+            except psutil.NoSuchProcess:
+                pass
+        return total
+    except ImportError:
+        pass
+    except Exception:
+        return None
+
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        # utime and stime are fields 14 and 15 of /proc/pid/stat
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def process_context_switches(pid):
+    """Return the context switches (voluntary + involuntary) of a process.
+
+    Every wake-up of a waiting thread is a voluntary context switch. Counts
+    every thread from /proc (Linux only), otherwise uses psutil if it is
+    installed. Returns None if neither is available.
+    """
+    try:
+        total = 0
+        for task in Path(f"/proc/{pid}/task").iterdir():
+            with open(task / "status") as f:
+                for line in f:
+                    if line.startswith(
+                        ("voluntary_ctxt_switches", "nonvoluntary_ctxt_switches")
+                    ):
+                        total += int(line.split()[-1])
+        return total
+    except (OSError, ValueError):
+        pass
+
+    try:
+        import psutil
+
+        switches = psutil.Process(pid).num_ctx_switches()
+        return switches.voluntary + switches.involuntary
+    except Exception:
+        return None
+
+
+def host_info():
+    """Describe the host, so results from different machines can be told apart."""
+    return {
+        "hostname": platform.node(),
+        "platform": platform.platform(),
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "processor": platform.processor(),
+        "date": datetime.now().isoformat(),
+    }
+
+
+def read_metadata(metadata_file):
+    """Return the frame ids and queue sizes recorded by a Writer."""
+    with open(metadata_file) as f:
+        rows = list(csv.DictReader(f))
+    frame_ids = np.array([int(row["frame_id"]) for row in rows], dtype=np.int64)
+    queue_sizes = np.array([int(row["queue_size"]) for row in rows], dtype=np.int64)
+    return frame_ids, queue_sizes
+
+
+def run_case(
+    save_location,
+    n_cameras,
+    resolution,
+    pixel_format="gray8",
+    encoder=None,
+    fps=100,
+    duration_s=10,
+    transport="queue",
+    sample_interval_s=0.1,
+    grab_mode="poll",
+):
+    """Run one benchmark case and return its measurements.
+
+    Parameters
+    ----------
+    save_location : Path
+        Directory in which videos and metadata are written.
+    n_cameras : int
+        Number of synthetic cameras.
+    resolution : tuple (width, height)
+        Frame size of each camera.
+    pixel_format : str (default: 'gray8')
+        'gray8' or 'gray16'.
+    encoder : str (default: None)
+        Encoder backend (a name in encoders.ENCODERS). If it is not
+        available, or None, the writer's defaults are used; the backend
+        actually used is recorded as 'encoder_used'.
+    fps : float (default: 100)
+        Frame rate of each camera.
+    duration_s : float (default: 10)
+        How long to record.
+    transport : str (default: 'queue')
+        'queue' or 'shared_memory' (see `create_write_queue`).
+    sample_interval_s : float (default: 0.1)
+        How often to sample queue sizes while recording.
+    grab_mode : str (default: 'poll')
+        'poll' or 'callback' (see `AcquisitionLoop`).
+
+    Returns
+    -------
+    result : dict
+    """
+    save_location = Path(save_location)
+    save_location.mkdir(parents=True, exist_ok=True)
+    width, height = resolution
+    bit_depth = 16 if pixel_format == "gray16" else 8
+
+    write_queues = []
+    writers = []
+    acquisition_loops = []
+    metadata_files = []
+    for i in range(n_cameras):
+        name = f"synthetic{i}"
+        write_queue = create_write_queue(
+            transport, max_frame_bytes=width * height * bit_depth // 8
+        )
+        write_queues.append(write_queue)
+        metadata_file = save_location / f"{name}.metadata.csv"
+        metadata_files.append(metadata_file)
+        writers.append(
+            Writer(
+                queue=write_queue,
+                video_file_name=save_location / f"{name}.{'avi' if bit_depth == 16 else 'mp4'}",
+                metadata_file_name=metadata_file,
+                camera_serial=str(i),
+                camera_name=name,
+                camera_brand="synthetic",
+                fps=fps,
+                ffmpeg_options=dict(ENCODER_OPTIONS.get(encoder, {})),
+                depth=bit_depth == 16,
+                encoder=encoder,
+            )
+        )
+        acquisition_loops.append(
+            AcquisitionLoop(
+                write_queue=write_queue,
+                display_queue=None,
+                brand="synthetic",
+                frame_timeout=1000,
+                name=name,
+                serial=str(i),
+                width=width,
+                height=height,
+                bit_depth=bit_depth,
+                fps=fps,
+                grab_mode=grab_mode,
+            )
+        )
+
+    for writer in writers:
+        writer.start()
+    try:
+        initialize_acquisition_loops(acquisition_loops)
+    except RuntimeError:
+        for process in acquisition_loops + writers:
+            process.terminate()
+        release_write_queues(write_queues)
+        raise
+
+    pids = {
+        "acquisition": [loop.pid for loop in acquisition_loops],
+        "writer": [writer.pid for writer in writers],
+    }
+    cpu_start = {
+        role: [process_cpu_seconds(pid) for pid in role_pids]
+        for role, role_pids in pids.items()
+    }
+    switches_start = [process_context_switches(pid) for pid in pids["acquisition"]]
+
+    for acquisition_loop in acquisition_loops:
+        acquisition_loop.prime()
+    for acquisition_loop in acquisition_loops:
+        acquisition_loop.ready.wait()
+    start = time.perf_counter()
+    frames_at_start = [writer.frames_written.value for writer in writers]
+
+    peak_queue_size = 0
+    while time.perf_counter() - start < duration_s:
+        for write_queue in write_queues:
+            peak_queue_size = max(peak_queue_size, write_queue.qsize())
+        time.sleep(sample_interval_s)
+    elapsed = time.perf_counter() - start
+    # frames still queued at this point are written while shutting down, and
+    # must not count towards the sustained rate
+    frames_in_window = [
+        writer.frames_written.value - before
+        for writer, before in zip(writers, frames_at_start)
+    ]
+
+    cpu = {}
+    for role, role_pids in pids.items():
+        seconds = []
+        for pid, before in zip(role_pids, cpu_start[role]):
+            after = process_cpu_seconds(pid)
+            if before is None or after is None:
+                seconds.append(None)
+            else:
+                seconds.append(after - before)
+        cpu[role] = [None if s is None else s / elapsed * 100 for s in seconds]
+    context_switches = []
+    for pid, before in zip(pids["acquisition"], switches_start):
+        after = process_context_switches(pid)
+        if before is None or after is None:
+            context_switches.append(None)
+        else:
+            context_switches.append((after - before) / elapsed)
+
+    end_processes(acquisition_loops, writers, None)
+    release_write_queues(write_queues)
+
+    frames_written = 0
+    dropped_frames = 0
+    for metadata_file, n_frames in zip(metadata_files, frames_in_window):
+        frame_ids, queue_sizes = read_metadata(metadata_file)
+        frames_written += len(frame_ids)
+        if len(queue_sizes) > 0:
+            peak_queue_size = max(peak_queue_size, int(queue_sizes.max()))
+        # synthetic frames are never lost, but arrive late if the pipeline
+        # can't keep up; a real camera would drop them
+        dropped_frames += max(0, int(round(elapsed * fps)) - n_frames)
+
+    bytes_written = sum(
+        f.stat().st_size
+        for f in save_location.iterdir()
+        if f.suffix in [".mp4", ".avi", ".raw"]
+    )
+
+    return {
+        "n_cameras": n_cameras,
+        "resolution": f"{width}x{height}",
+        "pixel_format": pixel_format,
+        "encoder": encoder or "default",
+        "encoder_used": sorted(
+            set(writer.encoder_name for writer in writers if writer.encoder_name)
+        ),
+        "transport": transport,
+        "grab_mode": grab_mode,
+        "target_fps": fps,
+        "duration_s": elapsed,
+        "sustained_fps": sum(frames_in_window) / n_cameras / elapsed,
+        "frames_written": frames_written,
+        "frames_drained": frames_written - sum(frames_in_window),
+        "dropped_frames": dropped_frames,
+        "peak_queue_size": peak_queue_size,
+        "cpu_percent": cpu,
+        "acquisition_context_switches_per_s": context_switches,
+        "bytes_written_per_s": bytes_written / elapsed,
+    }
+
+
+def run_benchmark(
+    output_file,
+    camera_counts=(1, 4, 8),
+    resolutions=((640, 480), (1920, 1200)),
+    pixel_formats=("gray8",),
+    encoders=(None,),
+    fps=100,
+    duration_s=10,
+    transport="queue",
+    save_location=None,
+    keep_videos=False,
+    grab_modes=("poll",),
+):
+    """Run every combination of the benchmark parameters and save the results.
+
+    Parameters
+    ----------
+    output_file : str or Path
+        JSON file to which results are written.
+    camera_counts, resolutions, pixel_formats, encoders, grab_modes : iterables
+        The benchmark matrix. Resolutions are (width, height) tuples, and an
+        encoder of None uses the writer's default backends.
+    fps, duration_s, transport
+        Passed to `run_case`.
+    save_location : str or Path (default: None)
+        Where videos are written. Defaults to a temporary directory.
+    keep_videos : bool (default: False)
+        If False, videos are deleted after each case.
+
+    Returns
+    -------
+    results : dict
+    """
+    if save_location is None:
+        save_location = tempfile.mkdtemp(prefix="multicamera_benchmark_")
+    save_location = Path(save_location)
+
+    results = {"host": host_info(), "cases": []}
+    cases = itertools.product(
+        camera_counts, resolutions, pixel_formats, encoders, grab_modes
+    )
+    for n_cameras, resolution, pixel_format, encoder, grab_mode in cases:
+        case_dir = save_location / (
+            f"{n_cameras}cams_{resolution[0]}x{resolution[1]}_{pixel_format}_"
+            f"{encoder or 'default'}_{grab_mode}"
+        )
+        logging.info(f"Running benchmark case {case_dir.name}")
+        try:
+            result = run_case(
+                case_dir,
+                n_cameras,
+                resolution,
+                pixel_format=pixel_format,
+                encoder=encoder,
+                fps=fps,
+                duration_s=duration_s,
+                transport=transport,
+                grab_mode=grab_mode,
+            )
+        except Exception as e:
+            logging.warning(f"Benchmark case {case_dir.name} failed: {e}")
+            result = {
+                "n_cameras": n_cameras,
+                "resolution": f"{resolution[0]}x{resolution[1]}",
+                "pixel_format": pixel_format,
+                "encoder": encoder or "default",
+                "transport": transport,
+                "grab_mode": grab_mode,
+                "error": str(e),
+            }
+        results["cases"].append(result)
+        if not keep_videos:
+            shutil.rmtree(case_dir, ignore_errors=True)
+
+        # save after every case, so a crash doesn't lose the earlier results
+        with open(output_file, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+def _case_key(case):
+    return (
+        case["n_cameras"],
+        case["resolution"],
+        case["pixel_format"],
+        case["encoder"],
+        case["transport"],
+        # results from before grab modes were benchmarked were polled
+        case.get("grab_mode", "poll"),
+    )
+
+
+def compare_results(baseline_file, results_file, tolerance=0.05):
+    """Compare two benchmark result files and report regressions.
+
+    A case regresses if its sustained fps drops by more than `tolerance`
+    (as a fraction), or if it drops frames that the baseline did not.
+
+    Returns
+    -------
+    regressions : list of str
+    """
+    with open(baseline_file) as f:
+        baseline = {_case_key(c): c for c in json.load(f)["cases"] if "error" not in c}
+    with open(results_file) as f:
+        results = {_case_key(c): c for c in json.load(f)["cases"]}
+
+    regressions = []
+    for key, case in results.items():
+        if key not in baseline:
+            continue
+        base = baseline[key]
+        if "error" in case:
+            regressions.append(f"{key}: failed ({case['error']})")
+            continue
+        if case["sustained_fps"] < base["sustained_fps"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: sustained fps {case['sustained_fps']:.1f} < "
+                f"{base['sustained_fps']:.1f}"
+            )
+        if case["dropped_frames"] > base["dropped_frames"]:
+            regressions.append(
+                f"{key}: dropped frames {case['dropped_frames']} > "
+                f"{base['dropped_frames']}"
+            )
+    return regressions
+
+
+def _parse_resolution(resolution):
+    width, height = resolution.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--cameras", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--resolutions", nargs="+", default=["640x480", "1920x1200"])
+    parser.add_argument("--pixel-formats", nargs="+", default=["gray8"])
+    parser.add_argument(
+        "--encoders",
+        nargs="+",
+        default=["default"],
+        choices=["default"] + sorted(ENCODERS.keys()),
+        help="'default' uses the writer's default backends for the host",
+    )
+    parser.add_argument("--fps", type=float, default=100)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--transport", default="queue")
+    parser.add_argument(
+        "--grab-modes", nargs="+", default=["poll"], choices=["poll", "callback"]
+    )
+    parser.add_argument("--output", default="throughput.json")
+    parser.add_argument("--save-location", default=None)
+    parser.add_argument("--keep-videos", action="store_true")
+    parser.add_argument(
+        "--compare", default=None, help="baseline results file to check for regressions"
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    results = run_benchmark(
+        args.output,
+        camera_counts=args.cameras,
+        resolutions=[_parse_resolution(r) for r in args.resolutions],
+        pixel_formats=args.pixel_formats,
+        encoders=[None if e == "default" else e for e in args.encoders],
+        fps=args.fps,
+        duration_s=args.duration,
+        transport=args.transport,
+        save_location=args.save_location,
+        keep_videos=args.keep_videos,
+        grab_modes=args.grab_modes,
+    )
+    for case in results["cases"]:
+        if "error" in case:
+            print(f"{_case_key(case)}: error {case['error']}")
+        else:
+            print(
+                f"{_case_key(case)}: {case['sustained_fps']:.1f} fps "
+                f"({', '.join(case['encoder_used'])}), "
+                f"peak queue {case['peak_queue_size']}, "
+                f"{case['dropped_frames']} dropped, "
+                f"{case['bytes_written_per_s'] / 1e6:.1f} MB/s"
+            )
+
+    if args.compare is not None:
+        regressions = compare_results(args.compare, args.output)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if len(regressions) > 0 else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
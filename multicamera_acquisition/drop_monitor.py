@@ -0,0 +1,148 @@
+""" Online dropped-frame detection.
+
+Each Writer runs a DropDetector on the camera timestamps of the frames it
+writes. The detector keeps a running estimate of the inter-frame interval and
+flags any gap that is much longer than expected, counting the frames that
+should have filled it. Counts are kept in shared memory (DropCounters), so
+`acquire_video` can show them while recording, and every gap is appended to a
+per-camera drop log as it happens.
+"""
+
+import csv
+import logging
+import multiprocessing as mp
+
+import numpy as np
+
+
+class DropCounters(object):
+    """Per-camera frame and dropped-frame counts shared between processes."""
+
+    def __init__(self, camera_names):
+        """
+        Parameters
+        ----------
+        camera_names : list of str
+            One name per counter.
+        """
+        self.camera_names = list(camera_names)
+        self.frames = mp.Array("q", len(self.camera_names))
+        self.dropped = mp.Array("q", len(self.camera_names))
+
+    def index(self, camera_name):
+        return self.camera_names.index(camera_name)
+
+    def summary(self):
+        """Return a short 'name: dropped/frames' string for display."""
+        return ", ".join(
+            f"{name}: {self.dropped[i]}/{self.frames[i]}"
+            for i, name in enumerate(self.camera_names)
+        )
+
+    def max_dropped(self):
+        return max(self.dropped[:]) if len(self.camera_names) > 0 else 0
+
+    def as_dict(self):
+        return {
+            name: {"frames": self.frames[i], "dropped": self.dropped[i]}
+            for i, name in enumerate(self.camera_names)
+        }
+
+
+class DropDetector(object):
+    """Detects dropped frames from gaps between camera timestamps."""
+
+    def __init__(
+        self,
+        gap_threshold=1.5,
+        warmup_frames=16,
+        smoothing=0.05,
+        log_file=None,
+        counters=None,
+        counter_index=None,
+        camera_name="",
+    ):
+        """
+        Parameters
+        ----------
+        gap_threshold : float (default: 1.5)
+            An interval longer than gap_threshold times the expected interval
+            is a gap.
+        warmup_frames : int (default: 16)
+            Number of intervals used for the first estimate (their median).
+        smoothing : float (default: 0.05)
+            Weight of each new (non-gap) interval in the running estimate.
+        log_file : str or Path (default: None)
+            If not None, each gap is appended to this csv file as it happens.
+        counters : DropCounters (default: None)
+            Shared counters to update.
+        counter_index : int (default: None)
+            Index of this camera in counters.
+        camera_name : str
+            Used in log messages.
+        """
+        self.gap_threshold = gap_threshold
+        self.warmup_frames = warmup_frames
+        self.smoothing = smoothing
+        self.counters = counters
+        self.counter_index = counter_index
+        self.camera_name = camera_name
+
+        self.expected_interval = None
+        self.warmup_intervals = []
+        self.last_timestamp = None
+        self.n_frames = 0
+        self.n_dropped = 0
+
+        self.log_file = None
+        self.log_writer = None
+        if log_file is not None:
+            self.log_file = open(log_file, "w", newline="")
+            self.log_writer = csv.writer(self.log_file)
+            self.log_writer.writerow(
+                ["frame_id", "frame_timestamp", "interval", "expected_interval", "n_dropped"]
+            )
+            self.log_file.flush()
+
+    def update(self, camera_timestamp, frame_id):
+        """Add a frame and return the number of frames dropped before it."""
+        self.n_frames += 1
+        if self.counters is not None:
+            self.counters.frames[self.counter_index] = self.n_frames
+
+        if camera_timestamp is None:
+            return 0
+        if self.last_timestamp is None:
+            self.last_timestamp = camera_timestamp
+            return 0
+        interval = camera_timestamp - self.last_timestamp
+        self.last_timestamp = camera_timestamp
+
+        if self.expected_interval is None:
+            self.warmup_intervals.append(interval)
+            if len(self.warmup_intervals) >= self.warmup_frames:
+                self.expected_interval = float(np.median(self.warmup_intervals))
+            return 0
+
+        if interval <= self.gap_threshold * self.expected_interval:
+            self.expected_interval += self.smoothing * (interval - self.expected_interval)
+            return 0
+
+        n_dropped = max(1, int(round(interval / self.expected_interval)) - 1)
+        self.n_dropped += n_dropped
+        if self.counters is not None:
+            self.counters.dropped[self.counter_index] = self.n_dropped
+        if self.log_writer is not None:
+            self.log_writer.writerow(
+                [frame_id, camera_timestamp, interval, self.expected_interval, n_dropped]
+            )
+            self.log_file.flush()
+        logging.log(
+            logging.DEBUG,
+            f"{self.camera_name}: {n_dropped} frame(s) dropped before frame {frame_id}",
+        )
+        return n_dropped
+
+    def close(self):
+        if self.log_file is not None and not self.log_file.closed:
+            self.log_file.close()
@@ -0,0 +1,425 @@
+""" Video encoder backends for Writer.
+
+Each backend implements the same interface:
+
+    encoder = EncoderClass(video_file_name, fps, pixel_format, depth, **options)
+    encoder.open(first_frame)
+    payload = encoder.encode(frame)   # e.g. encoded packets
+    encoder.write(payload)            # hand the payload to the file
+    encoder.flush()
+    encoder.close()
+
+Backends are registered by name in ENCODERS:
+
+    nvenc   : h264 on the GPU with PyNvCodec (8 bit only)
+    ffmpeg  : an ffmpeg subprocess fed through a pipe (see video_io_ffmpeg)
+    pyav    : libx264 / ffv1 in process with PyAV (see video_io_pyav)
+    ffv1    : lossless ffv1 in process with PyAV, each frame split into
+              slices that are encoded in parallel
+    raw     : uncompressed frames in memory-mapped segment files, no
+              encoding at all (see raw_segments.py)
+
+A camera selects its backend with an 'encoder' entry in its camera dict
+(a name or a list of names in order of preference). If a backend is not
+available on this host, or fails to open, the next one is used, followed by
+the defaults for the pixel format (DEFAULT_ENCODERS).
+"""
+
+import importlib.util
+import logging
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from multicamera_acquisition.async_sink import AsyncFileSink
+from multicamera_acquisition.video_io_ffmpeg import close_pipe, write_frame
+
+# backends tried (in order) when a camera does not choose one, or after the
+# ones it chose
+DEFAULT_ENCODERS = {
+    "gray8": ["nvenc", "ffmpeg", "pyav"],
+    "gray16": ["ffmpeg", "pyav"],
+}
+
+
+class Encoder(object):
+    """Base class for encoder backends."""
+
+    name = None
+    # file extension of the output, None keeps the writer's
+    suffix = None
+    pixel_formats = ("gray8", "gray16")
+
+    @classmethod
+    def is_available(cls):
+        """Whether the backend's dependencies are installed on this host."""
+        return True
+
+    def __init__(self, video_file_name, fps, pixel_format="gray8", depth=False, **options):
+        """
+        Parameters
+        ----------
+        video_file_name : Path
+            The file to write. Its extension is replaced by `suffix` if set.
+        fps : float
+            The frame rate of the video.
+        pixel_format : str (default: 'gray8')
+            'gray8' or 'gray16'.
+        depth : bool (default: False)
+            Whether the frames are depth images.
+        **options
+            Backend options (e.g. 'gpu', 'quality'). Options a backend does
+            not use are ignored.
+        """
+        video_file_name = Path(video_file_name)
+        if self.suffix is not None:
+            video_file_name = video_file_name.with_suffix(self.suffix)
+        self.video_file_name = video_file_name
+        self.fps = fps
+        self.pixel_format = pixel_format
+        self.depth = depth
+        self.options = options
+
+    @property
+    def pending_bytes(self):
+        """Bytes handed to the file but not yet written."""
+        return 0
+
+    @property
+    def peak_pending_bytes(self):
+        """The most bytes that have been waiting to be written at once."""
+        return 0
+
+    def open(self, frame):
+        """Prepare to encode frames like `frame`."""
+        pass
+
+    def encode(self, frame):
+        """Encode a frame and return what `write` needs to store it."""
+        raise NotImplementedError
+
+    def write(self, payload):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        raise NotImplementedError
+
+
+class NvencEncoder(Encoder):
+    """h264 encoding on an NVIDIA GPU with PyNvCodec (VPF)."""
+
+    name = "nvenc"
+    pixel_formats = ("gray8",)
+
+    @classmethod
+    def is_available(cls):
+        return importlib.util.find_spec("PyNvCodec") is not None
+
+    def open(self, frame):
+        import PyNvCodec as nvc
+
+        encoder_dictionary = {
+            "preset": "P1",  # P1 is fastest, P7 is slowest
+            "codec": "h264",  # "hevc",
+            "s": f"{frame.shape[1]}x{frame.shape[0]}",
+            "profile": "high",  # "baseline",
+            "fps": str(int(self.fps)),
+            "multipass": "0",  # "fullres",  # "0",
+            "tuning_info": "ultra_low_latency",
+            "fmt": "YUV420",
+            # "lookahead": "1", # how far to look ahead (more is slower but better quality)
+            # "gop": "15", # larger = faster
+        }
+        logging.log(logging.DEBUG, f"encoder dict ({encoder_dictionary})")
+
+        self.encoder = nvc.PyNvEncoder(
+            encoder_dictionary,
+            gpu_id=self.options.get("gpu", 0),
+            format=nvc.PixelFormat.NV12,
+        )
+        self.packet = np.ndarray(shape=(0), dtype=np.uint8)
+        # nv12 is dims X by Y*1.5; the chroma rows never change
+        self.img_dims = frame.shape
+        self.nv12 = grey2nv12(frame)
+        self.file = open(self.video_file_name, "wb")
+        # disk writes happen on a background thread
+        self.sink = AsyncFileSink(self.file)
+
+    @property
+    def pending_bytes(self):
+        return self.sink.pending_bytes
+
+    @property
+    def peak_pending_bytes(self):
+        return self.sink.peak_pending_bytes
+
+    def encode(self, frame):
+        self.nv12[: self.img_dims[0], : self.img_dims[1]] = frame
+        try:
+            success = self.encoder.EncodeSingleFrame(self.nv12, self.packet, sync=False)
+        except Exception as e:
+            success = False
+            logging.log(logging.DEBUG, f"failed to create frame: {e}")
+        return self.packet if success else None
+
+    def write(self, packet):
+        if packet is not None:
+            # the sink copies the packet, so it can be reused
+            self.sink.write(packet)
+
+    def flush(self):
+        while self.encoder.FlushSinglePacket(self.packet):
+            self.sink.write(self.packet)
+        self.sink.flush()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.sink.close()
+            self.file.close()
+
+
+class FFmpegEncoder(Encoder):
+    """Encoding in an ffmpeg subprocess, fed through a pipe."""
+
+    name = "ffmpeg"
+
+    @classmethod
+    def is_available(cls):
+        return shutil.which("ffmpeg") is not None
+
+    def open(self, frame):
+        self.pipe = None
+        self.ffmpeg_options = {
+            k: self.options[k] for k in ["gpu", "quality"] if k in self.options
+        }
+
+    @property
+    def pending_bytes(self):
+        sink = getattr(self.pipe, "sink", None)
+        return 0 if sink is None else sink.pending_bytes
+
+    @property
+    def peak_pending_bytes(self):
+        sink = getattr(self.pipe, "sink", None)
+        return 0 if sink is None else sink.peak_pending_bytes
+
+    def encode(self, frame):
+        # ffmpeg encodes out of process
+        return frame
+
+    def write(self, frame):
+        self.pipe = write_frame(
+            self.video_file_name,
+            frame,
+            fps=self.fps,
+            pipe=self.pipe,
+            depth=self.depth,
+            pixel_format=self.pixel_format,
+            **self.ffmpeg_options,
+        )
+
+    def flush(self):
+        sink = getattr(self.pipe, "sink", None)
+        if sink is not None:
+            sink.flush()
+
+    def close(self):
+        if self.pipe is not None:
+            close_pipe(self.pipe)
+
+
+class PyAVEncoder(Encoder):
+    """libx264 (8 bit) or ffv1 (16 bit) encoding in process with PyAV."""
+
+    name = "pyav"
+    codec = None
+
+    @classmethod
+    def is_available(cls):
+        return importlib.util.find_spec("av") is not None
+
+    def open(self, frame):
+        from multicamera_acquisition.video_io_pyav import PyAVWriter
+
+        self.writer = PyAVWriter(
+            self.video_file_name,
+            fps=self.fps,
+            pixel_format=self.pixel_format,
+            quality=self.options.get("quality", 15),
+            codec=self.codec,
+        )
+
+    def encode(self, frame):
+        return self.writer.encode(frame)
+
+    def write(self, packets):
+        self.writer.mux(packets)
+
+    def close(self):
+        self.writer.close()
+
+
+class FFV1Encoder(PyAVEncoder):
+    """Lossless ffv1 encoding in process, in parallel slices of each frame."""
+
+    name = "ffv1"
+    suffix = ".avi"
+    codec = "ffv1"
+
+
+class RawEncoder(Encoder):
+    """Uncompressed frames, copied into memory-mapped segment files.
+
+    There is no encoding at all, so writing a frame costs about a memcpy.
+    Segments are written to {video stem}.{segment:04d}.raw and transcoded
+    after the session (see raw_segments.py).
+    """
+
+    name = "raw"
+    suffix = ".raw"
+
+    def open(self, frame):
+        from multicamera_acquisition.raw_segments import RawSegmentSink
+
+        self.dtype = np.uint16 if self.pixel_format == "gray16" else np.uint8
+        self.segments = RawSegmentSink(
+            self.video_file_name.with_suffix(""),
+            fps=self.fps,
+            segment_bytes=self.options.get("segment_bytes", 1024**3),
+        )
+
+    def encode(self, frame):
+        # the copy into the segment happens in write
+        return frame
+
+    def write(self, frame):
+        self.segments.write(frame.astype(self.dtype, copy=False))
+
+    def close(self):
+        self.segments.close()
+
+
+ENCODERS = {
+    encoder.name: encoder
+    for encoder in [NvencEncoder, FFmpegEncoder, PyAVEncoder, FFV1Encoder, RawEncoder]
+}
+
+
+def register_encoder(encoder):
+    """Add an Encoder subclass to the registry, under its `name`."""
+    ENCODERS[encoder.name] = encoder
+    return encoder
+
+
+def available_encoders(pixel_format="gray8"):
+    """Names of the registered backends that can be used on this host."""
+    return [
+        name
+        for name, encoder in ENCODERS.items()
+        if pixel_format in encoder.pixel_formats and encoder.is_available()
+    ]
+
+
+def resolve_encoders(preference=None, pixel_format="gray8", fallback=True):
+    """List the backends to try, in order.
+
+    Parameters
+    ----------
+    preference : str or list of str (default: None)
+        Preferred backend(s).
+    pixel_format : str (default: 'gray8')
+        'gray8' or 'gray16'.
+    fallback : bool (default: True)
+        If True, the defaults for the pixel format follow the preferred
+        backends.
+
+    Returns
+    -------
+    names : list of str
+        Backends that support the pixel format and are installed.
+    """
+    if preference is None:
+        preference = []
+    elif isinstance(preference, str):
+        preference = [preference]
+    for name in preference:
+        if name not in ENCODERS:
+            raise ValueError(
+                f"Unknown encoder {name}, must be one of {list(ENCODERS.keys())}"
+            )
+    candidates = list(preference)
+    if fallback or len(candidates) == 0:
+        candidates += DEFAULT_ENCODERS[pixel_format]
+
+    names = []
+    for name in candidates:
+        if name in names:
+            continue
+        encoder = ENCODERS[name]
+        if pixel_format not in encoder.pixel_formats:
+            logging.log(logging.DEBUG, f"Encoder {name} does not support {pixel_format}")
+        elif not encoder.is_available():
+            logging.log(logging.DEBUG, f"Encoder {name} is not installed")
+        else:
+            names.append(name)
+    if len(names) == 0:
+        raise RuntimeError(
+            f"No encoder available for {pixel_format} (tried {candidates})"
+        )
+    if len(preference) > 0 and names[0] != preference[0]:
+        logging.log(
+            logging.WARNING,
+            f"Encoder {preference[0]} is not available, using {names[0]}",
+        )
+    return names
+
+
+def open_encoder(names, frame, video_file_name, fps, pixel_format="gray8", depth=False, **options):
+    """Open the first backend in `names` that opens successfully.
+
+    Returns
+    -------
+    encoder : Encoder
+    """
+    for i, name in enumerate(names):
+        encoder = ENCODERS[name](
+            video_file_name, fps, pixel_format=pixel_format, depth=depth, **options
+        )
+        try:
+            encoder.open(frame)
+        except Exception as e:
+            if i == len(names) - 1:
+                raise
+            logging.log(
+                logging.WARNING,
+                f"Could not open encoder {name} ({e}), trying {names[i + 1]}",
+            )
+            continue
+        logging.log(logging.DEBUG, f"Encoding {encoder.video_file_name} with {name}")
+        return encoder
+
+
+def grey2nv12(frame):
+    """Convert greyscale image to nv12"""
+    # Convert grayscale to Y channel in YUV
+    Y = frame.astype(np.uint8)
+
+    # U and V channels are set to 128 (for a grayscale image, chroma channels remain constant)
+    U = np.full((frame.shape[0] // 2, frame.shape[1] // 2), 128, dtype=np.uint8)
+    V = np.full((frame.shape[0] // 2, frame.shape[1] // 2), 128, dtype=np.uint8)
+
+    # Interleave U and V for NV12 format
+    UV = np.empty((U.shape[0], U.shape[1] * 2), dtype=np.uint8)
+    UV[:, 0::2] = U
+    UV[:, 1::2] = V
+
+    # Stack Y and UV to create the NV12 format
+    nv12 = np.vstack((Y, UV))
+
+    return nv12
@@ -8,6 +8,123 @@
 
 import numpy as np
 import struct
+import logging
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+# brands whose devices are looked up through a DeviceCache
+CACHED_BRANDS = ["basler", "flir", "lucid"]
+
+
+def get_device_cache(brand):
+    """Get the process-wide device enumeration cache for a camera brand.
+
+    Every camera of a brand created in this process (e.g. via `get_camera`)
+    looks its serial number up in this cache, so the SDK enumerates devices
+    once instead of once per camera. Use `.stats()` for hit/miss counters and
+    `.invalidate()` after plugging in or removing cameras. Cameras opened in
+    separate processes share an enumeration through `resolve_device_indices`.
+
+    Parameters
+    ----------
+    brand : string
+        'basler', 'flir' or 'lucid'.
+
+    Returns
+    -------
+    cache : DeviceCache
+    """
+    if brand == "basler":
+        from multicamera_acquisition.interfaces.camera_basler import basler_device_cache
+
+        return basler_device_cache
+    elif brand == "flir":
+        from multicamera_acquisition.interfaces.camera_flir import flir_device_cache
+
+        return flir_device_cache
+    elif brand == "lucid":
+        from multicamera_acquisition.interfaces.camera_lucid import lucid_device_cache
+
+        return lucid_device_cache
+    else:
+        raise ValueError(f"No device cache for camera brand {brand}")
+
+
+def _resolve_serials(serials_by_brand):
+    indices = {}
+    stats = {}
+    for brand, serials in serials_by_brand.items():
+        cache = get_device_cache(brand)
+        for serial in serials:
+            try:
+                indices[(brand, serial)] = cache.get_index(serial)
+            except Exception as e:
+                logging.log(logging.WARNING, f"Could not find {brand} camera {serial}: {e}")
+        stats[brand] = cache.stats()
+    if "flir" in serials_by_brand:
+        # the cache holds serial numbers only, so nothing refers to the system
+        import PySpin
+
+        PySpin.System.GetInstance().ReleaseInstance()
+    return indices, stats
+
+
+def resolve_device_indices(camera_list):
+    """Find the device index of every camera, enumerating each brand once.
+
+    The acquisition loops each open their camera in their own process, and
+    an SDK handle cannot be shared between processes, so each loop still
+    makes one SDK lookup of its own. With the index it makes the cheapest
+    one: Basler cameras are opened by serial number, FLIR cameras read a
+    single serial number instead of every camera's, and Lucid cameras read
+    the device infos once and create only their own device, instead of
+    waiting (with retries) for and creating every device. Each loop reports
+    its own cache counters (see `AcquisitionLoop.get_device_cache_stats`).
+
+    The enumeration runs in a short-lived spawned process, so that the
+    camera SDKs are never loaded into the process that forks the
+    acquisition loops.
+
+    Parameters
+    ----------
+    camera_list : list of dict
+        Camera dictionaries with 'name', 'brand' and 'serial'. Only the
+        brands in CACHED_BRANDS are looked up.
+
+    Returns
+    -------
+    device_indices : dict
+        {camera name: device index} for every camera that was found, to pass
+        to `get_camera` as `device_index`.
+    stats : dict
+        {brand: DeviceCache.stats()} of the enumeration in the spawned
+        process.
+    """
+    serials_by_brand = {}
+    for camera_dict in camera_list:
+        if camera_dict["brand"] in CACHED_BRANDS:
+            serials_by_brand.setdefault(camera_dict["brand"], []).append(
+                str(camera_dict["serial"])
+            )
+    if len(serials_by_brand) == 0:
+        return {}, {}
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=mp.get_context("spawn")
+        ) as executor:
+            indices, stats = executor.submit(_resolve_serials, serials_by_brand).result()
+    except Exception as e:
+        # each camera falls back to enumerating in its own process
+        logging.log(logging.WARNING, f"Could not enumerate cameras: {e}")
+        return {}, {}
+
+    device_indices = {
+        camera_dict["name"]: indices[(camera_dict["brand"], str(camera_dict["serial"]))]
+        for camera_dict in camera_list
+        if (camera_dict["brand"], str(camera_dict["serial"])) in indices
+    }
+    return device_indices, stats
 
 
 def get_camera(
@@ -18,6 +135,9 @@ def get_camera(
     trigger="arduino",
     readout_mode="Fast",
     roi=None,
+    buffer_count=None,
+    buffer_handling_mode=None,
+    stall_tolerance_ms=250,
     **kwargs
 ):
     """Get a camera object.
@@ -26,7 +146,10 @@ def get_camera(
     brand : string (default: 'flir')
         The brand of camera to use.  Currently only 'flir' is supported. If
         'flir', the software PySpin is used. if 'basler', the software pypylon
-        is used.
+        is used. 'synthetic' and 'synthetic_azure' generate frames without any
+        camera SDK (see camera_synthetic.py for their keyword arguments:
+        width, height, bit_depth, fps, jitter_ms, drop_rate, timeout_rate,
+        seed, trigger_clock).
     serial : string (default: None)
         The serial number of the camera to use.  If None, the first camera
         found will be used.
@@ -37,6 +160,21 @@ def get_camera(
     readout_mode: str (default='Fast')
         Readout mode for Basler sensor. Options are 'Fast' and 'Normal'. 'Fast' is required for >160 fps but might lead to lower image quality.
     roi: tuple (offsetX, offsetY, width, height)
+    buffer_count : int (default: None)
+        The number of host-side stream buffers of the camera SDK. If None,
+        enough to hold `stall_tolerance_ms` of frames at the frame rate given
+        by an 'fps' keyword argument (or the SDK default without one).
+    buffer_handling_mode : str (default: None)
+        How the SDK hands out buffers: 'OldestFirst', 'OldestFirstOverwrite',
+        'NewestFirst' or 'NewestOnly' (see camera_base.py). None keeps the
+        SDK default.
+    stall_tolerance_ms : float (default: 250)
+        The longest host stall the default buffer count absorbs without
+        dropping frames.
+    device_index : int (default: None)
+        For basler, flir and lucid cameras, the index of the device found by
+        `resolve_device_indices`. If given, the camera is opened without
+        enumerating every device again.
 
     Returns
     -------
@@ -53,7 +191,7 @@ def get_camera(
     if brand == "flir":
         from multicamera_acquisition.interfaces.camera_flir import FlirCamera as Camera
 
-        cam = Camera(index=str(serial))
+        cam = Camera(index=str(serial), device_index=kwargs.get("device_index"))
 
         cam.init()
 
@@ -98,7 +236,7 @@ def get_camera(
             BaslerCamera as Camera,
         )
 
-        cam = Camera(index=str(serial))
+        cam = Camera(index=str(serial), device_index=kwargs.get("device_index"))
         cam.init()
 
         # set gain
@@ -182,13 +320,47 @@ def get_camera(
         )
 
 
+    elif brand in ["synthetic", "synthetic_azure"]:
+        from multicamera_acquisition.interfaces.camera_synthetic import (
+            SyntheticCamera,
+            SyntheticAzureCamera,
+        )
+
+        Camera = SyntheticCamera if brand == "synthetic" else SyntheticAzureCamera
+        synthetic_params = {
+            key: kwargs[key]
+            for key in [
+                "width",
+                "height",
+                "bit_depth",
+                "fps",
+                "jitter_ms",
+                "drop_rate",
+                "timeout_rate",
+                "seed",
+                "trigger_clock",
+            ]
+            if key in kwargs
+        }
+        if roi is not None:
+            synthetic_params["width"] = roi[2]
+            synthetic_params["height"] = roi[3]
+        cam = Camera(index=str(serial), **synthetic_params)
+        cam.init()
+
     elif brand == 'lucid':
         from multicamera_acquisition.interfaces.camera_lucid import (
             LucidCamera as Camera,
         )
-        cam = Camera(
-            index=str(serial)
-        )
+        cam = Camera(index=str(serial), device_index=kwargs.get("device_index"))
         cam.init()
 
+    if brand != "azure":
+        cam.set_stream_buffers(
+            buffer_count=buffer_count,
+            handling_mode=buffer_handling_mode,
+            fps=kwargs.get("fps"),
+            stall_tolerance_ms=stall_tolerance_ms,
+        )
+
     return cam
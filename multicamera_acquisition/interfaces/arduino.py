@@ -5,6 +5,18 @@ import sys
 import glob
 import serial
 import logging
+import json
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from multicamera_acquisition.interfaces.serial_protocol import (
+    BinaryStreamParser,
+    unpack_states,
+)
 
 def packIntAsLong(value):
     """Packs a python 4 byte integer to an arduino long
@@ -72,4 +84,340 @@ def find_serial_ports():
             result.append(port)
         except (OSError, serial.SerialException):
             pass
-    return result
\ No newline at end of file
+    return result
+
+# USB vendor ids of Arduino (and clone) and Teensy boards, probed before any
+# other USB serial device
+ARDUINO_VIDS = [0x2341, 0x2A03, 0x16C0, 0x1B4F, 0x239A]
+
+# where the port of the last arduino found is remembered
+DEFAULT_PORT_CACHE = Path.home() / ".cache" / "multicamera_acquisition" / "arduino_port.json"
+
+
+def candidate_ports(vid=None, pid=None, serial_number=None):
+    """List the serial ports that could be the arduino, most likely first.
+
+    Uses the USB descriptors reported by pyserial, so no port is opened.
+
+    Parameters
+    ----------
+    vid, pid : int (default: None)
+        If set, only USB devices with this vendor / product id.
+    serial_number : str (default: None)
+        If set, only the USB device with this serial number.
+
+    Returns
+    -------
+    ports : list of str
+    """
+    from serial.tools import list_ports
+
+    ports = list(list_ports.comports())
+    if vid is not None or pid is not None or serial_number is not None:
+        return [
+            p.device
+            for p in ports
+            if (vid is None or p.vid == vid)
+            and (pid is None or p.pid == pid)
+            and (serial_number is None or p.serial_number == serial_number)
+        ]
+    usb_ports = [p for p in ports if p.vid is not None]
+    if len(usb_ports) == 0:
+        # no USB descriptors (or an unsupported platform), try every port
+        return find_serial_ports()
+    usb_ports.sort(key=lambda p: p.vid not in ARDUINO_VIDS)
+    return [p.device for p in usb_ports]
+
+
+def _read_port_cache(port_cache):
+    if port_cache is None:
+        return None
+    try:
+        with open(port_cache, "r") as f:
+            return json.load(f)["port"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_port_cache(port_cache, port):
+    if port_cache is None:
+        return
+    try:
+        Path(port_cache).parent.mkdir(parents=True, exist_ok=True)
+        with open(port_cache, "w") as f:
+            json.dump({"port": port, "time": time.time()}, f)
+    except OSError as e:
+        logging.log(logging.DEBUG, f"Could not cache arduino port: {e}")
+
+
+def find_arduino(
+    ports=None,
+    vid=None,
+    pid=None,
+    serial_number=None,
+    port_cache=DEFAULT_PORT_CACHE,
+    seconds_to_wait=2,
+    timeout=0.1,
+):
+    """Find the arduino waiting for recording parameters, and connect to it.
+
+    The port the arduino was last found on is tried first. Otherwise all
+    candidate ports are probed concurrently, and the first that says
+    "Waiting..." is used.
+
+    Parameters
+    ----------
+    ports : list of str (default: None)
+        Ports to probe. By default those from `candidate_ports`.
+    vid, pid, serial_number : (default: None)
+        Passed to `candidate_ports` if `ports` is None.
+    port_cache : str or Path (default: DEFAULT_PORT_CACHE)
+        File in which the port that was found is remembered. None to
+        disable.
+    seconds_to_wait : float (default: 2)
+        How long to wait for "Waiting..." on each port.
+    timeout : float (default: 0.1)
+        Read timeout of the connection.
+
+    Returns
+    -------
+    arduino : serial.Serial
+        The open connection. It is kept open, so that the board is not reset
+        by reconnecting and the parameters can be sent right away.
+
+    Raises
+    ------
+    RuntimeError
+        If no waiting arduino is found.
+    """
+    if ports is None:
+        ports = candidate_ports(vid=vid, pid=pid, serial_number=serial_number)
+    ports = list(ports)
+    start = time.monotonic()
+
+    cached_port = _read_port_cache(port_cache)
+    if cached_port in ports:
+        arduino = _probe_port(cached_port, seconds_to_wait, timeout)
+        if arduino is not None:
+            logging.log(logging.INFO, f"Using cached port {cached_port} for arduino.")
+            return arduino
+        ports.remove(cached_port)
+
+    found = []
+    lock = threading.Lock()
+
+    def probe(port):
+        arduino = _probe_port(port, seconds_to_wait, timeout)
+        if arduino is None:
+            return None
+        with lock:
+            if len(found) > 0:
+                # another port answered first
+                arduino.close()
+                return None
+            found.append(arduino)
+        return arduino
+
+    if len(ports) > 0:
+        executor = ThreadPoolExecutor(max_workers=min(len(ports), 32))
+        try:
+            for future in as_completed([executor.submit(probe, p) for p in ports]):
+                if future.result() is not None:
+                    break
+        finally:
+            # probes still running close their ports when they finish
+            executor.shutdown(wait=False)
+    if len(found) == 0:
+        raise RuntimeError(
+            f"Could not find waiting arduino to do triggers! (probed {ports})"
+        )
+    arduino = found[0]
+    logging.log(
+        logging.INFO,
+        f"Using port {arduino.port} for arduino "
+        f"(found in {time.monotonic() - start:.2f} s among {len(ports)} ports).",
+    )
+    _write_port_cache(port_cache, arduino.port)
+    return arduino
+
+
+def _probe_port(port, seconds_to_wait, timeout):
+    """Connect to a port, and return the connection if an arduino is waiting."""
+    try:
+        arduino = serial.Serial(port=port, timeout=timeout)
+    except (OSError, serial.SerialException):
+        return None
+    try:
+        wait_for_serial_confirmation(
+            arduino,
+            expected_confirmation="Waiting...",
+            seconds_to_wait=seconds_to_wait,
+            timeout_duration_s=timeout,
+        )
+    except (ValueError, UnicodeDecodeError, OSError, serial.SerialException):
+        arduino.close()
+        return None
+    return arduino
+
+
+# A line read from the arduino. kind is 'input' for input pin states (with
+# pulse_id, arduino_ms and states set), 'input_batch' for a run of binary
+# input records (pulse_id, arduino_ms and states are arrays),
+# 'start' / 'finished' for the confirmations of those names, 'malformed' for
+# an input line that cannot be parsed, 'message' for any other line and
+# 'error' if the connection failed or the reader crashed (text is the error).
+SerialEvent = namedtuple(
+    "SerialEvent",
+    ["kind", "text", "pulse_id", "arduino_ms", "states", "host_monotonic_ns"],
+)
+
+_CONFIRMATIONS = {"Start": "start", "Finished": "finished"}
+
+INPUT_PREFIX = "input: "
+
+
+def parse_input_line(line):
+    """Split an 'input: ' line from the arduino into its values.
+
+    The arduino reports the state of its input pins with each pulse as
+    'input: {flag_0},{flag_1},...,{pulse_id},{arduino_ms}'.
+
+    Returns
+    -------
+    pulse_id, arduino_ms : str
+    states : list of str
+        One per input pin. Returns None if the line is not an input line.
+
+    Raises
+    ------
+    ValueError
+        If an input line has no pulse id and time (e.g. a line torn by a
+        reset of the board). The values themselves are not checked.
+    """
+    if not line.startswith(INPUT_PREFIX):
+        return None
+    values = line[len(INPUT_PREFIX) :].split(",")
+    if len(values) < 2:
+        raise ValueError(f"Malformed input line: {line!r}")
+    return values[-2], values[-1], values[:-2]
+
+
+def parse_serial_line(line, host_monotonic_ns=None):
+    """Turn a line from the arduino into a SerialEvent."""
+    if host_monotonic_ns is None:
+        host_monotonic_ns = time.monotonic_ns()
+    try:
+        values = parse_input_line(line)
+    except ValueError:
+        return SerialEvent("malformed", line, None, None, None, host_monotonic_ns)
+    if values is not None:
+        pulse_id, arduino_ms, states = values
+        return SerialEvent(
+            "input", line, pulse_id, arduino_ms, states, host_monotonic_ns
+        )
+    kind = _CONFIRMATIONS.get(line, "message")
+    return SerialEvent(kind, line, None, None, None, host_monotonic_ns)
+
+
+class SerialReader(threading.Thread):
+    """Reads lines from the arduino on a background thread.
+
+    Each line is parsed into a SerialEvent and put on `events`, so that the
+    serial buffer is drained as soon as data arrives, however long the
+    consumer (progress display, trigger logging) takes.
+    """
+
+    def __init__(self, arduino, events=None, protocol="text"):
+        """
+        Parameters
+        ----------
+        arduino : serial.Serial
+            An open connection, with a read timeout so that the thread
+            notices when it is stopped.
+        events : queue.Queue (default: None)
+            Where events are put. A new unbounded queue by default.
+        protocol : str (default: 'text')
+            'text' if the firmware prints input events as 'input: ' lines,
+            'binary' if it writes them as binary records (see
+            serial_protocol.py). Other messages are text lines in both cases.
+        """
+        super().__init__(daemon=True)
+        if protocol not in ["text", "binary"]:
+            raise ValueError("protocol must be 'text' or 'binary'")
+        self.arduino = arduino
+        self.protocol = protocol
+        self.parser = BinaryStreamParser() if protocol == "binary" else None
+        self.events = queue.Queue() if events is None else events
+        self.stopped = threading.Event()
+        self.n_lines = 0
+        self.max_backlog = 0
+
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                if self.parser is not None:
+                    self._read_binary()
+                    continue
+                line = self.arduino.readline()
+                if len(line) == 0:
+                    continue
+                event = parse_serial_line(
+                    line.decode("utf-8", errors="replace").strip("\r\n")
+                )
+                self._put(event)
+        except (serial.SerialException, OSError) as e:
+            if not self.stopped.is_set():
+                logging.log(logging.WARN, f"Serial connection failed: {e}")
+                self.events.put(
+                    SerialEvent("error", str(e), None, None, None, time.monotonic_ns())
+                )
+        except Exception as e:
+            # never die silently: the consumer would wait for 'Finished'
+            logging.log(logging.ERROR, f"Serial reader failed: {e!r}")
+            self.events.put(
+                SerialEvent("error", repr(e), None, None, None, time.monotonic_ns())
+            )
+
+    def _read_binary(self):
+        # everything waiting, or block (up to the timeout) for the next byte
+        data = self.arduino.read(max(1, self.arduino.in_waiting))
+        if len(data) == 0:
+            return
+        host_monotonic_ns = time.monotonic_ns()
+        for item in self.parser.feed(data):
+            if isinstance(item, str):
+                self._put(parse_serial_line(item, host_monotonic_ns))
+                continue
+            self._put(
+                SerialEvent(
+                    "input_batch",
+                    None,
+                    item["pulse_id"].astype(numpy.int64),
+                    item["arduino_ms"].astype(numpy.int64),
+                    unpack_states(item["states"], int(item["n_inputs"][0])),
+                    host_monotonic_ns,
+                )
+            )
+
+    def _put(self, event):
+        self.events.put(event)
+        self.n_lines += 1
+        self.max_backlog = max(self.max_backlog, self.events.qsize())
+
+    def get(self, timeout=0.1):
+        """The next event, or None if there is none within `timeout` seconds."""
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def stop(self, timeout=1.0):
+        """Stop reading and wait for the thread to exit."""
+        self.stopped.set()
+        if self.is_alive():
+            self.join(timeout)
+        logging.log(
+            logging.DEBUG,
+            f"Serial reader read {self.n_lines} lines, "
+            f"at most {self.max_backlog} waiting to be handled",
+        )
@@ -0,0 +1,304 @@
+""" An emulated trigger arduino on a pseudo-terminal.
+
+ArduinoEmulator speaks the serial protocol of the firmware in
+arduino_firmware/ on a pty (Linux / macOS), so that `acquire_video` can run
+without hardware:
+
+    - prints "Waiting..." until the recording parameters arrive
+    - reads num_cycles, inv_framerate and any extra arduino_args, packed
+      with `packIntAsLong`
+    - replies "Start", then reports input pin changes at `input_event_rate`
+      ('input: ...' lines, or binary records, see serial_protocol.py)
+    - prints "Finished" after num_cycles cycles, or "Breaking!" if anything
+      is sent while it runs
+
+The emulated trigger clock (start time, trigger period and number of
+triggers) is written to `trigger_clock`, where synthetic cameras created
+with the same `trigger_clock` read it, so that they deliver one frame per
+emulated trigger.
+
+    with ArduinoEmulator(trigger_clock=save_location / "trigger_clock.json") as arduino:
+        acquire_video(..., arduino_port=arduino.port)
+
+Or standalone, printing the port to connect to:
+
+    python -m multicamera_acquisition.interfaces.arduino_emulator --input-event-rate 100
+"""
+
+import argparse
+import json
+import logging
+import os
+import select
+import struct
+import threading
+import time
+import tty
+from pathlib import Path
+
+import numpy as np
+
+from multicamera_acquisition.interfaces.serial_protocol import encode_input_events
+
+
+def write_trigger_clock(file_name, start, inv_framerate, n_triggers):
+    """Publish the emulated trigger clock (time.monotonic seconds)."""
+    file_name = Path(file_name)
+    temp_file = file_name.with_name(file_name.name + ".tmp")
+    with open(temp_file, "w") as f:
+        json.dump(
+            {"start": start, "inv_framerate": inv_framerate, "n_triggers": n_triggers}, f
+        )
+    os.replace(temp_file, file_name)
+
+
+def read_trigger_clock(file_name):
+    """Read a trigger clock written by ArduinoEmulator, or None if there is none.
+
+    Returns
+    -------
+    clock : dict
+        'start' (time.monotonic seconds of the first trigger),
+        'inv_framerate' (microseconds between triggers) and 'n_triggers'.
+    """
+    try:
+        with open(file_name, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class ArduinoEmulator(threading.Thread):
+    """Emulates the trigger arduino on a pseudo-terminal."""
+
+    def __init__(
+        self,
+        n_inputs=4,
+        input_event_rate=0,
+        protocol="text",
+        cycle_rate=None,
+        trigger_clock=None,
+        valid_inv_framerates=None,
+        waiting_interval_s=0.5,
+        seed=None,
+    ):
+        """
+        Parameters
+        ----------
+        n_inputs : int (default: 4)
+            Number of input pins reported with each input event.
+        input_event_rate : float (default: 0)
+            Input pin changes per second while recording.
+        protocol : str (default: 'text')
+            'text' or 'binary' input events.
+        cycle_rate : float (default: None)
+            Cycles per second, if a cycle is not one trigger (e.g. 30 when
+            num_cycles counts azure frames, as acquire_video does when
+            recording azures). By default a cycle is one trigger.
+        trigger_clock : str or Path (default: None)
+            If set, the trigger clock is written to this file when
+            recording starts (see read_trigger_clock).
+        valid_inv_framerates : list of int (default: None)
+            If set, only these inv_framerates are accepted, like the
+            firmware. By default any positive value is.
+        waiting_interval_s : float (default: 0.5)
+            Seconds between "Waiting..." lines.
+        seed : int (default: None)
+            Seed for the random input pin states.
+        """
+        super().__init__(daemon=True)
+        if protocol not in ["text", "binary"]:
+            raise ValueError("protocol must be 'text' or 'binary'")
+        self.n_inputs = n_inputs
+        self.input_event_rate = input_event_rate
+        self.protocol = protocol
+        self.cycle_rate = cycle_rate
+        self.trigger_clock = None if trigger_clock is None else Path(trigger_clock)
+        self.valid_inv_framerates = valid_inv_framerates
+        self.waiting_interval_s = waiting_interval_s
+        self.rng = np.random.default_rng(seed)
+        self.stopped = threading.Event()
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+
+        # what the last recording was asked to do, and did
+        self.parameters = None
+        self.n_recordings = 0
+        self.n_input_events = 0
+        self.n_dropped_bytes = 0
+        self.finished = threading.Event()
+
+        if self.trigger_clock is not None and self.trigger_clock.exists():
+            self.trigger_clock.unlink()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.stopped.set()
+        if self.is_alive():
+            self.join(2)
+        for fd in [self.master, self.slave]:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _write(self, data):
+        # output nobody reads is lost rather than blocking the emulator, but
+        # only as whole lines (or binary records): once part of `data` is
+        # out, the rest waits for the port, as the firmware's Serial.write does
+        try:
+            written = os.write(self.master, data)
+        except BlockingIOError:
+            self.n_dropped_bytes += len(data)
+            return
+        while written < len(data) and not self.stopped.is_set():
+            _, writable, _ = select.select([], [self.master], [], 0.1)
+            if len(writable) == 0:
+                continue
+            try:
+                written += os.write(self.master, data[written:])
+            except BlockingIOError:
+                pass
+        self.n_dropped_bytes += len(data) - written
+
+    def _println(self, line):
+        self._write(line.encode("utf-8") + b"\r\n")
+
+    def _read(self, timeout):
+        readable, _, _ = select.select([self.master], [], [], max(0, timeout))
+        if len(readable) == 0:
+            return b""
+        try:
+            return os.read(self.master, 4096)
+        except (BlockingIOError, OSError):
+            return b""
+
+    def run(self):
+        while not self.stopped.is_set():
+            self._println("Waiting...")
+            data = self._read(self.waiting_interval_s)
+            if len(data) == 0:
+                continue
+            # let the rest of the parameters arrive
+            deadline = time.monotonic() + 0.05
+            while time.monotonic() < deadline:
+                data += self._read(deadline - time.monotonic())
+            if len(data) < 8 or len(data) % 4 != 0:
+                logging.log(
+                    logging.DEBUG, f"Arduino emulator ignoring {len(data)} bytes"
+                )
+                continue
+            parameters = struct.unpack(f"<{len(data) // 4}i", data)
+            num_cycles, inv_framerate = parameters[:2]
+            ok = inv_framerate > 0 and (
+                self.valid_inv_framerates is None
+                or inv_framerate in self.valid_inv_framerates
+            )
+            self._println(f"Inv framerate {inv_framerate}. OK? {int(ok)}")
+            if not ok:
+                continue
+            self.parameters = {
+                "num_cycles": num_cycles,
+                "inv_framerate": inv_framerate,
+                "arduino_args": list(parameters[2:]),
+            }
+            self._println("Start")
+            self._println(f"Num cycles:{num_cycles}")
+            self._run_acquisition(num_cycles, inv_framerate)
+            self._println("Finished")
+            self.n_recordings += 1
+            self.finished.set()
+
+    def _run_acquisition(self, num_cycles, inv_framerate):
+        trigger_period = inv_framerate / 1e6
+        cycle_period = trigger_period if self.cycle_rate is None else 1 / self.cycle_rate
+        start = time.monotonic()
+        end = start + num_cycles * cycle_period
+        if self.trigger_clock is not None:
+            write_trigger_clock(
+                self.trigger_clock,
+                start,
+                inv_framerate,
+                int(round((end - start) / trigger_period)),
+            )
+        state = np.zeros(self.n_inputs, dtype=np.int64)
+        n_events = 0
+        while not self.stopped.is_set():
+            now = time.monotonic()
+            if now >= end:
+                break
+            # emit every event that is due, all at once
+            n_due = int((now - start) * self.input_event_rate) - n_events
+            if n_due > 0 and self.n_inputs > 0:
+                event_times = start + (n_events + np.arange(n_due)) / self.input_event_rate
+                pins = self.rng.integers(0, self.n_inputs, n_due)
+                states = np.zeros((n_due, self.n_inputs), dtype=np.int64)
+                for i, pin in enumerate(pins):
+                    state[pin] = 1 - state[pin]
+                    states[i] = state
+                self._write_input_events(
+                    ((event_times - start) / cycle_period).astype(np.int64),
+                    ((event_times - start) * 1000).astype(np.int64),
+                    states,
+                )
+                n_events += n_due
+            next_event = (
+                end
+                if self.input_event_rate <= 0
+                else start + (n_events + 1) / self.input_event_rate
+            )
+            # anything sent while recording interrupts it
+            if len(self._read(min(next_event, end) - time.monotonic())) > 0:
+                self._println("Breaking!")
+                break
+        self.n_input_events += n_events
+
+    def _write_input_events(self, pulse_ids, arduino_ms, states):
+        if self.protocol == "binary":
+            self._write(encode_input_events(pulse_ids, arduino_ms, states))
+            return
+        lines = [
+            "input: " + "".join(f"{s}," for s in row) + f"{pulse_id},{ms}\r\n"
+            for pulse_id, ms, row in zip(
+                pulse_ids.tolist(), arduino_ms.tolist(), states.tolist()
+            )
+        ]
+        self._write("".join(lines).encode("utf-8"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Emulate the trigger arduino on a pty.")
+    parser.add_argument("--n-inputs", type=int, default=4)
+    parser.add_argument("--input-event-rate", type=float, default=0)
+    parser.add_argument("--protocol", default="text", choices=["text", "binary"])
+    parser.add_argument("--cycle-rate", type=float, default=None)
+    parser.add_argument("--trigger-clock", default=None)
+    args = parser.parse_args(argv)
+
+    emulator = ArduinoEmulator(
+        n_inputs=args.n_inputs,
+        input_event_rate=args.input_event_rate,
+        protocol=args.protocol,
+        cycle_rate=args.cycle_rate,
+        trigger_clock=args.trigger_clock,
+    )
+    with emulator:
+        print(f"Emulated arduino on {emulator.port}, Ctrl-C to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,52 @@
+import logging
+import math
+
 import numpy as np
 
+# the buffer handling modes of Spinnaker and Arena, mapped to pylon grab
+# strategies by BaslerCamera
+BUFFER_HANDLING_MODES = ["OldestFirst", "OldestFirstOverwrite", "NewestFirst", "NewestOnly"]
+
 
 class CameraError(Exception):
     pass
 
 
+def stream_buffer_count(
+    frame_bytes,
+    fps,
+    stall_tolerance_ms=250,
+    min_buffers=10,
+    max_pool_bytes=512 * 1024**2,
+):
+    """The number of SDK stream buffers needed to ride out a host stall.
+
+    While the host is not taking frames off the stream, the SDK fills its
+    buffers. With too few, a stall longer than a few frames drops frames.
+
+    Parameters
+    ----------
+    frame_bytes : int
+        Bytes per frame (the camera's payload size).
+    fps : float
+        The frame rate.
+    stall_tolerance_ms : float (default: 250)
+        The longest stall to absorb without dropping frames.
+    min_buffers : int (default: 10)
+        The fewest buffers to use.
+    max_pool_bytes : int (default: 512 MiB)
+        The most memory to use for the pool (unless min_buffers need more).
+
+    Returns
+    -------
+    buffer_count : int
+    """
+    # frames arriving during the stall, plus the ones being filled and read
+    buffer_count = math.ceil(fps * stall_tolerance_ms / 1000) + 2
+    max_buffers = max(min_buffers, int(max_pool_bytes // max(1, frame_bytes)))
+    return int(min(max(buffer_count, min_buffers), max_buffers))
+
+
 class BaseCamera(object):
     """
     A class used to encapsulate a Camera.
@@ -44,6 +86,15 @@ class BaseCamera(object):
         Start recording images.
     stop()
         Stop recording images.
+    start_callback(callback)
+        Start recording images, with each image passed to a callback as it
+        arrives.
+    stop_callback()
+        Stop passing images to the callback, and stop recording.
+    set_stream_buffers()
+        Size the SDK's host-side buffer pool.
+    stream_stats()
+        Return the SDK's statistics on buffers and lost frames.
     get_image()
         Return an image using PySpin's internal format.
     get_array()
@@ -99,10 +150,69 @@ class BaseCamera(object):
         "Stop recording images."
         raise NotImplementedError
 
+    def start_callback(self, callback):
+        """Start recording images, passing each to `callback` as it arrives.
+
+        Images are delivered from a thread of the camera SDK, instead of being
+        waited for with `get_array`.
+        Parameters
+        ----------
+        callback : callable
+            Called as callback(img, tstamp) for each frame, with the image
+            as a Numpy array (None for an incomplete frame) and the camera
+            timestamp. The image is only valid until the callback returns,
+            as the SDK reuses its buffer.
+        """
+        raise NotImplementedError
+
+    def stop_callback(self):
+        """Stop recording images started with `start_callback`. No callback
+        is running once this returns."""
+        raise NotImplementedError
+
+    def set_stream_buffers(
+        self, buffer_count=None, handling_mode=None, fps=None, stall_tolerance_ms=250
+    ):
+        """Configure the host-side buffer pool of the camera SDK. Call before
+        `start`. Cameras that do not implement this keep the SDK's defaults.
+        Parameters
+        ----------
+        buffer_count : int (default: None)
+            The number of buffers. If None, sized with `stream_buffer_count`
+            from the payload size, fps and stall_tolerance_ms, or left at
+            the SDK default if fps is None.
+        handling_mode : str (default: None)
+            One of BUFFER_HANDLING_MODES, or None for the SDK default.
+            'OldestFirst' delivers every frame in order.
+        fps : float (default: None)
+            The expected frame rate.
+        stall_tolerance_ms : float (default: 250)
+            See `stream_buffer_count`.
+        """
+        level = logging.DEBUG
+        if buffer_count is not None or handling_mode is not None:
+            level = logging.WARNING
+        logging.log(
+            level,
+            f"{type(self).__name__} cannot configure its stream buffers, "
+            f"keeping the SDK defaults",
+        )
+
+    def stream_stats(self):
+        """Statistics of the SDK's stream, e.g. at the end of a recording.
+        Returns
+        -------
+        stats : dict
+            'buffer_count' and 'handling_mode', and the counters the SDK
+            provides of 'delivered_buffers', 'failed_buffers',
+            'buffer_underruns', 'lost_frames' and 'dropped_frames'.
+        """
+        raise NotImplementedError
+
     def get_image(self, timeout=None):
         raise NotImplementedError
 
-    def get_array(self, timeout=None, get_chunk=False, get_timestamp=False):
+    def get_array(self, timeout=None, get_chunk=False, get_timestamp=False, out=None):
         """Get an image from the camera, and convert it to a numpy array.
         Parameters
         ----------
@@ -111,6 +221,9 @@ class BaseCamera(object):
                 Otherwise, wait indefinitely.
         get_timestamp : bool (default: False)
             If True, returns timestamp of frame f(camera timestamp)
+        out : Numpy array (default: None)
+            If not None, copy the image into this preallocated array (e.g. a
+            ring buffer slot) and return it, instead of allocating a new one.
         Returns
         -------
         img : Numpy array
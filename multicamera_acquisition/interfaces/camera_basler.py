@@ -1,10 +1,59 @@
-from multicamera_acquisition.interfaces.camera_base import BaseCamera, CameraError
-from pypylon import pylon
+from multicamera_acquisition.interfaces.camera_base import (
+    BaseCamera,
+    CameraError,
+    stream_buffer_count,
+)
+from multicamera_acquisition.interfaces.device_cache import DeviceCache
+from pypylon import genicam, pylon
 import numpy as np
+import time
+
+# buffer handling modes (see camera_base.py) as pylon grab strategies
+GRAB_STRATEGIES = {
+    "OldestFirst": pylon.GrabStrategy_OneByOne,
+    "OldestFirstOverwrite": pylon.GrabStrategy_LatestImages,
+    "NewestOnly": pylon.GrabStrategy_LatestImageOnly,
+}
+
+# stream grabber statistics, by the names used in stream_stats (which ones
+# exist depends on the transport layer)
+STREAM_STATISTICS = {
+    "delivered_buffers": "Statistic_Total_Buffer_Count",
+    "failed_buffers": "Statistic_Failed_Buffer_Count",
+    "buffer_underruns": "Statistic_Buffer_Underrun_Count",
+    "lost_frames": "Statistic_Missed_Frame_Count",
+}
+
+
+def _enumerate_basler_devices():
+    return pylon.TlFactory.GetInstance().EnumerateDevices([pylon.DeviceInfo()])
+
+
+# one enumeration is shared by every Basler camera created in this process
+basler_device_cache = DeviceCache(
+    "basler", _enumerate_basler_devices, lambda device: device.GetSerialNumber()
+)
+
+
+class _ImageEventHandler(pylon.ImageEventHandler):
+    """Passes each grab result to a callback, from the grab loop thread."""
+
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+
+    def OnImageGrabbed(self, camera, grab_result):
+        if grab_result.GrabSucceeded():
+            with grab_result.GetArrayZeroCopy() as img_array:
+                if img_array.dtype != np.uint8:
+                    img_array = img_array.astype(np.uint8)
+                self.callback(img_array, grab_result.GetTimeStamp())
+        else:
+            self.callback(None, None)
 
 
 class BaslerCamera(BaseCamera):
-    def __init__(self, index=0, lock=True, **kwargs):
+    def __init__(self, index=0, lock=True, device_index=None, **kwargs):
         """
         Parameters
         ----------
@@ -14,33 +63,47 @@ class BaslerCamera(BaseCamera):
         lock : bool (default: True)
             If True, setting new attributes after initialization results in
             an error.
+        device_index : int (default: None)
+            If given, the camera (with serial number `index`) was already
+            found by `resolve_device_indices`, and is opened by its serial
+            number. pylon still enumerates its transport layers to find it,
+            which is counted as a miss of `basler_device_cache`.
         """
         self.serial_number = index
         self.system = pylon.TlFactory.GetInstance()
-        di = pylon.DeviceInfo()
-        devices = self.system.EnumerateDevices(
-            [
-                di,
-            ]
-        )
+        self.running = False
+        self.image_event_handler = None
+        self.grab_strategy = pylon.GrabStrategy_OneByOne
+        self.handling_mode = None
+
+        if device_index is not None and isinstance(index, str):
+            device_info = pylon.DeviceInfo()
+            device_info.SetSerialNumber(index)
+            start = time.perf_counter()
+            try:
+                self.cam = pylon.InstantCamera(self.system.CreateFirstDevice(device_info))
+                return
+            except genicam.GenericException:
+                # unplugged since it was found, look for it again below
+                basler_device_cache.invalidate()
+            finally:
+                basler_device_cache.record_enumeration(time.perf_counter() - start)
+
+        devices = basler_device_cache.get_devices()
 
         n_devices = len(devices)
         # debug: print("Found %d camera(s)" % n_devices)
-        camera_serials = np.array([c.GetSerialNumber() for c in devices])
 
         if n_devices == 0:
+            basler_device_cache.invalidate()
             raise CameraError("No cameras detected.")
         if isinstance(index, int):
             self.cam = pylon.InstantCamera(self.system.CreateDevice(devices[index]))
         elif isinstance(index, str):
-            if not np.any(camera_serials == index):
-                raise CameraError("Camera with serial number %s not found." % index)
-            index = np.where(camera_serials == index)[0][0]
-            self.cam = pylon.InstantCamera(self.system.CreateDevice(devices[index]))
+            device = basler_device_cache.get_device(index)
+            self.cam = pylon.InstantCamera(self.system.CreateDevice(device))
 
         del devices
-        
-        self.running = False
 
     def init(self):
         """Initializes the camera.  Automatically called if the camera is opened
@@ -55,7 +118,7 @@ class BaslerCamera(BaseCamera):
         "Start recording images."
         max_recording_hours = 60
         max_recording_frames = max_recording_hours * 60 * 60 * 200
-        self.cam.StartGrabbingMax(max_recording_frames)
+        self.cam.StartGrabbingMax(max_recording_frames, self.grab_strategy)
         self.running = True
 
     def stop(self):
@@ -63,6 +126,67 @@ class BaslerCamera(BaseCamera):
         self.cam.Close()
         self.running = False
 
+    def start_callback(self, callback):
+        """Start recording images, passing each to `callback` as it arrives
+        (see BaseCamera.start_callback). Uses pylon's grab loop thread."""
+        self.image_event_handler = _ImageEventHandler(callback)
+        self.cam.RegisterImageEventHandler(
+            self.image_event_handler, pylon.RegistrationMode_ReplaceAll, pylon.Cleanup_None
+        )
+        max_recording_hours = 60
+        max_recording_frames = max_recording_hours * 60 * 60 * 200
+        self.cam.StartGrabbingMax(
+            max_recording_frames,
+            self.grab_strategy,
+            pylon.GrabLoop_ProvidedByInstantCamera,
+        )
+        self.running = True
+
+    def stop_callback(self):
+        "Stop recording images started with start_callback."
+        # waits for the grab loop thread to finish
+        self.cam.StopGrabbing()
+        if self.image_event_handler is not None:
+            self.cam.DeregisterImageEventHandler(self.image_event_handler)
+            self.image_event_handler = None
+        self.running = False
+
+    def set_stream_buffers(
+        self, buffer_count=None, handling_mode=None, fps=None, stall_tolerance_ms=250
+    ):
+        """Configure the host-side buffer pool (see
+        BaseCamera.set_stream_buffers). The buffer handling mode is applied
+        as a pylon grab strategy."""
+        if handling_mode is not None and handling_mode not in GRAB_STRATEGIES:
+            raise CameraError(
+                f"Basler cameras support the buffer handling modes {list(GRAB_STRATEGIES)}"
+            )
+        if buffer_count is None and fps is not None:
+            buffer_count = stream_buffer_count(
+                self.cam.PayloadSize.GetValue(), fps, stall_tolerance_ms
+            )
+        if buffer_count is not None:
+            self.cam.MaxNumBuffer.SetValue(int(buffer_count))
+        if handling_mode is not None:
+            self.grab_strategy = GRAB_STRATEGIES[handling_mode]
+            self.handling_mode = handling_mode
+            if handling_mode == "OldestFirstOverwrite":
+                # the latest OutputQueueSize images are kept
+                self.cam.OutputQueueSize.SetValue(self.cam.MaxNumBuffer.GetValue())
+
+    def stream_stats(self):
+        """Statistics of the stream grabber (see BaseCamera.stream_stats)."""
+        stats = {
+            "buffer_count": self.cam.MaxNumBuffer.GetValue(),
+            "handling_mode": self.handling_mode,
+        }
+        nodemap = self.cam.GetStreamGrabberNodeMap()
+        for key, name in STREAM_STATISTICS.items():
+            node = nodemap.GetNode(name)
+            if genicam.IsReadable(node):
+                stats[key] = node.GetValue()
+        return stats
+
     def get_image(self, timeout=None):
         """Get an image from the camera.
         Parameters
@@ -78,7 +202,7 @@ class BaslerCamera(BaseCamera):
             timeout = 10000
         return self.cam.RetrieveResult(timeout, pylon.TimeoutHandling_ThrowException)
 
-    def get_array(self, timeout=None, get_timestamp=False):
+    def get_array(self, timeout=None, get_timestamp=False, out=None):
         """Get an image from the camera.
         Parameters
         ----------
@@ -87,6 +211,9 @@ class BaslerCamera(BaseCamera):
                 Otherwise, wait indefinitely.
         get_timestamp : bool (default: False)
             If True, returns timestamp of frame f(camera timestamp)
+        out : Numpy array (default: None)
+            If not None, the image is copied straight from the grab result
+            into this array (e.g. a ring buffer slot), which is returned.
         Returns
         -------
         img : Numpy array
@@ -98,7 +225,12 @@ class BaslerCamera(BaseCamera):
         img = self.get_image(timeout)
 
         if img.GrabSucceeded():
-            img_array = img.Array.astype(np.uint8)
+            if out is not None:
+                img_array = copy_grab_result(img, out)
+            else:
+                img_array = img.Array
+                if img_array.dtype != np.uint8:
+                    img_array = img_array.astype(np.uint8)
             if get_timestamp:
                 tstamp = img.GetTimeStamp()
             else:
@@ -137,6 +269,20 @@ class BaslerCamera(BaseCamera):
         raise NotImplementedError
 
 
+def copy_grab_result(grab_result, out):
+    """Copy the image in a grab result into `out` with a single copy.
+
+    Uses the zero-copy array view when pypylon provides it, so the only copy
+    is the one into `out`. Values are cast to the dtype of `out` if needed.
+    """
+    if hasattr(grab_result, "GetArrayZeroCopy"):
+        with grab_result.GetArrayZeroCopy() as array:
+            np.copyto(out, array, casting="unsafe")
+    else:
+        np.copyto(out, grab_result.Array, casting="unsafe")
+    return out
+
+
 def enumerate_basler_cameras(behav_on_none="raise"):
     """ Enumerate all Basler cameras connected to the system.
     
@@ -196,6 +342,9 @@ class EmulatedBaslerCamera(BaslerCamera):
         self.serial_number = "Emulated"
         self.cam = self.PylonEmuTestCase().create_first()
         self.running = False
+        self.image_event_handler = None
+        self.grab_strategy = pylon.GrabStrategy_OneByOne
+        self.handling_mode = None
 
     def init(self):
         """Initializes the camera.  Automatically called if the camera is opened
@@ -1,9 +1,92 @@
-from multicamera_acquisition.interfaces.camera_base import BaseCamera, CameraError
+from multicamera_acquisition.interfaces.camera_base import (
+    BaseCamera,
+    CameraError,
+    stream_buffer_count,
+)
+from multicamera_acquisition.interfaces.device_cache import DeviceCache
 import PySpin
+import numpy as np
+import time
+
+
+def _get_flir_serial(cam):
+    node = cam.GetTLDeviceNodeMap().GetNode("DeviceSerialNumber")
+    return PySpin.CStringPtr(node).GetValue()
+
+
+def _enumerate_flir_serials():
+    # only serial numbers are cached: a cached CameraPtr would outlive the
+    # camera's close() and go stale when the camera is plugged in again
+    cam_list = PySpin.System.GetInstance().GetCameras()
+    serials = [
+        _get_flir_serial(cam_list.GetByIndex(i)) for i in range(cam_list.GetSize())
+    ]
+    cam_list.Clear()
+    return serials
+
+
+def _open_flir_camera(system, device_index, serial=None):
+    """Get a fresh CameraPtr for the camera at `device_index`.
+
+    If `serial` is given and the camera at `device_index` has another serial
+    number (the cameras changed since they were enumerated), the camera is
+    looked up by its serial number instead.
+
+    GetCameras() enumerates the cameras again, which is counted as a miss of
+    `flir_device_cache`.
+    """
+    start = time.perf_counter()
+    cam_list = system.GetCameras()
+    flir_device_cache.record_enumeration(time.perf_counter() - start)
+    try:
+        if cam_list.GetSize() == 0:
+            raise CameraError("No cameras detected.")
+        cam = None
+        if device_index < cam_list.GetSize():
+            cam = cam_list.GetByIndex(device_index)
+            if serial is not None and _get_flir_serial(cam) != serial:
+                cam = None
+        if cam is None and serial is not None:
+            flir_device_cache.invalidate()
+            cam = cam_list.GetBySerial(serial)
+        if cam is None or not cam.IsValid():
+            raise CameraError(f"Camera {serial or device_index} not found.")
+        return cam
+    finally:
+        cam_list.Clear()
+
+
+# TL stream statistics, by the names used in stream_stats
+STREAM_STATISTICS = {
+    "delivered_buffers": "StreamTotalBufferCount",
+    "failed_buffers": "StreamFailedBufferCount",
+    "buffer_underruns": "StreamBufferUnderrunCount",
+    "lost_frames": "StreamLostFrameCount",
+    "dropped_frames": "StreamDroppedFrameCount",
+}
+
+# one enumeration of serial numbers is shared by every FLIR camera created in
+# this process
+flir_device_cache = DeviceCache("flir", _enumerate_flir_serials, str)
+
+
+class _ImageEventHandler(PySpin.ImageEventHandler):
+    """Passes each image to a callback, from the Spinnaker event thread."""
+
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+
+    def OnImageEvent(self, image):
+        # the image is released by Spinnaker once this returns
+        if not image.IsIncomplete():
+            self.callback(image.GetNDArray(), image.GetTimeStamp())
+        else:
+            self.callback(None, None)
 
 
 class FlirCamera(BaseCamera):
-    def __init__(self, index=0, lock=True, **kwargs):
+    def __init__(self, index=0, lock=True, device_index=None, **kwargs):
         """
         Parameters
         ----------
@@ -13,6 +96,10 @@ class FlirCamera(BaseCamera):
         lock : bool (default: True)
             If True, setting new attributes after initialization results in
             an error.
+        device_index : int (default: None)
+            If given, the index of the camera (with serial number `index`)
+            found by `resolve_device_indices`, so only that camera's serial
+            number is read (instead of every camera's) to open it.
         """
         # super().__init__(**kwargs)
 
@@ -25,18 +112,18 @@ class FlirCamera(BaseCamera):
         self.serial_number = index
 
         self.system = PySpin.System.GetInstance()
-        cam_list = self.system.GetCameras()
-
-        debug: print("Found %d camera(s)" % cam_list.GetSize())
+        self.running = False
+        self.image_event_handler = None
+        self.buffer_count = None
+        self.handling_mode = None
 
-        if not cam_list.GetSize():
-            raise CameraError("No cameras detected.")
         if isinstance(index, int):
-            self.cam = cam_list.GetByIndex(index)
-        elif isinstance(index, str):
-            self.cam = cam_list.GetBySerial(index)
-        cam_list.Clear()
-        self.running = False
+            device_index = index
+        elif device_index is None:
+            device_index = flir_device_cache.get_index(index)
+        self.cam = _open_flir_camera(
+            self.system, device_index, index if isinstance(index, str) else None
+        )
 
     _rw_modes = {
         PySpin.RO: "read only",
@@ -91,6 +178,59 @@ class FlirCamera(BaseCamera):
             self.cam.EndAcquisition()
         self.running = False
 
+    def start_callback(self, callback):
+        """Start recording images, passing each to `callback` as it arrives
+        (see BaseCamera.start_callback)."""
+        self.image_event_handler = _ImageEventHandler(callback)
+        self.cam.RegisterEventHandler(self.image_event_handler)
+        self.start()
+
+    def stop_callback(self):
+        "Stop recording images started with start_callback."
+        self.stop()
+        if self.image_event_handler is not None:
+            self.cam.UnregisterEventHandler(self.image_event_handler)
+            self.image_event_handler = None
+
+    def set_stream_buffers(
+        self, buffer_count=None, handling_mode=None, fps=None, stall_tolerance_ms=250
+    ):
+        """Configure the host-side buffer pool (see
+        BaseCamera.set_stream_buffers)."""
+        stream_nodemap = self.cam.GetTLStreamNodeMap()
+        if buffer_count is None and fps is not None:
+            payload_size = PySpin.CIntegerPtr(self.cam.GetNodeMap().GetNode("PayloadSize"))
+            buffer_count = stream_buffer_count(
+                payload_size.GetValue(), fps, stall_tolerance_ms
+            )
+        if buffer_count is not None:
+            count_mode = PySpin.CEnumerationPtr(
+                stream_nodemap.GetNode("StreamBufferCountMode")
+            )
+            count_mode.SetIntValue(count_mode.GetEntryByName("Manual").GetValue())
+            count = PySpin.CIntegerPtr(stream_nodemap.GetNode("StreamBufferCountManual"))
+            count.SetValue(min(int(buffer_count), count.GetMax()))
+            self.buffer_count = count.GetValue()
+        if handling_mode is not None:
+            mode = PySpin.CEnumerationPtr(
+                stream_nodemap.GetNode("StreamBufferHandlingMode")
+            )
+            entry = mode.GetEntryByName(handling_mode)
+            if not PySpin.IsAvailable(entry):
+                raise CameraError(f"Unknown buffer handling mode {handling_mode}")
+            mode.SetIntValue(entry.GetValue())
+            self.handling_mode = handling_mode
+
+    def stream_stats(self):
+        """Statistics of the TL stream (see BaseCamera.stream_stats)."""
+        stats = {"buffer_count": self.buffer_count, "handling_mode": self.handling_mode}
+        stream_nodemap = self.cam.GetTLStreamNodeMap()
+        for key, name in STREAM_STATISTICS.items():
+            node = PySpin.CIntegerPtr(stream_nodemap.GetNode(name))
+            if PySpin.IsAvailable(node) and PySpin.IsReadable(node):
+                stats[key] = node.GetValue()
+        return stats
+
     def get_image(self, timeout=None):
         """Get an image from the camera.
         Parameters
@@ -106,7 +246,7 @@ class FlirCamera(BaseCamera):
             timeout if timeout else PySpin.EVENT_TIMEOUT_INFINITE
         )
 
-    def get_array(self, timeout=None, get_timestamp=False):
+    def get_array(self, timeout=None, get_timestamp=False, out=None):
         """Get an image from the camera, and convert it to a numpy array.
         Parameters
         ----------
@@ -115,6 +255,9 @@ class FlirCamera(BaseCamera):
                 Otherwise, wait indefinitely.
         get_timestamp : bool (default: False)
             If True, returns timestamp of frame f(camera timestamp)
+        out : Numpy array (default: None)
+            If not None, the image is copied straight from the camera buffer
+            into this array (e.g. a ring buffer slot), which is returned.
         Returns
         -------
         img : Numpy array
@@ -123,7 +266,11 @@ class FlirCamera(BaseCamera):
         img = self.get_image(timeout)
 
         if not img.IsIncomplete():
-            img_array = img.GetNDArray()
+            if out is not None:
+                np.copyto(out, img.GetNDArray(), casting="unsafe")
+                img_array = out
+            else:
+                img_array = img.GetNDArray()
 
             if get_timestamp:
                 tstamp = img.GetTimeStamp()
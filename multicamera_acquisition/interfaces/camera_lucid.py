@@ -1,4 +1,9 @@
-from multicamera_acquisition.interfaces.camera_base import BaseCamera, CameraError
+from multicamera_acquisition.interfaces.camera_base import (
+    BaseCamera,
+    CameraError,
+    stream_buffer_count,
+)
+from multicamera_acquisition.interfaces.device_cache import DeviceCache
 import numpy as np
 
 from arena_api.__future__.save import Writer
@@ -9,8 +14,19 @@ import logging
 import time 
 import ctypes
 
+# the number of stream buffers if not set with set_stream_buffers
+DEFAULT_BUFFER_COUNT = 20
+
+# TL stream statistics, by the names used in stream_stats
+STREAM_STATISTICS = {
+    "delivered_buffers": "StreamDeliveredFrameCount",
+    "failed_buffers": "StreamIncompleteFrameCount",
+    "lost_frames": "StreamLostFrameCount",
+    "dropped_frames": "StreamMissedImageCount",
+}
+
 class LucidCamera(BaseCamera):
-    def __init__(self, index=0, lock=True, **kwargs):
+    def __init__(self, index=0, lock=True, device_index=None, **kwargs):
         """
         Parameters
         ----------
@@ -20,29 +36,41 @@ class LucidCamera(BaseCamera):
         lock : bool (default: True)
             If True, setting new attributes after initialization results in
             an error.
+        device_index : int (default: None)
+            If given, the index of the camera (with serial number `index`)
+            in `system.device_infos`, found by `resolve_device_indices`, so
+            the device infos are read once without waiting (with retries)
+            for devices to appear.
         """
         self.serial_number = index
-        
-        # gets the devices
-        devices = find_helios_devices()
-
-        n_devices = len(devices)
-        # debug: print("Found %d camera(s)" % n_devices)
-        camera_serials = np.array([c.nodemap['DeviceSerialNumber'].value for c in devices])
-
-        if n_devices == 0:
-            raise CameraError("No cameras detected.")
-        if isinstance(index, str):
-            if not np.any(camera_serials == index):
-                raise CameraError("Camera with serial number %s not found." % index)
-            index = np.where(camera_serials == index)[0][0]
-            self.cam = devices[index]
-        else:
+        if not isinstance(index, str):
             raise CameraError("Index / serial number must be string")
 
-        del devices
+        device_info = None
+        if device_index is not None:
+            start = time.perf_counter()
+            device_infos = system.device_infos
+            lucid_device_cache.record_enumeration(time.perf_counter() - start)
+            if device_index < len(device_infos) and (
+                str(device_infos[device_index]["serial"]) == index
+            ):
+                device_info = device_infos[device_index]
+        if device_info is None:
+            # the device infos are shared by every lucid camera in this process
+            device_info = lucid_device_cache.get_device(index)
+
+        # only this camera is created, so other processes can create theirs
+        self.cam = system.create_device(device_infos=[device_info])[0]
+        try:
+            self.cam.nodemap["Scan3dOperatingMode"]
+        except Exception:
+            system.destroy_device(self.cam)
+            raise CameraError(f"Camera {index} is not a Helios camera.")
         
         self.running = False
+        self.callback_handle = None
+        self.buffer_count = DEFAULT_BUFFER_COUNT
+        self.handling_mode = None
 
     def init(self):
         """Initializes the camera.  Automatically called if the camera is opened
@@ -124,7 +152,7 @@ class LucidCamera(BaseCamera):
         #print('STARTING STREAM')
         #max_recording_hours = 60
         #max_recording_frames = max_recording_hours * 60 * 60 * 200
-        self.cam.start_stream(20)
+        self.cam.start_stream(self.buffer_count)
         self.running = True
 
     def stop(self):
@@ -136,6 +164,61 @@ class LucidCamera(BaseCamera):
         # Destroy device. Optional, implied by closing of module
         system.destroy_device()
         
+    def set_stream_buffers(
+        self, buffer_count=None, handling_mode=None, fps=None, stall_tolerance_ms=250
+    ):
+        """Configure the host-side buffer pool (see
+        BaseCamera.set_stream_buffers). The buffers are allocated by `start`."""
+        if buffer_count is None and fps is not None:
+            buffer_count = stream_buffer_count(
+                self.cam.nodemap["PayloadSize"].value, fps, stall_tolerance_ms
+            )
+        if buffer_count is not None:
+            self.buffer_count = int(buffer_count)
+        if handling_mode is not None:
+            self.cam.tl_stream_nodemap["StreamBufferHandlingMode"].value = handling_mode
+            self.handling_mode = handling_mode
+
+    def stream_stats(self):
+        """Statistics of the TL stream (see BaseCamera.stream_stats)."""
+        stats = {"buffer_count": self.buffer_count, "handling_mode": self.handling_mode}
+        for key, name in STREAM_STATISTICS.items():
+            try:
+                node = self.cam.tl_stream_nodemap.get_node(name)
+            except Exception:
+                node = None
+            if node is not None and node.is_readable:
+                stats[key] = node.value
+        return stats
+
+    def start_callback(self, callback):
+        """Start recording images, passing each to `callback` as it arrives
+        (see BaseCamera.start_callback).
+
+        Frames then arrive on the camera's hardware trigger; the software
+        trigger that `get_image` sends is not used.
+        """
+        from arena_api.callback import callback as arena_callback
+        from arena_api.callback import callback_function
+
+        @callback_function.device.on_buffer
+        def on_buffer(buffer_3d, *args, **kwargs):
+            # the buffer is requeued by arena once this returns
+            depth_image = get_depth_image(buffer_3d, self.scale_z, px_fmt="Coord3D_C16")
+            callback(depth_image, buffer_3d.timestamp_ns)
+
+        self.callback_handle = arena_callback.register(self.cam, on_buffer)
+        self.start()
+
+    def stop_callback(self):
+        """Stop passing images to the callback. The stream is stopped by
+        `stop`."""
+        from arena_api.callback import callback as arena_callback
+
+        if self.callback_handle is not None:
+            arena_callback.deregister(self.callback_handle)
+            self.callback_handle = None
+
     def close(self):
         self.stop()
         system.destroy_device()
@@ -145,13 +228,15 @@ class LucidCamera(BaseCamera):
         self.camera_node_types = {}
         self.initialized = False
 
-    def get_image(self, timeout=None):
+    def get_image(self, timeout=None, out=None):
         """Get an image from the camera.
         Parameters
         ----------
         timeout : int (default: None)
             Wait up to timeout milliseconds for an image if not None.
                 Otherwise, wait indefinitely.
+        out : Numpy array (default: None)
+            If not None, the depth image is written into this array.
         Returns
         -------
         img : PySpin Image
@@ -166,14 +251,16 @@ class LucidCamera(BaseCamera):
             #    trigger_armed = bool(self.nodemap['TriggerArmed'].value)
             buffer_3d = self.cam.get_buffer(timeout=timeout)
             # depth_image = get_depth_image(buffer_3d, self.scale_z, px_fmt="Coord3D_ABCY16")
-            depth_image = get_depth_image(buffer_3d, self.scale_z, px_fmt="Coord3D_C16")
+            depth_image = get_depth_image(
+                buffer_3d, self.scale_z, px_fmt="Coord3D_C16", out=out
+            )
             timestamp = buffer_3d.timestamp_ns
             self.cam.requeue_buffer(buffer_3d)
             return depth_image, timestamp
         except TimeoutError:
             return None, None
 
-    def get_array(self, timeout=None, get_timestamp=False):
+    def get_array(self, timeout=None, get_timestamp=False, out=None):
         """Get an image from the camera.
         Parameters
         ----------
@@ -182,6 +269,9 @@ class LucidCamera(BaseCamera):
                 Otherwise, wait indefinitely.
         get_timestamp : bool (default: False)
             If True, returns timestamp of frame f(camera timestamp)
+        out : Numpy array (default: None)
+            If not None, the depth image is scaled straight from the camera
+            buffer into this array (e.g. a ring buffer slot), which is returned.
         Returns
         -------
         img : Numpy array
@@ -190,7 +280,7 @@ class LucidCamera(BaseCamera):
         #if self.cam.IsGrabbing() == False:
         #    raise ValueError("Camera is not set up to grab frames.")
 
-        img_array, tstamp = self.get_image(timeout)
+        img_array, tstamp = self.get_image(timeout, out=out)
             
         #if img.GrabSucceeded():
         #    img_array = img.Array.astype(np.uint8)
@@ -235,6 +325,25 @@ def ctypes_to_numpy(ptr, shape):
     # Cast the ctypes pointer to a numpy array with the specified shape
     return np.ctypeslib.as_array(ptr, shape)
 
+def find_device_infos(tries_max=6, sleep_time_secs=1):
+    """Wait for lucid devices to be connected and return their device infos.
+
+    Unlike `find_helios_devices` this does not create the devices, so it can
+    be used to look up serial numbers before the cameras are opened.
+    """
+    for tries in range(tries_max):
+        device_infos = system.device_infos
+        if len(device_infos) > 0:
+            return device_infos
+        logging.log(
+            logging.INFO,
+            f"Try {tries+1} of {tries_max}: waiting for {sleep_time_secs} "
+            f"secs for a device to be connected!",
+        )
+        time.sleep(sleep_time_secs)
+    raise CameraError("No cameras detected.")
+
+
 def find_helios_devices(tries_max = 6, sleep_time_secs = 1):
     '''
     This function waits for the user to connect a device before raising
@@ -271,8 +380,19 @@ def find_helios_devices(tries_max = 6, sleep_time_secs = 1):
     return devices
 
 
-def get_depth_image(buffer_3d, scale_z, px_fmt="Coord3D_ABCY16"):
+# one enumeration (of device infos) is shared by every lucid camera created
+# in this process
+lucid_device_cache = DeviceCache(
+    "lucid", find_device_infos, lambda device_info: device_info["serial"]
+)
+
+
+def get_depth_image(buffer_3d, scale_z, px_fmt="Coord3D_ABCY16", out=None):
+    """Convert a 3D buffer to a depth image in millimeters.
 
+    If `out` is given, the scaled values are written into it (cast to its
+    dtype) instead of allocating a new array.
+    """
 
     if px_fmt == "Coord3D_ABCY16":
         # 3D buffer info -------------------------------------------------
@@ -311,12 +431,23 @@ def get_depth_image(buffer_3d, scale_z, px_fmt="Coord3D_ABCY16"):
 
         # Reshape the flat array into the 2D image format (height, width)
         depth_image = depth_array_mm.reshape((buffer_3d.height, buffer_3d.width))
+        if out is not None:
+            np.copyto(out, depth_image, casting="unsafe")
+            depth_image = out
 
     elif px_fmt == "Coord3D_C16":
         pdata_16bit = ctypes.cast(buffer_3d.pdata, ctypes.POINTER(ctypes.c_int16))
         number_of_pixels = buffer_3d.width * buffer_3d.height
         total_size = number_of_pixels
         buffer_as_array = np.ctypeslib.as_array(pdata_16bit, shape=(total_size,))
+        if out is not None:
+            np.multiply(
+                buffer_as_array.reshape((buffer_3d.height, buffer_3d.width)),
+                scale_z,
+                out=out,
+                casting="unsafe",
+            )
+            return out
         z_values = buffer_as_array[:]
         depth_array_mm = z_values * scale_z
         depth_image = depth_array_mm.reshape((buffer_3d.height, buffer_3d.width))
@@ -0,0 +1,362 @@
+""" Synthetic cameras for load-testing acquisition without camera SDKs.
+
+Frames are generated at a configured resolution, bit depth and frame rate,
+optionally with timestamp jitter, dropped frames and timeouts. Only numpy is
+required, so `acquire_video`, `Writer` and `MultiDisplay` can be exercised on
+any machine.
+
+With a `trigger_clock`, frames follow the triggers of an emulated arduino
+(see arduino_emulator.py) instead of a free-running clock.
+"""
+
+import math
+import threading
+import time
+
+import numpy as np
+
+from multicamera_acquisition.interfaces.camera_base import (
+    BaseCamera,
+    CameraError,
+    stream_buffer_count,
+)
+
+
+class TimeoutException(CameraError):
+    """Raised when no frame arrives within the timeout.
+
+    Named like the pypylon exception, so AcquisitionLoop treats it as a
+    timeout.
+    """
+
+    pass
+
+
+class SyntheticCamera(BaseCamera):
+    def __init__(
+        self,
+        index="synthetic",
+        width=1920,
+        height=1200,
+        bit_depth=8,
+        fps=30,
+        jitter_ms=0,
+        drop_rate=0,
+        timeout_rate=0,
+        seed=None,
+        trigger_clock=None,
+        lock=True,
+        **kwargs
+    ):
+        """
+        Parameters
+        ----------
+        index : str (default: 'synthetic')
+            The serial number reported by the camera.
+        width, height : int (default: 1920, 1200)
+            The frame size in pixels.
+        bit_depth : int (default: 8)
+            8 for uint8 frames, 16 for uint16 frames.
+        fps : float (default: 30)
+            The frame rate at which frames become available.
+        jitter_ms : float (default: 0)
+            Standard deviation of the (gaussian) jitter on frame arrival
+            times, in milliseconds.
+        drop_rate : float (default: 0)
+            Probability that a frame is dropped (never delivered). Dropped
+            frames leave a gap in the timestamps, like a missed trigger.
+        timeout_rate : float (default: 0)
+            Probability that a call to get_array times out instead of
+            returning a frame.
+        seed : int (default: None)
+            Seed for the random number generator.
+        trigger_clock : str or Path (default: None)
+            If set, a trigger clock file written by ArduinoEmulator. Frames
+            then arrive with the emulated triggers, at the trigger rate
+            (fps is ignored), and none arrive before the first or after the
+            last trigger.
+        """
+        if bit_depth not in [8, 16]:
+            raise CameraError("bit_depth must be 8 or 16")
+        self.serial_number = index
+        self.width = int(width)
+        self.height = int(height)
+        self.bit_depth = bit_depth
+        self.dtype = np.uint8 if bit_depth == 8 else np.uint16
+        self.fps = float(fps)
+        self.jitter_ms = jitter_ms
+        self.drop_rate = drop_rate
+        self.timeout_rate = timeout_rate
+        self.rng = np.random.default_rng(seed)
+        self.trigger_clock = trigger_clock
+        self.clock = None
+        self.frame_count = 0
+        self.dropped_frames = 0
+        self.running = False
+        self.pattern = None
+        self.callback_thread = None
+        self.buffer_count = None
+        self.handling_mode = None
+
+    def init(self):
+        """Initializes the camera.  Automatically called if the camera is opened
+        using a `with` clause."""
+        # a diagonal gradient, so that frames are not trivially compressible
+        max_value = np.iinfo(self.dtype).max
+        yy, xx = np.mgrid[0 : self.height, 0 : self.width]
+        self.pattern = ((xx + yy) % (max_value + 1)).astype(self.dtype)
+        self.initialized = True
+
+    def start(self):
+        "Start recording images."
+        if self.pattern is None:
+            self.init()
+        self.start_time = time.monotonic()
+        self.clock = None
+        self.frame_count = 0
+        self.dropped_frames = 0
+        self.running = True
+
+    def stop(self):
+        "Stop recording images."
+        self.running = False
+        if self.callback_thread is not None:
+            self.callback_thread.join()
+            self.callback_thread = None
+
+    def start_callback(self, callback):
+        """Start recording images, passing each to `callback` as it arrives
+        (see BaseCamera.start_callback). A thread stands in for the SDK's."""
+        self.start()
+        # like an SDK buffer, the image is reused for the next frame
+        frame_buffer = np.empty_like(self.pattern)
+
+        def deliver():
+            while self.running:
+                try:
+                    frame_index, frame_time = self._wait_for_frame(100)
+                except TimeoutException:
+                    continue
+                except CameraError:
+                    # stopped while waiting
+                    break
+                img = self._render(frame_index, out=frame_buffer)
+                callback(img, int(frame_time * 1e9))
+
+        self.callback_thread = threading.Thread(target=deliver, daemon=True)
+        self.callback_thread.start()
+
+    def stop_callback(self):
+        "Stop recording images started with start_callback."
+        self.stop()
+
+    def close(self):
+        """Closes the camera and cleans up."""
+        self.stop()
+        self.pattern = None
+        self.initialized = False
+
+    def set_stream_buffers(
+        self, buffer_count=None, handling_mode=None, fps=None, stall_tolerance_ms=250
+    ):
+        """Record the buffer pool settings (see BaseCamera.set_stream_buffers).
+        Synthetic frames are generated on demand, so there is no pool."""
+        if buffer_count is None and fps is not None:
+            frame_bytes = self.width * self.height * np.dtype(self.dtype).itemsize
+            buffer_count = stream_buffer_count(frame_bytes, fps, stall_tolerance_ms)
+        self.buffer_count = buffer_count
+        self.handling_mode = handling_mode
+
+    def stream_stats(self):
+        """Frames delivered and dropped (see BaseCamera.stream_stats)."""
+        return {
+            "buffer_count": self.buffer_count,
+            "handling_mode": self.handling_mode,
+            "delivered_buffers": self.frame_count - self.dropped_frames,
+            "lost_frames": self.dropped_frames,
+        }
+
+    def _frame_time(self, frame_index):
+        """Time (time.monotonic) at which a frame becomes available."""
+        frame_time = self.start_time + frame_index / self.fps
+        if self.jitter_ms > 0:
+            frame_time += self.rng.normal(0, self.jitter_ms / 1000)
+        return frame_time
+
+    def _sync_to_trigger_clock(self, deadline):
+        """Wait (until the deadline) for the emulated triggers to start.
+
+        Returns
+        -------
+        synced : bool
+        """
+        from multicamera_acquisition.interfaces.arduino_emulator import (
+            read_trigger_clock,
+        )
+
+        while self.clock is None:
+            clock = read_trigger_clock(self.trigger_clock)
+            # ignore the clock of a recording that ended before this one started
+            if clock is not None:
+                period = clock["inv_framerate"] / 1e6
+                if clock["start"] + clock["n_triggers"] * period > self.start_time:
+                    # triggers sent before the camera started are missed
+                    self.frame_count = max(
+                        0, math.ceil((self.start_time - clock["start"]) / period)
+                    )
+                    self.clock = clock
+                    self.start_time = clock["start"]
+                    self.fps = 1 / period
+                    break
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _wait_for_frame(self, timeout):
+        """Block until the next frame is available and return its time.
+
+        Parameters
+        ----------
+        timeout : int
+            Milliseconds to wait. If None, wait indefinitely.
+        """
+        if not self.running:
+            raise CameraError("Camera is not set up to grab frames.")
+        deadline = None if timeout is None else time.monotonic() + timeout / 1000
+
+        if self.timeout_rate > 0 and self.rng.random() < self.timeout_rate:
+            if deadline is not None:
+                time.sleep(max(0, deadline - time.monotonic()))
+            raise TimeoutException("Synthetic frame timeout")
+
+        if self.trigger_clock is not None and not self._sync_to_trigger_clock(deadline):
+            raise TimeoutException("Synthetic frame timeout")
+
+        while True:
+            frame_index = self.frame_count
+            if self.clock is not None and frame_index >= self.clock["n_triggers"]:
+                # no triggers after the last one
+                if deadline is not None:
+                    time.sleep(max(0, deadline - time.monotonic()))
+                raise TimeoutException("Synthetic frame timeout")
+            frame_time = self._frame_time(frame_index)
+            if deadline is not None and frame_time > deadline:
+                time.sleep(max(0, deadline - time.monotonic()))
+                raise TimeoutException("Synthetic frame timeout")
+            self.frame_count += 1
+            if self.drop_rate > 0 and self.rng.random() < self.drop_rate:
+                self.dropped_frames += 1
+                continue
+            delay = frame_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            return frame_index, frame_time
+
+    def _render(self, frame_index, out=None):
+        """Render a frame, stamping the frame index into the first row."""
+        if out is None:
+            img = self.pattern.copy()
+        else:
+            np.copyto(out, self.pattern, casting="unsafe")
+            img = out
+        marker = np.frombuffer(np.int64(frame_index).tobytes(), dtype=np.uint8)
+        img[0, : len(marker)] = marker
+        return img
+
+    def get_image(self, timeout=None):
+        """Get an image from the camera.
+        Parameters
+        ----------
+        timeout : int (default: None)
+            Wait up to timeout milliseconds for an image if not None.
+                Otherwise, wait indefinitely.
+        Returns
+        -------
+        img : Numpy array
+        """
+        frame_index, _ = self._wait_for_frame(timeout)
+        return self._render(frame_index)
+
+    def get_array(self, timeout=None, get_timestamp=False, out=None):
+        """Get an image from the camera.
+        Parameters
+        ----------
+        timeout : int (default: None)
+            Wait up to timeout milliseconds for an image if not None.
+                Otherwise, wait indefinitely.
+        get_timestamp : bool (default: False)
+            If True, returns timestamp of frame f(camera timestamp)
+        out : Numpy array (default: None)
+            If not None, the frame is written into this array, which is
+            returned.
+        Returns
+        -------
+        img : Numpy array
+        tstamp : int
+            Nanoseconds, on the time.monotonic clock.
+        """
+        frame_index, frame_time = self._wait_for_frame(timeout)
+        img_array = self._render(frame_index, out=out)
+        if get_timestamp:
+            return img_array, int(frame_time * 1e9)
+        else:
+            return img_array
+
+    def get_info(self, name=None):
+        """Gen information on a camera node (attribute or method)."""
+        raise NotImplementedError
+
+    def document(self):
+        """Creates a MarkDown documentation string for the camera."""
+        raise NotImplementedError
+
+
+class SyntheticAzureCamera(SyntheticCamera):
+    """A synthetic Azure Kinect, returning depth and IR frames.
+
+    Like AzureCamera, get_array returns (depth, ir, timestamp), with a uint16
+    depth frame, a uint8 IR frame and a timestamp in microseconds.
+    """
+
+    def __init__(self, index="synthetic_azure", width=640, height=576, fps=30, **kwargs):
+        kwargs.pop("bit_depth", None)
+        super().__init__(
+            index=index, width=width, height=height, bit_depth=16, fps=fps, **kwargs
+        )
+
+    def init(self):
+        super().init()
+        # depth in mm, within the range of the NFOV unbinned mode
+        self.pattern = (500 + self.pattern % 2000).astype(np.uint16)
+        self.ir_pattern = (np.clip(self.pattern, 0, 1275) / 5).astype(np.uint8)
+
+    def start_callback(self, callback):
+        # like AzureCamera, frames can only be polled
+        raise NotImplementedError
+
+    def get_array(self, timeout=None, get_color=False, get_timestamp=False):
+        """Get depth and IR images from the camera.
+        Parameters
+        ----------
+        timeout : int (default: None)
+            Wait up to timeout milliseconds for an image if not None.
+                Otherwise, wait indefinitely.
+        get_color : bool (default: False)
+            Not supported, raises an error if True.
+        get_timestamp : bool (default: False)
+            If True, returns timestamp of frame f(camera timestamp)
+        Returns
+        -------
+        depth : Numpy array
+        ir : Numpy array
+        tstamp : int
+            Microseconds, on the time.monotonic clock.
+        """
+        if get_color:
+            raise CameraError("Synthetic azure cameras have no color stream")
+        frame_index, frame_time = self._wait_for_frame(timeout)
+        depth = self._render(frame_index)
+        ir = self.ir_pattern.copy()
+        tstamp = int(frame_time * 1e6) if get_timestamp else None
+        return depth, ir, tstamp
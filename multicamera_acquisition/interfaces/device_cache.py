@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+
+from multicamera_acquisition.interfaces.camera_base import CameraError
+
+
+class DeviceCache(object):
+    """A process-wide cache of the devices found by a camera SDK.
+
+    Enumerating devices is slow for every SDK (and for Lucid cameras it
+    retries with sleeps), so each camera module keeps one DeviceCache and
+    every camera created in the same process shares a single enumeration.
+
+    Attributes
+    ----------
+    hits : int
+        Number of lookups answered from the cache.
+    misses : int
+        Number of lookups that required an enumeration.
+    enumeration_time : float
+        Total seconds spent enumerating devices.
+    """
+
+    def __init__(self, brand, enumerate_devices, get_serial):
+        """
+        Parameters
+        ----------
+        brand : str
+            Name of the camera brand, used in log messages.
+        enumerate_devices : callable
+            Returns a list of devices from the SDK.
+        get_serial : callable
+            Returns the serial number (as a string) of a device.
+        """
+        self.brand = brand
+        self._enumerate_devices = enumerate_devices
+        self._get_serial = get_serial
+        self._lock = threading.RLock()
+        self._devices = None
+        self._serial_to_index = {}
+        self.hits = 0
+        self.misses = 0
+        self.enumeration_time = 0.0
+
+    def get_devices(self):
+        """Return the list of devices, enumerating them if needed."""
+        with self._lock:
+            if self._devices is None:
+                self.misses += 1
+                start = time.perf_counter()
+                devices = list(self._enumerate_devices())
+                self.enumeration_time += time.perf_counter() - start
+                self._serial_to_index = {
+                    str(self._get_serial(device)): i for i, device in enumerate(devices)
+                }
+                self._devices = devices
+                logging.log(
+                    logging.DEBUG,
+                    f"Enumerated {len(devices)} {self.brand} device(s) in "
+                    f"{self.enumeration_time:.2f}s",
+                )
+            else:
+                self.hits += 1
+            return self._devices
+
+    def get_index(self, serial, refresh_on_miss=True):
+        """Return the index of the device with a given serial number.
+
+        Parameters
+        ----------
+        serial : str
+            The serial number of the device.
+        refresh_on_miss : bool (default: True)
+            If the serial number is not in the cache, enumerate again once in
+            case the device was connected after the last enumeration.
+
+        Returns
+        -------
+        index : int
+        """
+        serial = str(serial)
+        with self._lock:
+            self.get_devices()
+            if serial not in self._serial_to_index and refresh_on_miss:
+                self.invalidate()
+                self.get_devices()
+            if serial not in self._serial_to_index:
+                raise CameraError(f"Camera with serial number {serial} not found.")
+            return self._serial_to_index[serial]
+
+    def get_device(self, serial, refresh_on_miss=True):
+        """Return the device with a given serial number."""
+        with self._lock:
+            index = self.get_index(serial, refresh_on_miss=refresh_on_miss)
+            return self._devices[index]
+
+    def serials(self):
+        """Return the serial numbers of all cached devices."""
+        with self._lock:
+            self.get_devices()
+            return list(self._serial_to_index.keys())
+
+    def invalidate(self):
+        """Forget the cached devices, so the next lookup enumerates again."""
+        with self._lock:
+            self._devices = None
+            self._serial_to_index = {}
+
+    def record_enumeration(self, seconds):
+        """Count an enumeration made outside `get_devices`, e.g. by the SDK
+        when it opens a device by serial number."""
+        with self._lock:
+            self.misses += 1
+            self.enumeration_time += seconds
+
+    def stats(self):
+        """Return the hit/miss counters and total enumeration time."""
+        return {
+            "brand": self.brand,
+            "hits": self.hits,
+            "misses": self.misses,
+            "enumeration_time": self.enumeration_time,
+        }
@@ -0,0 +1,157 @@
+""" Binary framing of arduino input events.
+
+With BINARY_INPUT_EVENTS set in the firmware, input pin changes are sent as
+fixed-size 16 byte records instead of 'input: ...' text lines. All other
+messages ('Waiting...', 'Start', 'Finished', ...) are still text lines, and
+the two are told apart by the sync bytes, which never occur in the (ASCII)
+text.
+
+Record layout (little endian):
+
+    offset  size  field
+    0       2     sync bytes 0xA5 0x5A
+    2       1     protocol version (1)
+    3       1     number of input pins
+    4       4     pulse id (uint32)
+    8       4     arduino millis() (uint32)
+    12      2     input pin states, one bit per pin (bit i = pin i)
+    14      2     checksum: sum of bytes 2-13, modulo 2**16
+
+BinaryStreamParser parses all complete records in a chunk of the stream at
+once with numpy, without a python loop per event.
+"""
+
+import re
+
+import numpy as np
+
+SYNC = b"\xa5\x5a"
+PROTOCOL_VERSION = 1
+
+# where the stream can continue after a corrupt record: the next sync bytes
+# or the next line of (printable) text
+RESYNC = re.compile(re.escape(SYNC) + rb"|[ -~]+\r?\n")
+# what may be the start of a line or of sync bytes at the end of a chunk
+PARTIAL_TAIL = re.compile(rb"[ -~\r]*" + re.escape(SYNC[:1]) + rb"?\Z")
+
+RECORD_DTYPE = np.dtype(
+    [
+        ("sync", "S2"),
+        ("version", "u1"),
+        ("n_inputs", "u1"),
+        ("pulse_id", "<u4"),
+        ("arduino_ms", "<u4"),
+        ("states", "<u2"),
+        ("checksum", "<u2"),
+    ]
+)
+RECORD_BYTES = RECORD_DTYPE.itemsize
+
+
+def encode_input_events(pulse_ids, arduino_ms, states):
+    """Encode input events as binary records, as the firmware does.
+
+    Parameters
+    ----------
+    pulse_ids, arduino_ms : array-like of int, shape (n_events,)
+    states : array-like of int, shape (n_events, n_inputs)
+        0 or 1 per input pin.
+
+    Returns
+    -------
+    data : bytes
+    """
+    states = np.atleast_2d(np.asarray(states, dtype=np.uint16))
+    records = np.zeros(len(states), dtype=RECORD_DTYPE)
+    records["sync"] = SYNC
+    records["version"] = PROTOCOL_VERSION
+    records["n_inputs"] = states.shape[1]
+    records["pulse_id"] = pulse_ids
+    records["arduino_ms"] = arduino_ms
+    records["states"] = (states << np.arange(states.shape[1], dtype=np.uint16)).sum(
+        axis=1
+    )
+    records["checksum"] = _checksums(records)
+    return records.tobytes()
+
+
+def _checksums(records):
+    data = records.view(np.uint8).reshape(len(records), RECORD_BYTES)
+    return data[:, 2:14].sum(axis=1, dtype=np.uint32) & 0xFFFF
+
+
+def unpack_states(states, n_inputs):
+    """Pin state bit masks to an (n_events, n_inputs) array of 0 / 1."""
+    return ((states[:, None] >> np.arange(n_inputs)) & 1).astype(np.int64)
+
+
+class BinaryStreamParser(object):
+    """Splits a byte stream of text lines and binary records.
+
+    Bytes are passed to `feed` as they arrive, in chunks of any size, and
+    incomplete lines or records are kept until the rest arrives.
+    """
+
+    def __init__(self):
+        self.buffer = b""
+        self.n_records = 0
+        self.n_corrupt = 0
+
+    def feed(self, data):
+        """Parse the next chunk of the stream.
+
+        Returns
+        -------
+        items : list
+            In stream order, str for each text line and a numpy array of
+            RECORD_DTYPE for each run of consecutive valid records.
+        """
+        buffer = self.buffer + data
+        items = []
+        position = 0
+        while position < len(buffer):
+            sync = buffer.find(SYNC, position)
+            if sync == -1:
+                # text only, keep an incomplete line (or a first sync byte)
+                end = buffer.rfind(b"\n", position) + 1
+                if end == 0:
+                    break
+                items += self._lines(buffer[position:end])
+                position = end
+                continue
+            if sync > position:
+                items += self._lines(buffer[position:sync])
+                position = sync
+            n_records = (len(buffer) - position) // RECORD_BYTES
+            if n_records == 0:
+                break
+            records = np.frombuffer(
+                buffer, dtype=RECORD_DTYPE, count=n_records, offset=position
+            )
+            valid = (
+                (records["sync"] == SYNC)
+                & (records["version"] == PROTOCOL_VERSION)
+                & (records["checksum"] == _checksums(records))
+            )
+            n_valid = n_records if valid.all() else int(np.argmin(valid))
+            if n_valid == 0:
+                # corrupt record, skip its sync bytes and resume at the next
+                # record or text line (e.g. 'Finished' after a truncated record)
+                self.n_corrupt += 1
+                position = self._resync(buffer, position + len(SYNC))
+                continue
+            items.append(records[:n_valid].copy())
+            self.n_records += n_valid
+            position += n_valid * RECORD_BYTES
+        self.buffer = buffer[position:]
+        return items
+
+    def _resync(self, buffer, start):
+        match = RESYNC.search(buffer, start)
+        if match is not None:
+            return match.start()
+        return PARTIAL_TAIL.search(buffer, start).start()
+
+    def _lines(self, data):
+        lines = data.decode("utf-8", errors="replace").split("\n")
+        return [line.strip("\r") for line in lines if len(line.strip("\r")) > 0]
@@ -0,0 +1,241 @@
+""" A memory budget for frames waiting in queues.
+
+Frames sent through multiprocessing queues are held in host memory until
+they are read, so an encoder that falls behind fills RAM. A MemoryBudget caps
+the bytes of queued frames across all cameras. Each queue is wrapped in a
+BudgetedQueue that charges frames against the budget when they are put, and
+credits them back when they are read. When the budget is full, each camera's
+policy decides what happens:
+
+    block            the acquisition loop waits until there is room
+    drop_oldest      the oldest frame still queued for the camera is dropped
+    drop_newest      the new frame is dropped
+    decimate_display display frames are dropped once the budget is half
+                     full, so that room is left for frames to be written;
+                     written frames then block
+
+Display frames are always dropped, never blocked on, when the budget is
+full. Usage and policy actions are counted in shared memory (see
+`MemoryBudget.as_dict`).
+"""
+
+import multiprocessing as mp
+import queue as queue_module
+import time
+
+import numpy as np
+
+POLICIES = ["block", "drop_oldest", "drop_newest", "decimate_display"]
+
+# per camera counters
+_COUNTERS = [
+    "queued_bytes",
+    "peak_queued_bytes",
+    "frames",
+    "blocked",
+    "blocked_ns",
+    "dropped_oldest",
+    "dropped_newest",
+    "display_dropped",
+]
+
+
+def frame_bytes(data):
+    """Bytes of the arrays in a queue item, e.g. (img, timestamp, frame_index)."""
+    return sum(item.nbytes for item in data if isinstance(item, np.ndarray))
+
+
+class MemoryBudget(object):
+    """Bytes of queued frames, shared across processes and cameras."""
+
+    def __init__(self, budget_bytes, camera_names):
+        """
+        Parameters
+        ----------
+        budget_bytes : int
+            The most bytes of frames that can be queued at once.
+        camera_names : list of str
+            One set of counters per camera.
+        """
+        self.budget_bytes = int(budget_bytes)
+        self.camera_names = list(camera_names)
+        self.condition = mp.Condition()
+        self.used = mp.Value("q", 0, lock=False)
+        self.peak = mp.Value("q", 0, lock=False)
+        self.counters = mp.Array("q", len(self.camera_names) * len(_COUNTERS), lock=False)
+
+    def index(self, camera_name):
+        return self.camera_names.index(camera_name)
+
+    def _index(self, camera_index, counter):
+        return camera_index * len(_COUNTERS) + _COUNTERS.index(counter)
+
+    def count(self, camera_index, counter, value=1):
+        """Add to one of a camera's counters."""
+        self.counters[self._index(camera_index, counter)] += value
+
+    def get(self, camera_index, counter):
+        return self.counters[self._index(camera_index, counter)]
+
+    def _fits(self, nbytes, limit):
+        # a frame larger than the budget is let through when nothing is queued
+        return self.used.value + nbytes <= limit or self.used.value == 0
+
+    def acquire(self, nbytes, camera_index, block=False, timeout=None, fraction=1.0):
+        """Charge `nbytes` against the budget.
+
+        Parameters
+        ----------
+        nbytes : int
+        camera_index : int
+        block : bool (default: False)
+            Wait for room if the budget is full.
+        timeout : float (default: None)
+            Seconds to wait if block is True.
+        fraction : float (default: 1.0)
+            Only this fraction of the budget can be used.
+
+        Returns
+        -------
+        acquired : bool
+        """
+        limit = self.budget_bytes * fraction
+        with self.condition:
+            if not self._fits(nbytes, limit):
+                if not block:
+                    return False
+                start = time.monotonic_ns()
+                self.count(camera_index, "blocked")
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while not self._fits(nbytes, limit):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self.count(camera_index, "blocked_ns", time.monotonic_ns() - start)
+                        return False
+                    self.condition.wait(remaining)
+                self.count(camera_index, "blocked_ns", time.monotonic_ns() - start)
+            self.used.value += nbytes
+            self.peak.value = max(self.peak.value, self.used.value)
+            self.count(camera_index, "queued_bytes", nbytes)
+            self.count(camera_index, "frames")
+            peak = self._index(camera_index, "peak_queued_bytes")
+            self.counters[peak] = max(
+                self.counters[peak], self.get(camera_index, "queued_bytes")
+            )
+        return True
+
+    def release(self, nbytes, camera_index):
+        """Credit `nbytes` back to the budget."""
+        with self.condition:
+            self.used.value -= nbytes
+            self.count(camera_index, "queued_bytes", -nbytes)
+            self.condition.notify_all()
+
+    def as_dict(self):
+        """Budget usage and policy actions, e.g. for the session metadata."""
+        return {
+            "budget_bytes": self.budget_bytes,
+            "used_bytes": self.used.value,
+            "peak_bytes": self.peak.value,
+            "cameras": {
+                name: {
+                    counter: self.get(i, counter)
+                    for counter in _COUNTERS
+                    if counter != "queued_bytes"
+                }
+                for i, name in enumerate(self.camera_names)
+            },
+        }
+
+    def summary(self):
+        """A short string for logging."""
+        actions = []
+        for name, counts in self.as_dict()["cameras"].items():
+            for counter in ["blocked", "dropped_oldest", "dropped_newest", "display_dropped"]:
+                if counts[counter] > 0:
+                    actions.append(f"{name} {counter} {counts[counter]}")
+        return (
+            f"peak {self.peak.value / 1e6:.1f} of {self.budget_bytes / 1e6:.1f} MB queued"
+            + (f" ({', '.join(actions)})" if len(actions) > 0 else "")
+        )
+
+
+class BudgetedQueue(object):
+    """A multiprocessing.Queue whose frames are charged to a MemoryBudget.
+
+    Has the parts of the multiprocessing.Queue API used by AcquisitionLoop,
+    Writer and MultiDisplay (put, get, qsize, empty).
+    """
+
+    def __init__(self, budget, camera_name, policy="block", display=False, queue=None):
+        """
+        Parameters
+        ----------
+        budget : MemoryBudget
+        camera_name : str
+            The camera the frames are counted against.
+        policy : str (default: 'block')
+            What to do when the budget is full, one of POLICIES.
+        display : bool (default: False)
+            Whether the queue carries display frames.
+        queue : multiprocessing.Queue (default: None)
+            The queue to wrap, a new one by default.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}")
+        self.queue = mp.Queue() if queue is None else queue
+        self.budget = budget
+        self.camera_index = budget.index(camera_name)
+        self.policy = policy
+        self.display = display
+
+    def qsize(self):
+        return self.queue.qsize()
+
+    def empty(self):
+        return self.queue.empty()
+
+    def put(self, data, block=True, timeout=None):
+        nbytes = frame_bytes(data)
+        if nbytes == 0:
+            # the stop signal (or a frame without an image) is never held back
+            self.queue.put((data, 0), block, timeout)
+            return
+
+        if self.display:
+            fraction = 0.5 if self.policy == "decimate_display" else 1.0
+            if not self.budget.acquire(nbytes, self.camera_index, fraction=fraction):
+                self.budget.count(self.camera_index, "display_dropped")
+                return
+        elif self.policy in ["block", "decimate_display"]:
+            self.budget.acquire(nbytes, self.camera_index, block=True)
+        else:
+            acquired = self.budget.acquire(nbytes, self.camera_index)
+            if not acquired and self.policy == "drop_oldest":
+                while not acquired:
+                    try:
+                        # frames just put may still be in the feeder thread
+                        if self.budget.get(self.camera_index, "queued_bytes") == 0:
+                            raise queue_module.Empty
+                        self._release(self.queue.get(timeout=0.1))
+                    except queue_module.Empty:
+                        # the budget is held by other cameras
+                        break
+                    self.budget.count(self.camera_index, "dropped_oldest")
+                    acquired = self.budget.acquire(nbytes, self.camera_index)
+            if not acquired:
+                self.budget.count(self.camera_index, "dropped_newest")
+                return
+        self.queue.put((data, nbytes), block, timeout)
+
+    def _release(self, item):
+        data, nbytes = item
+        if nbytes > 0:
+            self.budget.release(nbytes, self.camera_index)
+        return data
+
+    def get(self, block=True, timeout=None):
+        return self._release(self.queue.get(block, timeout))
+
+    def get_nowait(self):
+        return self.get(block=False)
@@ -0,0 +1,199 @@
+""" Binary per-frame metadata.
+
+An alternative to the per-frame csv rows written by Writer. Each frame is one
+fixed-width record of int64 / float64 fields, buffered in memory and
+appended to the file in blocks, so nothing is formatted while recording and
+nothing has to be parsed when reading: `read_metadata` memory-maps the file
+and returns one numpy array per column.
+
+File layout: an 8 byte magic string, a uint32 header length and a JSON
+header naming the columns, followed by the records.
+
+Convert a file to the csv layout written by Writer with:
+
+    python -m multicamera_acquisition.metadata_store top.12345.metadata.bin
+"""
+
+import csv
+import json
+import struct
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+_MAGIC = b"MCMETA01"
+
+# written when a camera returns no timestamp
+NO_TIMESTAMP = -1
+
+FRAME_COLUMNS = (
+    ("frame_id", "<i8"),  # frame number from the acquisition loop
+    ("frame_timestamp", "<i8"),  # camera timestamp
+    ("host_time", "<f8"),  # time.time() when the frame was written
+    ("host_monotonic_ns", "<i8"),  # time.monotonic_ns() when the frame was written
+    ("queue_size", "<i8"),  # write queue size after the frame was taken
+)
+
+# csv columns written by Writer
+CSV_COLUMNS = ["frame_id", "frame_timestamp", "frame_image_uid", "queue_size"]
+
+
+class MetadataStore(object):
+    """Buffers fixed-width records and appends them to a binary file."""
+
+    def __init__(
+        self, file_name, columns=FRAME_COLUMNS, buffer_rows=1024, flush_interval_s=1.0
+    ):
+        """
+        Parameters
+        ----------
+        file_name : str or Path
+            The metadata file, which is overwritten.
+        columns : tuple of (name, dtype) (default: FRAME_COLUMNS)
+            Fixed-width numpy dtypes, e.g. '<i8' or '<f8'.
+        buffer_rows : int (default: 1024)
+            Number of records held in memory between writes.
+        flush_interval_s : float (default: 1.0)
+            Records are also written once the oldest buffered record is this
+            old, so that little is lost if the process dies.
+        """
+        self.file_name = Path(file_name)
+        self.dtype = np.dtype(list(columns))
+        self.buffer = np.zeros(buffer_rows, dtype=self.dtype)
+        self.n_buffered = 0
+        self.n_rows = 0
+        self.flush_interval_s = flush_interval_s
+        self._last_flush = time.monotonic()
+        self.file = open(self.file_name, "wb")
+        header = json.dumps(
+            {"columns": [[name, self.dtype[name].str] for name in self.dtype.names]}
+        ).encode("utf-8")
+        self.file.write(_MAGIC + struct.pack("<I", len(header)) + header)
+        self.file.flush()
+
+    def append(self, *values):
+        """Append one record, with one value per column."""
+        self.buffer[self.n_buffered] = values
+        self.n_buffered += 1
+        self.n_rows += 1
+        if (
+            self.n_buffered == len(self.buffer)
+            or time.monotonic() - self._last_flush > self.flush_interval_s
+        ):
+            self.flush()
+
+    def extend(self, records):
+        """Append a block of records.
+
+        Parameters
+        ----------
+        records : numpy structured array or dict of arrays
+            One field (or array) per column.
+        """
+        if isinstance(records, dict):
+            block = np.zeros(len(next(iter(records.values()))), dtype=self.dtype)
+            for name in self.dtype.names:
+                block[name] = records[name]
+        else:
+            block = records.astype(self.dtype, copy=False)
+        self.flush()
+        self.file.write(block.tobytes())
+        self.n_rows += len(block)
+
+    def flush(self):
+        """Write buffered records to the file."""
+        if self.n_buffered > 0:
+            self.file.write(self.buffer[: self.n_buffered].tobytes())
+            self.n_buffered = 0
+        self.file.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+def _read_header(f, file_name):
+    if f.read(len(_MAGIC)) != _MAGIC:
+        raise ValueError(f"{file_name} is not a metadata file")
+    (header_len,) = struct.unpack("<I", f.read(4))
+    header = json.loads(f.read(header_len).decode("utf-8"))
+    dtype = np.dtype([(name, fmt) for name, fmt in header["columns"]])
+    return dtype, len(_MAGIC) + 4 + header_len
+
+
+def read_metadata(file_name):
+    """Read a binary metadata file, without parsing.
+
+    Returns
+    -------
+    columns : dict of numpy arrays
+        One (memory-mapped) array per column. A record that was only
+        partially written (e.g. after a crash) is ignored.
+    """
+    with open(file_name, "rb") as f:
+        dtype, offset = _read_header(f, file_name)
+    n_rows = (Path(file_name).stat().st_size - offset) // dtype.itemsize
+    if n_rows == 0:
+        return {name: np.zeros(0, dtype=dtype[name]) for name in dtype.names}
+    records = np.memmap(file_name, dtype=dtype, mode="r", offset=offset, shape=(n_rows,))
+    return {name: records[name] for name in dtype.names}
+
+
+def count_rows(file_name):
+    """Number of records in a binary metadata file."""
+    with open(file_name, "rb") as f:
+        dtype, offset = _read_header(f, file_name)
+    return (Path(file_name).stat().st_size - offset) // dtype.itemsize
+
+
+def metadata_to_csv(file_name, csv_file_name=None):
+    """Convert a binary frame metadata file to the csv layout of Writer.
+
+    Parameters
+    ----------
+    file_name : str or Path
+        e.g. top.12345.metadata.bin
+    csv_file_name : str or Path (default: None)
+        Defaults to file_name with a .csv suffix.
+
+    Returns
+    -------
+    csv_file_name : Path
+    """
+    file_name = Path(file_name)
+    if csv_file_name is None:
+        csv_file_name = file_name.with_suffix(".csv")
+    columns = read_metadata(file_name)
+    with open(csv_file_name, "w") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for frame_id, frame_timestamp, host_time, queue_size in zip(
+            columns["frame_id"].tolist(),
+            columns["frame_timestamp"].tolist(),
+            columns["host_time"].tolist(),
+            columns["queue_size"].tolist(),
+        ):
+            writer.writerow(
+                [
+                    frame_id,
+                    "" if frame_timestamp == NO_TIMESTAMP else frame_timestamp,
+                    str(round(host_time, 5)).zfill(5),
+                    str(queue_size),
+                ]
+            )
+    return Path(csv_file_name)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(
+            "Usage: python -m multicamera_acquisition.metadata_store "
+            "[metadata.bin files]"
+        )
+        sys.exit(1)
+    for file_name in sys.argv[1:]:
+        print(metadata_to_csv(file_name))
@@ -0,0 +1,429 @@
+""" Raw, memory-mapped capture with deferred transcoding.
+
+At very high frame rates real-time encoding is the bottleneck. The 'raw'
+encoder (see encoders.py) instead copies each frame into large preallocated,
+memory-mapped segment files, so the cost of writing a frame is close to a
+memcpy. The segments are transcoded to mp4 / avi after the session:
+
+    python -m multicamera_acquisition.raw_segments /path/to/recording
+
+Segment layout ({stem}.{segment:04d}.raw):
+
+    header  (4096 bytes) : fixed-width fields, see HEADER_DTYPE
+    index   (capacity x int64, padded to 4096 bytes) : byte offset of each frame
+    frames  (capacity x frame_bytes)
+
+The frame count in the header is updated after every frame, so a segment is
+readable even if the recording process dies.
+"""
+
+import argparse
+import csv
+import logging
+import mmap
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+MAGIC = b"MCRAWSEG"
+VERSION = 1
+HEADER_BYTES = 4096
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S8"),
+        ("version", "<i8"),
+        ("height", "<i8"),
+        ("width", "<i8"),
+        ("dtype", "S8"),
+        ("fps", "<f8"),
+        ("frame_bytes", "<i8"),
+        ("capacity", "<i8"),
+        ("index_offset", "<i8"),
+        ("data_offset", "<i8"),
+        ("n_frames", "<i8"),
+    ]
+)
+_PAGE = 4096
+
+_SEGMENT_PATTERN = re.compile(r"^(?P<stem>.+)\.(?P<segment>\d{4})\.raw$")
+
+
+def _page_align(n_bytes):
+    return -(-n_bytes // _PAGE) * _PAGE
+
+
+def segment_file_name(stem_path, segment):
+    """File name of a segment, e.g. top.12345.0003.raw"""
+    stem_path = Path(stem_path)
+    return stem_path.parent / f"{stem_path.name}.{segment:04d}.raw"
+
+
+class RawSegmentWriter(object):
+    """Appends frames to one preallocated, memory-mapped segment file."""
+
+    def __init__(self, file_name, frame_shape, dtype, capacity, fps=0):
+        """
+        Parameters
+        ----------
+        file_name : str or Path
+            The segment file, which is overwritten.
+        frame_shape : tuple (height, width)
+        dtype : numpy dtype
+        capacity : int
+            Number of frames the segment can hold.
+        fps : float (default: 0)
+            Frame rate, stored in the header for the transcoder.
+        """
+        self.file_name = Path(file_name)
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.capacity = int(capacity)
+        self.frame_bytes = int(np.prod(self.frame_shape)) * self.dtype.itemsize
+        self.index_offset = HEADER_BYTES
+        self.data_offset = self.index_offset + _page_align(self.capacity * 8)
+        self.file_bytes = self.data_offset + self.capacity * self.frame_bytes
+        self.n_frames = 0
+
+        self.fd = os.open(self.file_name, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            # reserve the blocks now, rather than on page faults while recording
+            os.posix_fallocate(self.fd, 0, self.file_bytes)
+        except (AttributeError, OSError):
+            os.ftruncate(self.fd, self.file_bytes)
+        self.mm = mmap.mmap(self.fd, self.file_bytes)
+
+        self.header = np.frombuffer(self.mm, HEADER_DTYPE, count=1)
+        self.index = np.frombuffer(
+            self.mm, "<i8", count=self.capacity, offset=self.index_offset
+        )
+        self.frames = np.frombuffer(
+            self.mm,
+            self.dtype,
+            count=self.capacity * int(np.prod(self.frame_shape)),
+            offset=self.data_offset,
+        ).reshape((self.capacity,) + self.frame_shape)
+        self.header[0] = (
+            MAGIC,
+            VERSION,
+            self.frame_shape[0],
+            self.frame_shape[1],
+            self.dtype.str.encode("ascii"),
+            fps,
+            self.frame_bytes,
+            self.capacity,
+            self.index_offset,
+            self.data_offset,
+            0,
+        )
+
+    @property
+    def full(self):
+        return self.n_frames == self.capacity
+
+    def write(self, frame):
+        """Copy a frame into the segment. Returns False if it is full."""
+        if self.full:
+            return False
+        self.frames[self.n_frames] = frame
+        self.index[self.n_frames] = self.data_offset + self.n_frames * self.frame_bytes
+        self.n_frames += 1
+        self.header["n_frames"] = self.n_frames
+        return True
+
+    def close(self):
+        """Unmap the segment and trim the unused frame slots."""
+        if self.mm is None:
+            return
+        del self.header, self.index, self.frames
+        self.mm.close()
+        self.mm = None
+        os.ftruncate(self.fd, self.data_offset + self.n_frames * self.frame_bytes)
+        os.close(self.fd)
+
+
+class RawSegmentReader(object):
+    """Reads frames from a segment file, without copying."""
+
+    def __init__(self, file_name):
+        self.file_name = Path(file_name)
+        header = np.fromfile(self.file_name, HEADER_DTYPE, count=1)
+        if len(header) == 0 or header["magic"][0] != MAGIC:
+            raise ValueError(f"{file_name} is not a raw segment file")
+        header = header[0]
+        self.frame_shape = (int(header["height"]), int(header["width"]))
+        self.dtype = np.dtype(header["dtype"].decode("ascii"))
+        self.fps = float(header["fps"])
+        self.n_frames = int(header["n_frames"])
+        self.frame_bytes = int(header["frame_bytes"])
+        self.offsets = np.fromfile(
+            self.file_name, "<i8", count=self.n_frames, offset=int(header["index_offset"])
+        )
+        self.data = np.memmap(self.file_name, dtype=np.uint8, mode="r")
+
+    def __len__(self):
+        return self.n_frames
+
+    def __getitem__(self, i):
+        offset = int(self.offsets[i])
+        return (
+            self.data[offset : offset + self.frame_bytes]
+            .view(self.dtype)
+            .reshape(self.frame_shape)
+        )
+
+    def __iter__(self):
+        for i in range(self.n_frames):
+            yield self[i]
+
+
+class RawSegmentSink(object):
+    """Writes frames to a series of segments, starting a new one when the
+    current one is full."""
+
+    def __init__(self, stem_path, fps=0, segment_bytes=1024**3):
+        """
+        Parameters
+        ----------
+        stem_path : str or Path
+            Segments are written to {stem_path}.{segment:04d}.raw
+        fps : float (default: 0)
+            Stored in the segment headers.
+        segment_bytes : int (default: 1 GiB)
+            Approximate size of each segment.
+        """
+        self.stem_path = Path(stem_path)
+        self.fps = fps
+        self.segment_bytes = segment_bytes
+        self.segment = None
+        self.n_segments = 0
+        self.n_frames = 0
+
+    def _next_segment(self, frame):
+        if self.segment is not None:
+            self.segment.close()
+        frame_bytes = frame.size * frame.dtype.itemsize
+        self.segment = RawSegmentWriter(
+            segment_file_name(self.stem_path, self.n_segments),
+            frame.shape,
+            frame.dtype,
+            capacity=max(1, self.segment_bytes // frame_bytes),
+            fps=self.fps,
+        )
+        self.n_segments += 1
+
+    def write(self, frame):
+        if self.segment is None or self.segment.full:
+            self._next_segment(frame)
+        self.segment.write(frame)
+        self.n_frames += 1
+
+    def close(self):
+        if self.segment is not None:
+            self.segment.close()
+            self.segment = None
+
+
+def find_raw_recordings(save_location):
+    """Group the segment files in a directory by recording.
+
+    Returns
+    -------
+    recordings : dict
+        {stem path: [segment files, in order]}
+    """
+    recordings = {}
+    for file_name in sorted(Path(save_location).glob("*.raw")):
+        match = _SEGMENT_PATTERN.match(file_name.name)
+        if match is None:
+            continue
+        stem_path = file_name.parent / match.group("stem")
+        recordings.setdefault(stem_path, []).append(file_name)
+    return recordings
+
+
+def metadata_file_for(stem_path):
+    """The Writer metadata file of a recording.
+
+    {name}.{serial}[.{first frame}] -> {name}.{serial}.metadata.csv
+    {name}.{serial}.depth[.{first frame}] -> {name}.{serial}.metadata.depth.csv
+
+    If there is no csv file but a binary one (.bin, see metadata_store.py),
+    the binary file is returned.
+    """
+    stem_path = Path(stem_path)
+    parts = stem_path.name.split(".")
+    # a rollover file has the first frame number appended
+    if len(parts) > 2 and parts[-1].isdigit():
+        parts = parts[:-1]
+    if parts[-1] == "depth":
+        name = ".".join(parts[:-1]) + ".metadata.depth.csv"
+    else:
+        name = ".".join(parts) + ".metadata.csv"
+    metadata_file = stem_path.parent / name
+    if not metadata_file.exists() and metadata_file.with_suffix(".bin").exists():
+        return metadata_file.with_suffix(".bin")
+    return metadata_file
+
+
+def count_metadata_frames(metadata_file):
+    """Number of frames recorded in a Writer metadata file (csv or binary)."""
+    if Path(metadata_file).suffix == ".bin":
+        from multicamera_acquisition.metadata_store import count_rows
+
+        return count_rows(metadata_file)
+    with open(metadata_file, "r") as f:
+        return max(0, sum(1 for _ in csv.reader(f)) - 1)
+
+
+def transcode_recording(segment_files, output_file, quality=15, codec=None):
+    """Transcode the segments of one recording to a video file.
+
+    Parameters
+    ----------
+    segment_files : list of Path
+        The segments, in order.
+    output_file : Path
+        The video file to write (8 bit video is encoded with libx264, 16 bit
+        video losslessly with ffv1, see video_io_pyav).
+    quality : int (default: 15)
+        libx264 crf.
+    codec : str (default: None)
+        Override the codec.
+
+    Returns
+    -------
+    result : dict
+        'frames_expected' (from the segment headers), 'frames_written',
+        'seconds' and 'bytes_read'.
+    """
+    from multicamera_acquisition.video_io_pyav import PyAVWriter
+
+    start = time.perf_counter()
+    readers = [RawSegmentReader(f) for f in segment_files]
+    frames_expected = sum(len(r) for r in readers)
+    pixel_format = "gray16" if readers[0].dtype.itemsize == 2 else "gray8"
+    fps = readers[0].fps if readers[0].fps > 0 else 30
+    writer = PyAVWriter(
+        output_file, fps=fps, pixel_format=pixel_format, quality=quality, codec=codec
+    )
+    bytes_read = 0
+    try:
+        for reader in readers:
+            for frame in reader:
+                writer.write(frame)
+                bytes_read += reader.frame_bytes
+    finally:
+        writer.close()
+    return {
+        "frames_expected": frames_expected,
+        "frames_written": writer.frame_count,
+        "seconds": time.perf_counter() - start,
+        "bytes_read": bytes_read,
+    }
+
+
+def _transcode_job(job):
+    stem_path, segment_files, output_file, quality = job
+    result = transcode_recording(segment_files, output_file, quality=quality)
+    result["recording"] = str(stem_path)
+    result["output_file"] = str(output_file)
+    return result
+
+
+def transcode_session(save_location, processes=None, quality=15, delete_raw=False):
+    """Transcode every raw recording in a directory, in parallel.
+
+    Each recording is encoded in its own process. Frame counts are checked
+    against the segment headers and the Writer metadata: if they do not
+    match, the raw segments are kept regardless of `delete_raw`.
+
+    Parameters
+    ----------
+    save_location : str or Path
+        The recording directory.
+    processes : int (default: None)
+        Number of worker processes, defaults to the number of CPUs.
+    quality : int (default: 15)
+        libx264 crf for 8 bit video.
+    delete_raw : bool (default: False)
+        Delete the segments of recordings that were verified.
+
+    Returns
+    -------
+    results : list of dict
+        One per recording, see `transcode_recording`, with 'verified' and
+        'frames_in_metadata' added.
+    """
+    recordings = find_raw_recordings(save_location)
+    jobs = []
+    for stem_path, segment_files in recordings.items():
+        depth = RawSegmentReader(segment_files[0]).dtype.itemsize == 2
+        output_file = stem_path.parent / f"{stem_path.name}.{'avi' if depth else 'mp4'}"
+        jobs.append((stem_path, segment_files, output_file, quality))
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        results = list(executor.map(_transcode_job, jobs))
+
+    # all the recordings of a camera (including rollovers) share a metadata file
+    frames_per_metadata_file = {}
+    for result in results:
+        metadata_file = metadata_file_for(result["recording"])
+        frames_per_metadata_file[metadata_file] = (
+            frames_per_metadata_file.get(metadata_file, 0) + result["frames_written"]
+        )
+    for result, (stem_path, segment_files, _, _) in zip(results, jobs):
+        metadata_file = metadata_file_for(stem_path)
+        verified = result["frames_written"] == result["frames_expected"]
+        result["frames_in_metadata"] = None
+        if metadata_file.exists():
+            result["frames_in_metadata"] = count_metadata_frames(metadata_file)
+            verified = verified and (
+                result["frames_in_metadata"] == frames_per_metadata_file[metadata_file]
+            )
+        result["verified"] = verified
+        if not verified:
+            logging.log(
+                logging.WARNING,
+                f"Frame count mismatch for {stem_path.name}: "
+                f"{result['frames_written']} transcoded, "
+                f"{result['frames_expected']} in segments, "
+                f"{result['frames_in_metadata']} in metadata",
+            )
+        elif delete_raw:
+            for segment_file in segment_files:
+                segment_file.unlink()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Transcode raw segment recordings to video files."
+    )
+    parser.add_argument("save_location")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--quality", type=int, default=15)
+    parser.add_argument("--delete-raw", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = transcode_session(
+        args.save_location,
+        processes=args.processes,
+        quality=args.quality,
+        delete_raw=args.delete_raw,
+    )
+    for result in results:
+        fps = result["frames_written"] / max(result["seconds"], 1e-9)
+        print(
+            f"{Path(result['output_file']).name}: {result['frames_written']} frames "
+            f"({fps:.0f} fps), {'verified' if result['verified'] else 'MISMATCH'}"
+        )
+    return 0 if all(r["verified"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
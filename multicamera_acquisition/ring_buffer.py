@@ -0,0 +1,274 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import queue
+import logging
+
+import numpy as np
+
+# slot header layout (one int64 each); width and channels are 0 for frames
+# with fewer dimensions
+_FLAGS, _FRAME_INDEX, _TIMESTAMP, _HEIGHT, _WIDTH, _DTYPE, _CHANNELS = range(7)
+_HEADER_FIELDS = 7
+# frames have at most (height, width, channels)
+_MAX_NDIM = 3
+
+# header flags
+_FLAG_FRAME = 1  # slot holds a frame
+_FLAG_NO_IMAGE = 2  # corrupted frame (img is None)
+_FLAG_NO_TIMESTAMP = 4  # timestamp is None
+_FLAG_STOP = 8  # empty tuple, i.e. the stop signal
+
+# dtypes that can be stored in a slot, indexed by the header dtype code
+_DTYPES = [np.dtype(np.uint8), np.dtype(np.uint16), np.dtype(np.float32), np.dtype(np.float64)]
+
+# cursor layout (one int64 each, at the start of the shared memory block)
+_WRITE_CURSOR, _READ_CURSOR = range(2)
+_CURSOR_BYTES = 64  # keep the slot headers cache line aligned
+
+
+class SharedMemoryRingBuffer(object):
+    """A single producer / single consumer frame queue backed by shared memory.
+
+    Frames are copied once into a fixed size slot of a shared memory block
+    rather than being pickled through a pipe. The API mirrors the parts of
+    `multiprocessing.Queue` used by `AcquisitionLoop` and `Writer`, so it can be
+    passed anywhere a `write_queue` is expected:
+
+        - `put((img, timestamp, frame_index))` / `put(tuple())` to stop
+        - `get()` returns `(img, timestamp, frame_index)` or `tuple()`
+        - `qsize()` returns the number of frames waiting to be read
+
+    The array returned by `get` is a view into the slot. It stays valid until
+    the next call to `get`, at which point the slot is handed back to the
+    producer. Copy the array if it needs to outlive the next `get`.
+    """
+
+    def __init__(self, slot_bytes, n_slots=32):
+        """
+        Parameters
+        ----------
+        slot_bytes : int
+            The maximum size of a frame in bytes (e.g. 1920 * 1200 * 2 for a
+            16 bit 1920x1200 frame).
+        n_slots : int (default: 32)
+            The number of frames the buffer can hold before `put` blocks.
+        """
+        if n_slots < 2:
+            raise ValueError("A ring buffer needs at least 2 slots")
+        self.slot_bytes = int(slot_bytes)
+        self.n_slots = int(n_slots)
+        # round slots up to a multiple of 64 bytes so that frames stay aligned
+        self._slot_stride = int(np.ceil(self.slot_bytes / 64) * 64)
+
+        size = (
+            _CURSOR_BYTES
+            + self.n_slots * _HEADER_FIELDS * 8
+            + self.n_slots * self._slot_stride
+        )
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._owner = True
+
+        # counts of free and filled slots, shared between processes
+        self._free_slots = mp.Semaphore(self.n_slots)
+        self._filled_slots = mp.Semaphore(0)
+
+        self._attach()
+        self._cursors[:] = 0
+        self._headers[:] = 0
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def _attach(self):
+        """Create numpy views into the shared memory block."""
+        buf = self._shm.buf
+        self._cursors = np.ndarray((2,), dtype=np.int64, buffer=buf, offset=0)
+        self._headers = np.ndarray(
+            (self.n_slots, _HEADER_FIELDS),
+            dtype=np.int64,
+            buffer=buf,
+            offset=_CURSOR_BYTES,
+        )
+        self._data_offset = _CURSOR_BYTES + self.n_slots * _HEADER_FIELDS * 8
+        # index of the slot held by the consumer, released on the next get
+        self._held_slot = None
+        # index of the slot reserved by the producer, published on commit
+        self._reserved_slot = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # numpy views can't be pickled, they are recreated in the child
+        for key in ["_cursors", "_headers", "_held_slot", "_reserved_slot"]:
+            state.pop(key, None)
+        state["_owner"] = False
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._attach()
+
+    def _slot_array(self, slot, shape, dtype):
+        return np.ndarray(
+            shape,
+            dtype=dtype,
+            buffer=self._shm.buf,
+            offset=self._data_offset + slot * self._slot_stride,
+        )
+
+    def qsize(self):
+        """Return the number of frames waiting to be read."""
+        return int(self._cursors[_WRITE_CURSOR] - self._cursors[_READ_CURSOR])
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def full(self):
+        return self.qsize() >= self.n_slots
+
+    def reserve(self, shape, dtype, block=True, timeout=None):
+        """Reserve the next free slot and return a writable view into it.
+
+        This lets a camera copy a frame directly into shared memory (see
+        the `out` argument of the camera `get_array` methods). The slot is
+        published to the consumer by `commit`. Calling `reserve` again before
+        `commit` returns the same slot.
+
+        Parameters
+        ----------
+        shape : tuple
+            The shape of the frame, with at most 3 dimensions.
+        dtype : numpy dtype
+            The dtype of the frame.
+        block : bool (default: True)
+            Wait for a free slot if the buffer is full.
+        timeout : float (default: None)
+            Seconds to wait for a free slot if block is True.
+
+        Returns
+        -------
+        out : Numpy array
+        """
+        dtype = np.dtype(dtype)
+        if dtype not in _DTYPES:
+            raise ValueError(f"Unsupported frame dtype {dtype}")
+        if len(shape) > _MAX_NDIM:
+            raise ValueError(
+                f"Frames can have at most {_MAX_NDIM} dimensions, not {shape}"
+            )
+        if int(np.prod(shape)) * dtype.itemsize > self.slot_bytes:
+            raise ValueError(
+                f"Frame of shape {shape} ({dtype}) does not fit in a "
+                f"{self.slot_bytes} byte slot"
+            )
+        if self._reserved_slot is None:
+            if not self._free_slots.acquire(block, timeout):
+                raise queue.Full
+            self._reserved_slot = int(self._cursors[_WRITE_CURSOR] % self.n_slots)
+        return self._slot_array(self._reserved_slot, shape, dtype)
+
+    def commit(self, timestamp, frame_index, shape=None, dtype=None, flags=_FLAG_FRAME):
+        """Publish the reserved slot to the consumer."""
+        if self._reserved_slot is None:
+            raise RuntimeError("commit called without a reserved slot")
+        header = self._headers[self._reserved_slot]
+        if timestamp is None:
+            flags |= _FLAG_NO_TIMESTAMP
+            timestamp = 0
+        header[_FLAGS] = flags
+        header[_FRAME_INDEX] = frame_index
+        header[_TIMESTAMP] = timestamp
+        if shape is not None:
+            if len(shape) > _MAX_NDIM:
+                raise ValueError(
+                    f"Frames can have at most {_MAX_NDIM} dimensions, not {shape}"
+                )
+            header[_HEIGHT] = shape[0]
+            header[_WIDTH] = shape[1] if len(shape) > 1 else 0
+            header[_CHANNELS] = shape[2] if len(shape) > 2 else 0
+            header[_DTYPE] = _DTYPES.index(np.dtype(dtype))
+        self._reserved_slot = None
+        self._cursors[_WRITE_CURSOR] += 1
+        self._filled_slots.release()
+
+    def put(self, data, block=True, timeout=None):
+        """Copy a `(img, timestamp, frame_index)` tuple into the buffer.
+
+        An empty tuple is stored as the stop signal.
+        """
+        if len(data) == 0:
+            self.reserve((0,), np.uint8, block=block, timeout=timeout)
+            self.commit(None, -1, flags=_FLAG_STOP)
+            return
+
+        img, timestamp, frame_index = data
+        if img is None:
+            self.reserve((0,), np.uint8, block=block, timeout=timeout)
+            self.commit(timestamp, frame_index, flags=_FLAG_NO_IMAGE)
+            return
+
+        img = np.asarray(img)
+        out = self.reserve(img.shape, img.dtype, block=block, timeout=timeout)
+        # the camera may already have written straight into the slot
+        if not np.shares_memory(out, img):
+            np.copyto(out, img)
+        self.commit(timestamp, frame_index, shape=img.shape, dtype=img.dtype)
+
+    def get(self, block=True, timeout=None):
+        """Get the next `(img, timestamp, frame_index)` tuple from the buffer.
+
+        The returned image is a view into shared memory that is valid until
+        the next call to `get`.
+        """
+        self._release_held_slot()
+        if not self._filled_slots.acquire(block, timeout):
+            raise queue.Empty
+        slot = int(self._cursors[_READ_CURSOR] % self.n_slots)
+        self._cursors[_READ_CURSOR] += 1
+        self._held_slot = slot
+
+        flags, frame_index, timestamp, height, width, dtype, channels = self._headers[
+            slot
+        ]
+        if flags & _FLAG_STOP:
+            return tuple()
+        if flags & _FLAG_NO_TIMESTAMP:
+            timestamp = None
+        else:
+            timestamp = int(timestamp)
+        if flags & _FLAG_NO_IMAGE:
+            return None, timestamp, int(frame_index)
+
+        if channels > 0:
+            shape = (int(height), int(width), int(channels))
+        elif width > 0:
+            shape = (int(height), int(width))
+        else:
+            shape = (int(height),)
+        img = self._slot_array(slot, shape, _DTYPES[dtype])
+        return img, timestamp, int(frame_index)
+
+    def _release_held_slot(self):
+        if self._held_slot is not None:
+            self._held_slot = None
+            self._free_slots.release()
+
+    def close(self):
+        """Detach from the shared memory block in this process."""
+        self._release_held_slot()
+        self._cursors = None
+        self._headers = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # a frame view returned by get is still alive
+            logging.log(logging.DEBUG, "Ring buffer closed with frames in use")
+
+    def unlink(self):
+        """Free the shared memory block. Call once, from the creating process."""
+        self.close()
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,44 @@
+""" Per-session metadata, written next to the videos as session_metadata.json.
+
+Each part of the pipeline adds its own section (e.g. 'memory_budget'), so
+the file is read, updated and written back atomically.
+"""
+
+import json
+import os
+from pathlib import Path
+
+SESSION_METADATA_NAME = "session_metadata.json"
+
+
+def read_session_metadata(save_location):
+    """The session metadata, or an empty dict if there is none."""
+    try:
+        with open(Path(save_location) / SESSION_METADATA_NAME, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def update_session_metadata(save_location, **sections):
+    """Add or replace sections of the session metadata.
+
+    Parameters
+    ----------
+    save_location : str or Path
+        The session directory.
+    **sections
+        JSON-serializable values, keyed by section name.
+
+    Returns
+    -------
+    metadata : dict
+    """
+    metadata = read_session_metadata(save_location)
+    metadata.update(sections)
+    file_name = Path(save_location) / SESSION_METADATA_NAME
+    temp_file = file_name.with_name(file_name.name + ".tmp")
+    with open(temp_file, "w") as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(temp_file, file_name)
+    return metadata
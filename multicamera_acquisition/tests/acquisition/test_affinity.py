@@ -0,0 +1,74 @@
+import unittest
+import multiprocessing as mp
+import os
+
+from multicamera_acquisition.affinity import (
+    apply_process_settings,
+    available_cpus,
+    describe_process,
+    format_cpu_list,
+    parse_cpu_list,
+    plan_affinity,
+)
+
+
+def _pinned(cpus, nice, ready, done):
+    apply_process_settings(cpu_affinity=cpus, nice=nice)
+    ready.set()
+    done.wait(10)
+
+
+class AffinityTestCase(unittest.TestCase):
+    def test_cpu_lists(self):
+        self.assertEqual(parse_cpu_list("0-3,8,10-11\n"), [0, 1, 2, 3, 8, 10, 11])
+        self.assertEqual(parse_cpu_list([3, 1]), [1, 3])
+        self.assertEqual(parse_cpu_list(""), [])
+        self.assertEqual(format_cpu_list([8, 0, 1, 2, 3, 10, 11]), "0-3,8,10-11")
+
+    def test_plan(self):
+        nodes = {0: [0, 1, 2, 3], 1: [4, 5, 6, 7]}
+        cameras = ["a", "b", "c", "d"]
+        plan = plan_affinity(cameras, cpus=range(8), isolated=[], nodes=nodes)
+        # one core per grab loop, alternating between nodes, cpu 0 left free
+        self.assertEqual(
+            plan["acquisition"], {"a": [3], "b": [7], "c": [2], "d": [6]}
+        )
+        self.assertEqual(plan["writers"]["a"], [0, 1])
+        self.assertEqual(plan["writers"]["b"], [4, 5])
+        self.assertEqual(plan["other"], [0, 1, 4, 5])
+
+        # isolated cores are used for the grab loops, and by nothing else
+        plan = plan_affinity(cameras, cpus=range(8), isolated=[2, 3], nodes=nodes)
+        self.assertEqual(
+            plan["acquisition"], {"a": [3], "b": [2], "c": [3], "d": [2]}
+        )
+        self.assertEqual(plan["writers"]["a"], [0, 1])
+        self.assertEqual(plan["other"], [0, 1, 4, 5, 6, 7])
+
+        # a single cpu is shared
+        plan = plan_affinity(cameras, cpus=[0], isolated=[], nodes={0: [0]})
+        self.assertEqual(plan["acquisition"]["a"], [0])
+        self.assertEqual(plan["writers"]["d"], [0])
+
+    def test_apply_and_describe(self):
+        cpus = available_cpus()[:1]
+        ready, done = mp.Event(), mp.Event()
+        process = mp.Process(target=_pinned, args=(cpus, 5, ready, done))
+        process.start()
+        try:
+            self.assertTrue(ready.wait(10))
+            description = describe_process(process.pid)
+            self.assertEqual(description["cpus"], format_cpu_list(cpus))
+            self.assertEqual(description["scheduler"], "other")
+            self.assertEqual(description["nice"], os.getpriority(os.PRIO_PROCESS, 0) + 5)
+        finally:
+            done.set()
+            process.join()
+
+        # settings that cannot be applied are skipped
+        with self.assertLogs(level="WARNING"):
+            self.assertFalse(apply_process_settings(cpu_affinity=[100000]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import av
+import numpy as np
+
+from multicamera_acquisition.archive import archive_session, part_file_name
+from multicamera_acquisition.video_io_pyav import PyAVWriter
+
+
+class ArchiveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.session = Path(tempfile.mkdtemp())
+        self.archive = Path(tempfile.mkdtemp())
+        recording = self.session / "recording_1"
+        recording.mkdir()
+        writer = PyAVWriter(recording / "top.123.mp4", fps=30)
+        for i in range(12):
+            writer.write(np.tile(np.arange(64, dtype=np.uint8) * 2 + i, (48, 1)))
+        writer.close()
+        writer = PyAVWriter(recording / "top.123.depth.avi", fps=30, pixel_format="gray16")
+        for i in range(4):
+            writer.write(np.full((48, 64), 1000 + i, dtype=np.uint16))
+        writer.close()
+        for name in ["top.123.metadata.csv", "triggerdata.csv"]:
+            with open(recording / name, "w") as f:
+                f.write("frame_id,frame_timestamp\n0,0\n")
+        (recording / "top.123.mp4.stderr.txt").write_text("")
+
+    def tearDown(self):
+        shutil.rmtree(self.session)
+        shutil.rmtree(self.archive)
+
+    def test_archive_and_resume(self):
+        report = archive_session(self.session, self.archive, codec="libx264", mirror=["top"], jobs=1)
+        self.assertEqual((report["archived"], report["skipped"], report["failed"]), (4, 0, 0))
+        self.assertEqual(report["frames"], 12 + 4)
+
+        video = self.archive / "recording_1" / "top.123.mp4"
+        with av.open(str(video)) as reader:
+            frames = [f.to_ndarray(format="gray") for f in reader.decode(video=0)]
+        self.assertEqual(len(frames), 12)
+        # mirrored: the gradient now decreases from left to right
+        self.assertGreater(frames[0][:, 0].mean(), frames[0][:, -1].mean())
+        self.assertTrue((self.archive / "recording_1" / "triggerdata.csv").exists())
+        self.assertFalse((self.archive / "recording_1" / "top.123.mp4.stderr.txt").exists())
+
+        # up to date, even though the mtime changed
+        os.utime(self.session / "recording_1" / "triggerdata.csv", (0, 0))
+        report = archive_session(self.session, self.archive, codec="libx264", mirror=["top"], jobs=1)
+        self.assertEqual((report["archived"], report["skipped"]), (0, 4))
+
+        # an interrupted run leaves a part file; changed settings re-encode
+        part_file_name(video).write_bytes(b"partial")
+        report = archive_session(self.session, self.archive, codec="libx264", crf=20, jobs=1)
+        self.assertEqual((report["archived"], report["skipped"]), (2, 2))
+        self.assertFalse(part_file_name(video).exists())
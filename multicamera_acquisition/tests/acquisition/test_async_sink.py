@@ -0,0 +1,162 @@
+import unittest
+import io
+import multiprocessing as mp
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from multicamera_acquisition.async_sink import AsyncFileSink
+from multicamera_acquisition.encoders import ENCODERS, Encoder, register_encoder
+from multicamera_acquisition.writer import Writer
+
+
+class SlowFile(io.BytesIO):
+    """A file whose writes block until released."""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+        self.n_writes = 0
+
+    def write(self, data):
+        self.release.wait()
+        self.n_writes += 1
+        return super().write(data)
+
+
+class BrokenFile(io.BytesIO):
+    def write(self, data):
+        raise BrokenPipeError("reader went away")
+
+
+class AsyncFileSinkTestCase(unittest.TestCase):
+    def test_writes_in_order(self):
+        f = io.BytesIO()
+        sink = AsyncFileSink(f, chunk_bytes=1000, max_pending_chunks=2)
+        frames = [np.full(777, i, dtype=np.uint8) for i in range(20)]
+        for frame in frames:
+            sink.write(frame)
+        sink.write(np.arange(10, dtype=np.uint16).reshape(2, 5))
+        sink.close()
+        expected = b"".join(frame.tobytes() for frame in frames)
+        expected += np.arange(10, dtype=np.uint16).tobytes()
+        self.assertEqual(f.getvalue(), expected)
+        self.assertEqual(sink.bytes_written, len(expected))
+        self.assertEqual(sink.pending_bytes, 0)
+
+    def test_coalesces_and_bounds_pending(self):
+        f = SlowFile()
+        sink = AsyncFileSink(f, chunk_bytes=100, max_pending_chunks=3)
+        # fills two chunks, the writer thread is blocked on the first
+        sink.write(b"x" * 250)
+        self.assertEqual(sink.pending_bytes, 250)
+        done = threading.Event()
+
+        def write_more():
+            sink.write(b"y" * 100)
+            done.set()
+
+        thread = threading.Thread(target=write_more)
+        thread.start()
+        # every chunk is pending, so the write blocks
+        self.assertFalse(done.wait(0.2))
+        f.release.set()
+        self.assertTrue(done.wait(5))
+        thread.join()
+        sink.close()
+        self.assertEqual(f.getvalue(), b"x" * 250 + b"y" * 100)
+        self.assertEqual(f.n_writes, 4)
+        self.assertGreaterEqual(sink.peak_pending_bytes, 250)
+
+    def test_max_delay(self):
+        f = io.BytesIO()
+        sink = AsyncFileSink(f, chunk_bytes=1000, max_pending_chunks=2, max_delay_s=0.05)
+        sink.write(b"a" * 10)
+        time.sleep(0.1)
+        # the partly filled chunk is written on the next write, not once full
+        sink.write(b"b" * 10)
+        sink._full_chunks.join()
+        self.assertEqual(f.getvalue(), b"a" * 10 + b"b" * 10)
+        sink.write(b"c" * 10)
+        sink._full_chunks.join()
+        self.assertEqual(sink.pending_bytes, 10)
+        sink.close()
+        self.assertEqual(f.getvalue(), b"a" * 10 + b"b" * 10 + b"c" * 10)
+
+    def test_reraises_errors(self):
+        sink = AsyncFileSink(BrokenFile(), chunk_bytes=10, max_pending_chunks=2)
+        sink.write(b"a" * 25)
+        with self.assertRaises(BrokenPipeError):
+            sink.close()
+
+
+class SleepyFile(io.FileIO):
+    def write(self, data):
+        time.sleep(0.01)
+        return super().write(data)
+
+
+class SlowSinkEncoder(Encoder):
+    """Writes raw frames to a slow file through an AsyncFileSink."""
+
+    name = "slow_sink"
+
+    def open(self, frame):
+        self.file = SleepyFile(self.video_file_name, "wb")
+        self.sink = AsyncFileSink(self.file, chunk_bytes=1000, max_pending_chunks=4)
+
+    @property
+    def pending_bytes(self):
+        return self.sink.pending_bytes
+
+    @property
+    def peak_pending_bytes(self):
+        return self.sink.peak_pending_bytes
+
+    def encode(self, frame):
+        return frame
+
+    def write(self, frame):
+        self.sink.write(frame)
+
+    def close(self):
+        self.sink.close()
+        self.file.close()
+
+
+class WriterPendingBytesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        register_encoder(SlowSinkEncoder)
+
+    def tearDown(self):
+        ENCODERS.pop(SlowSinkEncoder.name)
+        shutil.rmtree(self.test_dir)
+
+    def test_visible_in_parent(self):
+        write_queue = mp.Queue()
+        writer = Writer(
+            queue=write_queue,
+            video_file_name=self.test_dir / "top.1.mp4",
+            metadata_file_name=self.test_dir / "top.1.metadata.csv",
+            camera_serial="1",
+            camera_name="top",
+            camera_brand="synthetic",
+            fps=30,
+            ffmpeg_options={},
+            encoder="slow_sink",
+            encoder_fallback=False,
+        )
+        writer.start()
+        for i in range(20):
+            write_queue.put((np.full((10, 50), i, dtype=np.uint8), i, i))
+        write_queue.put(tuple())
+        writer.join(timeout=30)
+        stats = writer.stats()
+        self.assertEqual(stats["frames_written"], 20)
+        self.assertEqual(stats["pending_bytes"], 0)
+        self.assertGreaterEqual(stats["peak_pending_bytes"], 500)
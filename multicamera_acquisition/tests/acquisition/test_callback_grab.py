@@ -0,0 +1,128 @@
+import unittest
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from multicamera_acquisition.acquisition import (
+    AcquisitionLoop,
+    Writer,
+    create_write_queue,
+    drain_acquisition_loops,
+    end_processes,
+    release_write_queues,
+)
+from multicamera_acquisition.interfaces import get_camera
+from multicamera_acquisition.interfaces.arduino_emulator import write_trigger_clock
+
+
+class CallbackGrabTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _record(self, transport, grab_mode="callback", **camera_params):
+        name = f"{transport}_{grab_mode}"
+        trigger_clock = self.test_dir / f"{name}.trigger_clock.json"
+        write_queue = create_write_queue(transport, max_frame_bytes=32 * 32)
+        metadata_file = self.test_dir / f"{name}.metadata.csv"
+        writer = Writer(
+            queue=write_queue,
+            video_file_name=self.test_dir / f"{name}.mp4",
+            metadata_file_name=metadata_file,
+            camera_serial=name,
+            camera_name=name,
+            camera_brand="synthetic",
+            fps=100,
+            ffmpeg_options={},
+            encoder="raw",
+        )
+        acquisition_loop = AcquisitionLoop(
+            write_queue=write_queue,
+            display_queue=None,
+            brand="synthetic",
+            name=name,
+            serial=name,
+            width=32,
+            height=32,
+            frame_timeout=100,
+            trigger_clock=str(trigger_clock),
+            grab_mode=grab_mode,
+            **camera_params,
+        )
+        writer.start()
+        acquisition_loop.start()
+        self.assertTrue(acquisition_loop.ready.wait(10))
+        acquisition_loop.prime()
+        self.assertTrue(acquisition_loop.ready.wait(10))
+        write_trigger_clock(trigger_clock, time.monotonic() + 0.1, 10000, 40)
+
+        drain_acquisition_loops([acquisition_loop], {name: 40}, timeout=10)
+        self.assertTrue(acquisition_loop.drained.is_set())
+        end_processes([acquisition_loop], [writer], None, writer_timeout=10)
+        release_write_queues([write_queue])
+        with open(metadata_file, "r") as f:
+            rows = [line.split(",") for line in f.readlines()[1:]]
+        return [int(row[0]) for row in rows], [int(row[1]) for row in rows]
+
+    def test_acquisition_loop(self):
+        for transport in ["queue", "shared_memory"]:
+            frame_ids, timestamps = self._record(transport)
+            # one frame per trigger, 10 ms apart
+            self.assertEqual(frame_ids, list(range(40)))
+            self.assertTrue(np.allclose(np.diff(timestamps), 1e7))
+
+    def test_frame_ids_match_polling(self):
+        # frame ids count delivered frames, so timeouts while waiting for a
+        # frame (here the 4th and 8th) leave no gap in either grab mode
+        records = {
+            grab_mode: self._record(
+                "queue", grab_mode=grab_mode, timeout_rate=0.1, seed=2
+            )
+            for grab_mode in ["poll", "callback"]
+        }
+        for frame_ids, timestamps in records.values():
+            self.assertEqual(frame_ids, list(range(40)))
+            # the same frames, one per trigger
+            self.assertTrue(np.allclose(np.diff(timestamps), 1e7))
+
+    def test_synthetic_camera(self):
+        cam = get_camera(brand="synthetic", serial="s0", width=16, height=16, fps=200)
+        frames = []
+        threads = set()
+
+        def on_frame(img, tstamp):
+            frames.append((img[0, :8].copy(), tstamp))
+            threads.add(threading.current_thread().name)
+
+        cam.start_callback(on_frame)
+        time.sleep(0.2)
+        cam.stop_callback()
+        n_frames = len(frames)
+        time.sleep(0.05)
+        self.assertEqual(len(frames), n_frames)
+        self.assertGreater(n_frames, 20)
+        self.assertNotIn(threading.current_thread().name, threads)
+        # frames are delivered in order, with their index stamped in
+        indices = [np.frombuffer(marker.tobytes(), np.int64)[0] for marker, _ in frames]
+        self.assertEqual(indices, list(range(n_frames)))
+        cam.close()
+
+    def test_emulated_basler(self):
+        cam = get_camera(brand="basler_emulated")
+        frames = []
+        cam.start_callback(lambda img, tstamp: frames.append((img.copy(), tstamp)))
+        time.sleep(0.5)
+        cam.stop_callback()
+        self.assertGreater(len(frames), 0)
+        self.assertEqual(frames[0][0].dtype, np.uint8)
+        cam.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import multiprocessing as mp
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from multicamera_acquisition import acquisition
+from multicamera_acquisition.acquisition import (
+    AcquisitionLoop,
+    acquire_video,
+    initialize_acquisition_loops,
+)
+
+
+def synthetic_loop(name, brand="synthetic", **camera_params):
+    return AcquisitionLoop(
+        write_queue=mp.Queue(),
+        display_queue=None,
+        brand=brand,
+        name=name,
+        serial=name,
+        width=32,
+        height=32,
+        frame_timeout=100,
+        **camera_params,
+    )
+
+
+class InitializeAcquisitionLoopsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.loops = []
+
+    def tearDown(self):
+        for loop in self.loops:
+            if loop.is_alive():
+                loop.terminate()
+                loop.join()
+
+    def test_concurrent_init(self):
+        self.loops = [synthetic_loop(f"cam{i}") for i in range(3)]
+        init_times = initialize_acquisition_loops(self.loops, init_timeout=30)
+        self.assertEqual(set(init_times), {"cam0", "cam1", "cam2"})
+        for loop in self.loops:
+            self.assertTrue(loop.ready.is_set())
+            self.assertGreater(init_times[loop.camera_params["name"]], 0)
+
+    def test_failed_camera(self):
+        # a bit depth of 12 makes get_camera raise in the acquisition loop
+        self.loops = [
+            synthetic_loop("good"),
+            synthetic_loop("bad", bit_depth=12),
+        ]
+        with self.assertRaises(RuntimeError) as context:
+            initialize_acquisition_loops(self.loops, init_timeout=30)
+        message = str(context.exception)
+        self.assertIn("bad (bad): exited with code 1", message)
+        self.assertNotIn("good", message)
+        self.assertTrue(self.loops[0].ready.is_set())
+
+    def test_later_groups_not_started(self):
+        # flir cameras are initialized first, and fail here without PySpin
+        self.loops = [synthetic_loop("flir", brand="flir"), synthetic_loop("other")]
+        with self.assertRaises(RuntimeError) as context:
+            initialize_acquisition_loops(self.loops, init_timeout=30)
+        self.assertIn("flir (flir): exited with code", str(context.exception))
+        self.assertIsNone(self.loops[1].pid)
+
+
+class AcquireVideoInitFailureTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_serial_port_and_trigger_data_closed(self):
+        arduino = mock.MagicMock()
+        trigger_loggers = []
+        TriggerDataLogger = acquisition.TriggerDataLogger
+
+        def trigger_data_logger(*args, **kwargs):
+            trigger_loggers.append(TriggerDataLogger(*args, **kwargs))
+            return trigger_loggers[-1]
+
+        camera_list = [
+            {"name": "good", "serial": "good", "brand": "synthetic"},
+            {"name": "bad", "serial": "bad", "brand": "synthetic", "bit_depth": 12},
+        ]
+        with mock.patch.object(
+            acquisition, "find_arduino", return_value=arduino
+        ), mock.patch.object(
+            acquisition, "TriggerDataLogger", side_effect=trigger_data_logger
+        ):
+            with self.assertRaises(RuntimeError) as context:
+                acquire_video(
+                    self.test_dir,
+                    camera_list,
+                    1,
+                    append_datetime=False,
+                    verbose=False,
+                    ffmpeg_options={"encoder": "raw"},
+                    camera_init_timeout_s=30,
+                )
+        self.assertIn("bad (bad)", str(context.exception))
+        arduino.close.assert_called_once()
+        self.assertEqual(len(trigger_loggers), 1)
+        self.assertTrue(trigger_loggers[0].file.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+import multiprocessing as mp
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from multicamera_acquisition.acquisition import (
+    AcquisitionLoop,
+    Writer,
+    create_write_queue,
+    drain_acquisition_loops,
+    end_processes,
+    release_write_queues,
+)
+from multicamera_acquisition.interfaces.arduino_emulator import write_trigger_clock
+
+
+class DrainTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _start(self, name, **camera_params):
+        write_queue = mp.Queue()
+        writer = Writer(
+            queue=write_queue,
+            video_file_name=self.test_dir / f"{name}.mp4",
+            metadata_file_name=self.test_dir / f"{name}.metadata.csv",
+            camera_serial=name,
+            camera_name=name,
+            fps=100,
+            camera_brand="synthetic",
+            ffmpeg_options={},
+            encoder="raw",
+        )
+        acquisition_loop = AcquisitionLoop(
+            write_queue=write_queue,
+            display_queue=None,
+            brand="synthetic",
+            name=name,
+            serial=name,
+            width=32,
+            height=32,
+            frame_timeout=100,
+            **camera_params,
+        )
+        writer.start()
+        acquisition_loop.start()
+        acquisition_loop.ready.wait(10)
+        acquisition_loop.prime()
+        acquisition_loop.ready.wait(10)
+        return acquisition_loop, writer
+
+    def test_drain_and_shutdown(self):
+        # a free running camera reaches its expected frame count, a camera
+        # that gets fewer triggers than expected goes idle
+        trigger_clock = self.test_dir / "trigger_clock.json"
+        counting = self._start("counting", fps=100)
+        idle = self._start("idle", trigger_clock=str(trigger_clock))
+        write_trigger_clock(trigger_clock, time.monotonic(), 10000, 20)
+        loops, writers = [counting[0], idle[0]], [counting[1], idle[1]]
+
+        drain_time = drain_acquisition_loops(
+            loops, {"counting": 50, "idle": 50}, idle_s=0.5, timeout=10
+        )
+        self.assertLess(drain_time, 5)
+        self.assertTrue(counting[0].drained.is_set())
+        self.assertTrue(idle[0].drained.is_set())
+        self.assertEqual(counting[0].frames_grabbed.value, 50)
+        self.assertEqual(idle[0].frames_grabbed.value, 20)
+
+        timings = end_processes(loops, writers, None, writer_timeout=10)
+        self.assertEqual(set(timings), {"acquisition_loops", "writers", "display"})
+        for writer in writers:
+            self.assertTrue(writer.finalized.is_set())
+            self.assertFalse(writer.is_alive())
+        self.assertEqual(counting[1].frames_written.value, 50)
+        with open(self.test_dir / "counting.metadata.csv", "r") as f:
+            self.assertEqual(len(f.readlines()), 51)
+
+    def test_stalled_writer(self):
+        # nothing reads the ring buffer, so it fills up; the loop must still
+        # notice that it is draining
+        write_queue = create_write_queue(
+            "shared_memory", max_frame_bytes=32 * 32, ring_buffer_slots=4
+        )
+        acquisition_loop = AcquisitionLoop(
+            write_queue=write_queue,
+            display_queue=None,
+            brand="synthetic",
+            name="stalled",
+            serial="stalled",
+            width=32,
+            height=32,
+            frame_timeout=100,
+            fps=100,
+        )
+        acquisition_loop.start()
+        acquisition_loop.ready.wait(10)
+        acquisition_loop.prime()
+        acquisition_loop.ready.wait(10)
+        try:
+            deadline = time.monotonic() + 10
+            while acquisition_loop.frames_grabbed.value < 4:
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.05)
+
+            acquisition_loop.drain(expected_frames=100, idle_s=0.2)
+            self.assertTrue(acquisition_loop.drained.wait(5))
+            self.assertEqual(acquisition_loop.frames_grabbed.value, 4)
+        finally:
+            if acquisition_loop.is_alive():
+                acquisition_loop.terminate()
+                acquisition_loop.join()
+            release_write_queues([write_queue])
+
+
+if __name__ == "__main__":
+    unittest.main()
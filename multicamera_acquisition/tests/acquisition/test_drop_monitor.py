@@ -0,0 +1,42 @@
+import unittest
+import csv
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from multicamera_acquisition.drop_monitor import DropCounters, DropDetector
+
+
+class DropDetectorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_detects_gaps(self):
+        counters = DropCounters(["top", "side"])
+        log_file = self.test_dir / "side.drops.csv"
+        detector = DropDetector(
+            log_file=log_file, counters=counters, counter_index=1, camera_name="side"
+        )
+        rng = np.random.default_rng(0)
+        interval = 1e9 / 150
+        timestamps = np.arange(300) * interval + rng.normal(0, interval * 0.02, 300)
+        # drop 1 frame after frame 100 and 3 frames after frame 200
+        keep = np.ones(300, dtype=bool)
+        keep[101] = False
+        keep[201:204] = False
+        for frame, timestamp in enumerate(timestamps[keep]):
+            detector.update(int(timestamp), frame)
+        detector.close()
+
+        self.assertEqual(detector.n_dropped, 4)
+        self.assertEqual(counters.dropped[1], 4)
+        self.assertEqual(counters.frames[1], keep.sum())
+        self.assertEqual(counters.dropped[0], 0)
+        with open(log_file) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([int(r["n_dropped"]) for r in rows], [1, 3])
@@ -0,0 +1,95 @@
+import unittest
+import shutil
+import tempfile
+from pathlib import Path
+
+import av
+import numpy as np
+
+from multicamera_acquisition.encoders import (
+    ENCODERS,
+    Encoder,
+    open_encoder,
+    register_encoder,
+    resolve_encoders,
+)
+from multicamera_acquisition.raw_segments import RawSegmentReader, find_raw_recordings
+
+
+class BrokenEncoder(Encoder):
+    name = "broken"
+
+    def open(self, frame):
+        raise RuntimeError("no device")
+
+
+class MissingEncoder(Encoder):
+    name = "missing"
+
+    @classmethod
+    def is_available(cls):
+        return False
+
+
+class EncoderRegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        register_encoder(BrokenEncoder)
+        register_encoder(MissingEncoder)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+        ENCODERS.pop("broken")
+        ENCODERS.pop("missing")
+
+    def encode(self, encoder, frames):
+        encoder.open(frames[0])
+        for frame in frames:
+            encoder.write(encoder.encode(frame))
+        encoder.close()
+
+    def test_resolve(self):
+        self.assertEqual(resolve_encoders("raw", "gray8")[0], "raw")
+        self.assertEqual(resolve_encoders("raw", "gray8", fallback=False), ["raw"])
+        names = resolve_encoders(["missing", "raw"], "gray16")
+        self.assertNotIn("missing", names)
+        self.assertEqual(names[0], "raw")
+        # nvenc only encodes 8 bit video
+        self.assertNotIn("nvenc", resolve_encoders("nvenc", "gray16"))
+        with self.assertRaises(ValueError):
+            resolve_encoders("vp9")
+        with self.assertRaises(RuntimeError):
+            resolve_encoders("missing", fallback=False)
+
+    def test_falls_back_when_open_fails(self):
+        frame = np.zeros((16, 16), dtype=np.uint8)
+        encoder = open_encoder(
+            ["broken", "raw"], frame, self.test_dir / "cam.mp4", 30
+        )
+        self.assertEqual(encoder.name, "raw")
+        encoder.close()
+        with self.assertRaises(RuntimeError):
+            open_encoder(["broken"], frame, self.test_dir / "cam.mp4", 30)
+
+    def test_raw(self):
+        frames = [np.full((12, 20), i, dtype=np.uint16) for i in range(7)]
+        encoder = ENCODERS["raw"](
+            self.test_dir / "cam.avi", 30, pixel_format="gray16", segment_bytes=12 * 20 * 2 * 3
+        )
+        self.assertEqual(encoder.video_file_name.suffix, ".raw")
+        self.encode(encoder, frames)
+        segments = find_raw_recordings(self.test_dir)[self.test_dir / "cam"]
+        self.assertEqual(len(segments), 3)
+        decoded = [frame for segment in segments for frame in RawSegmentReader(segment)]
+        np.testing.assert_array_equal(np.array(decoded), np.array(frames))
+
+    def test_ffv1_is_lossless(self):
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 256, (48, 64), dtype=np.uint8) for _ in range(5)]
+        encoder = ENCODERS["ffv1"](self.test_dir / "cam.mp4", 30, pixel_format="gray8")
+        self.encode(encoder, frames)
+        with av.open(str(encoder.video_file_name)) as reader:
+            decoded = [f.to_ndarray(format="gray") for f in reader.decode(video=0)]
+        self.assertEqual(len(decoded), 5)
+        for frame, expected in zip(decoded, frames):
+            np.testing.assert_array_equal(frame, expected)
@@ -0,0 +1,16 @@
+import unittest
+
+from multicamera_acquisition.benchmarks.import_time import heavy_imports, measure_import
+
+
+class ImportTestCase(unittest.TestCase):
+    def test_acquisition_import_is_light(self):
+        """Importing the acquisition code must not import vendor SDKs, the
+        NVIDIA codec or the display / plotting libraries."""
+        for module in [
+            "multicamera_acquisition.acquisition",
+            "multicamera_acquisition.writer",
+            "multicamera_acquisition.interfaces",
+        ]:
+            _, modules = measure_import(module)
+            self.assertEqual(heavy_imports(modules), [], module)
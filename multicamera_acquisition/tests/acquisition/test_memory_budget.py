@@ -0,0 +1,107 @@
+import unittest
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from multicamera_acquisition.memory_budget import BudgetedQueue, MemoryBudget
+from multicamera_acquisition.session_metadata import (
+    read_session_metadata,
+    update_session_metadata,
+)
+
+
+def frame(i):
+    # 1000 bytes
+    return (np.full(1000, i, dtype=np.uint8), i, i)
+
+
+class MemoryBudgetTestCase(unittest.TestCase):
+    def test_drop_newest_and_oldest(self):
+        budget = MemoryBudget(3000, ["newest", "oldest"])
+        newest = BudgetedQueue(budget, "newest", policy="drop_newest")
+        oldest = BudgetedQueue(budget, "oldest", policy="drop_oldest")
+        for i in range(2):
+            newest.put(frame(i))
+        for i in range(2, 6):
+            oldest.put(frame(i))
+        # the first frame of 'oldest' fills the budget, later ones replace it
+        self.assertEqual(budget.used.value, 3000)
+        self.assertEqual([newest.get(timeout=1)[1] for i in range(2)], [0, 1])
+        self.assertEqual(oldest.get(timeout=1)[1], 5)
+
+        newest.put(frame(6))
+        newest.put(frame(7))
+        newest.put(frame(8))
+        newest.put(frame(9))
+        counts = budget.as_dict()["cameras"]
+        self.assertEqual(counts["newest"]["dropped_newest"], 1)
+        self.assertEqual(counts["oldest"]["dropped_oldest"], 3)
+        self.assertEqual(budget.as_dict()["peak_bytes"], 3000)
+
+    def test_block(self):
+        budget = MemoryBudget(2000, ["cam"])
+        write_queue = BudgetedQueue(budget, "cam", policy="block")
+        received = []
+
+        def consume():
+            time.sleep(0.2)
+            for i in range(5):
+                received.append(write_queue.get(timeout=2)[1])
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        start = time.monotonic()
+        for i in range(5):
+            write_queue.put(frame(i))
+        self.assertGreater(time.monotonic() - start, 0.15)
+        consumer.join()
+        self.assertEqual(received, list(range(5)))
+        self.assertEqual(budget.used.value, 0)
+        counts = budget.as_dict()["cameras"]["cam"]
+        self.assertGreater(counts["blocked"], 0)
+        self.assertGreater(counts["blocked_ns"], 0)
+        self.assertEqual(counts["frames"], 5)
+
+    def test_decimate_display(self):
+        budget = MemoryBudget(4000, ["cam"])
+        write_queue = BudgetedQueue(budget, "cam", policy="decimate_display")
+        display_queue = BudgetedQueue(
+            budget, "cam", policy="decimate_display", display=True
+        )
+        for i in range(3):
+            write_queue.put(frame(i))
+            display_queue.put(frame(i))
+        # display frames stop at half the budget, written frames use the rest
+        self.assertEqual(budget.used.value, 4000)
+        self.assertEqual(budget.as_dict()["cameras"]["cam"]["display_dropped"], 2)
+
+        # the stop signal is never held back
+        display_queue.put(tuple())
+        self.assertEqual(display_queue.get(timeout=1)[1], 0)
+        self.assertEqual(display_queue.get(timeout=1), tuple())
+
+    def test_session_metadata(self):
+        test_dir = tempfile.mkdtemp()
+        try:
+            budget = MemoryBudget(1000, ["cam"])
+            BudgetedQueue(budget, "cam", policy="drop_newest").put(frame(0))
+            update_session_metadata(test_dir, shutdown_s={"writers": 1.0})
+            update_session_metadata(test_dir, memory_budget=budget.as_dict())
+            metadata = read_session_metadata(test_dir)
+            self.assertEqual(metadata["shutdown_s"], {"writers": 1.0})
+            self.assertEqual(metadata["memory_budget"]["peak_bytes"], 1000)
+            self.assertEqual(read_session_metadata(Path(test_dir) / "missing"), {})
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_policy(self):
+        with self.assertRaises(ValueError):
+            BudgetedQueue(MemoryBudget(1000, ["cam"]), "cam", policy="nope")
+
+
+if __name__ == "__main__":
+    unittest.main()
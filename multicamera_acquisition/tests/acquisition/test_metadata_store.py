@@ -0,0 +1,85 @@
+import unittest
+import csv
+import queue
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from multicamera_acquisition.metadata_store import (
+    MetadataStore,
+    NO_TIMESTAMP,
+    count_rows,
+    metadata_to_csv,
+    read_metadata,
+)
+from multicamera_acquisition.writer import Writer
+
+
+class MetadataStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_write_and_read(self):
+        file_name = self.test_dir / "top.metadata.bin"
+        store = MetadataStore(file_name, buffer_rows=8)
+        for i in range(20):
+            store.append(i, i * 1000, 1700000000.5 + i, 10**12 + i, i % 3)
+        # 16 records have been written so far, the rest are buffered
+        self.assertEqual(count_rows(file_name), 16)
+        store.close()
+
+        columns = read_metadata(file_name)
+        np.testing.assert_array_equal(columns["frame_id"], np.arange(20))
+        np.testing.assert_array_equal(columns["frame_timestamp"], np.arange(20) * 1000)
+        self.assertEqual(columns["host_time"].dtype, np.float64)
+        np.testing.assert_array_equal(columns["queue_size"], np.arange(20) % 3)
+
+        # a partially written record is ignored
+        with open(file_name, "ab") as f:
+            f.write(b"\x00" * 7)
+        self.assertEqual(len(read_metadata(file_name)["frame_id"]), 20)
+
+    def test_to_csv(self):
+        file_name = self.test_dir / "top.metadata.bin"
+        store = MetadataStore(file_name)
+        store.append(0, NO_TIMESTAMP, 1700000000.123456, 5, 2)
+        store.append(1, 33, 1700000000.2, 6, 0)
+        store.close()
+        with open(metadata_to_csv(file_name)) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(
+            rows,
+            [
+                ["frame_id", "frame_timestamp", "frame_image_uid", "queue_size"],
+                ["0", "", "1700000000.12346", "2"],
+                ["1", "33", "1700000000.2", "0"],
+            ],
+        )
+
+    def test_writer_binary_metadata(self):
+        write_queue = queue.Queue()
+        for i in range(5):
+            write_queue.put((np.full((16, 16), i, dtype=np.uint8), 1000 * i, i))
+        write_queue.put(tuple())
+        writer = Writer(
+            queue=write_queue,
+            video_file_name=self.test_dir / "top.1.mp4",
+            metadata_file_name=self.test_dir / "top.1.metadata.csv",
+            camera_serial="1",
+            camera_name="top",
+            camera_brand="synthetic",
+            fps=30,
+            ffmpeg_options={},
+            encoder="raw",
+            metadata_format="binary",
+        )
+        writer.run()
+        columns = read_metadata(self.test_dir / "top.1.metadata.bin")
+        np.testing.assert_array_equal(columns["frame_timestamp"], np.arange(5) * 1000)
+        self.assertTrue(np.all(np.diff(columns["host_monotonic_ns"]) >= 0))
+        self.assertFalse((self.test_dir / "top.1.metadata.csv").exists())
@@ -0,0 +1,93 @@
+import unittest
+import csv
+import shutil
+import tempfile
+from pathlib import Path
+
+import av
+import numpy as np
+
+from multicamera_acquisition.raw_segments import (
+    RawSegmentReader,
+    RawSegmentSink,
+    RawSegmentWriter,
+    find_raw_recordings,
+    metadata_file_for,
+    transcode_session,
+)
+
+
+def write_metadata(metadata_file, n_frames):
+    with open(metadata_file, "w") as f:
+        writer = csv.writer(f)
+        writer.writerow(["frame_id", "frame_timestamp", "frame_image_uid", "queue_size"])
+        for i in range(n_frames):
+            writer.writerow([i, i * 1000, 0, 0])
+
+
+class RawSegmentTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_write_and_read(self):
+        frames = np.random.default_rng(0).integers(0, 4096, (5, 30, 40), dtype=np.uint16)
+        segment = RawSegmentWriter(
+            self.test_dir / "cam.0000.raw", (30, 40), np.uint16, capacity=8, fps=90
+        )
+        for frame in frames:
+            self.assertTrue(segment.write(frame))
+        # readable before the writer closes, e.g. after a crash
+        self.assertEqual(len(RawSegmentReader(self.test_dir / "cam.0000.raw")), 5)
+        segment.close()
+
+        reader = RawSegmentReader(self.test_dir / "cam.0000.raw")
+        self.assertEqual(reader.fps, 90)
+        self.assertEqual(reader.dtype, np.uint16)
+        np.testing.assert_array_equal(np.array(list(reader)), frames)
+
+    def test_full_segment(self):
+        segment = RawSegmentWriter(self.test_dir / "cam.0000.raw", (4, 4), np.uint8, capacity=2)
+        frame = np.zeros((4, 4), dtype=np.uint8)
+        self.assertTrue(segment.write(frame))
+        self.assertTrue(segment.write(frame))
+        self.assertFalse(segment.write(frame))
+        segment.close()
+
+    def test_metadata_file_for(self):
+        self.assertEqual(
+            metadata_file_for(self.test_dir / "top.123"),
+            self.test_dir / "top.123.metadata.csv",
+        )
+        self.assertEqual(
+            metadata_file_for(self.test_dir / "top.123.3600"),
+            self.test_dir / "top.123.metadata.csv",
+        )
+        self.assertEqual(
+            metadata_file_for(self.test_dir / "top.123.depth"),
+            self.test_dir / "top.123.metadata.depth.csv",
+        )
+
+    def test_transcode_session(self):
+        for stem, n_frames in [("top.1", 25), ("side.2", 10)]:
+            sink = RawSegmentSink(self.test_dir / stem, fps=30, segment_bytes=64 * 48 * 10)
+            for i in range(n_frames):
+                sink.write(np.full((48, 64), 4 * i, dtype=np.uint8))
+            sink.close()
+            write_metadata(self.test_dir / f"{stem}.metadata.csv", n_frames)
+        # the side camera's metadata has a frame that was never written
+        write_metadata(self.test_dir / "side.2.metadata.csv", 11)
+        self.assertEqual(len(find_raw_recordings(self.test_dir)[self.test_dir / "top.1"]), 3)
+
+        results = {
+            Path(r["recording"]).name: r
+            for r in transcode_session(self.test_dir, processes=2, delete_raw=True)
+        }
+        self.assertTrue(results["top.1"]["verified"])
+        self.assertFalse(results["side.2"]["verified"])
+        with av.open(str(self.test_dir / "top.1.mp4")) as reader:
+            self.assertEqual(len(list(reader.decode(video=0))), 25)
+        # only verified recordings are deleted
+        self.assertEqual(list(find_raw_recordings(self.test_dir).keys()), [self.test_dir / "side.2"])
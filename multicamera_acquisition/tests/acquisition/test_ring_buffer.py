@@ -0,0 +1,87 @@
+import unittest
+import multiprocessing as mp
+import queue
+
+import numpy as np
+
+from multicamera_acquisition.ring_buffer import SharedMemoryRingBuffer
+
+
+def _produce(ring_buffer, n_frames, shape):
+    for i in range(n_frames):
+        ring_buffer.put((np.full(shape, i % 256, dtype=np.uint8), 1000 * i, i))
+    ring_buffer.put(tuple())
+
+
+class SharedMemoryRingBufferTestCase(unittest.TestCase):
+    def setUp(self):
+        self.shape = (120, 192)
+        self.ring_buffer = SharedMemoryRingBuffer(
+            slot_bytes=self.shape[0] * self.shape[1] * 2, n_slots=4
+        )
+
+    def tearDown(self):
+        self.ring_buffer.unlink()
+
+    def test_put_get(self):
+        img = np.arange(np.prod(self.shape), dtype=np.uint16).reshape(self.shape)
+        self.ring_buffer.put((img, 12345, 7))
+        self.ring_buffer.put((None, None, 8))
+        self.ring_buffer.put(tuple())
+        self.assertEqual(self.ring_buffer.qsize(), 3)
+
+        out, timestamp, frame = self.ring_buffer.get()
+        np.testing.assert_array_equal(out, img)
+        self.assertEqual((timestamp, frame), (12345, 7))
+        self.assertEqual(self.ring_buffer.get(), (None, None, 8))
+        self.assertEqual(self.ring_buffer.get(), tuple())
+        self.assertEqual(self.ring_buffer.qsize(), 0)
+
+    def test_full_and_empty(self):
+        img = np.zeros(self.shape, dtype=np.uint8)
+        for i in range(4):
+            self.ring_buffer.put((img, i, i))
+        with self.assertRaises(queue.Full):
+            self.ring_buffer.put((img, 4, 4), timeout=0.01)
+        for i in range(4):
+            self.ring_buffer.get()
+        with self.assertRaises(queue.Empty):
+            self.ring_buffer.get(timeout=0.01)
+
+    def test_frame_too_large(self):
+        with self.assertRaises(ValueError):
+            self.ring_buffer.put((np.zeros((1000, 1000), dtype=np.uint16), 0, 0))
+
+    def test_color_frames(self):
+        img = np.arange(40 * 60 * 3, dtype=np.uint8).reshape(40, 60, 3)
+        self.ring_buffer.put((img, 1, 0))
+        out, _, _ = self.ring_buffer.get()
+        self.assertEqual(out.shape, (40, 60, 3))
+        np.testing.assert_array_equal(out, img)
+        with self.assertRaises(ValueError):
+            self.ring_buffer.put((np.zeros((4, 4, 3, 2), dtype=np.uint8), 2, 1))
+
+    def test_reserve_commit(self):
+        out = self.ring_buffer.reserve(self.shape, np.uint8)
+        out[:] = 3
+        self.ring_buffer.put((out, 5, 0))
+        img, timestamp, frame = self.ring_buffer.get()
+        self.assertTrue(np.all(img == 3))
+
+    def test_across_processes(self):
+        n_frames = 50
+        producer = mp.Process(
+            target=_produce, args=(self.ring_buffer, n_frames, self.shape)
+        )
+        producer.start()
+        frames = []
+        while True:
+            data = self.ring_buffer.get(timeout=10)
+            if len(data) == 0:
+                break
+            img, timestamp, frame = data
+            self.assertTrue(np.all(img == frame % 256))
+            self.assertEqual(timestamp, 1000 * frame)
+            frames.append(frame)
+        producer.join()
+        self.assertEqual(frames, list(range(n_frames)))
@@ -0,0 +1,49 @@
+import unittest
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from multicamera_acquisition.tracing import (
+    ACQUISITION_STAGES,
+    WRITER_STAGES,
+    FrameTracer,
+    read_trace,
+    summarize_recording,
+)
+
+
+class FrameTracerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_roundtrip_and_summary(self):
+        acquisition_tracer = FrameTracer(
+            self.test_dir / "cam.0.trace.acquisition.bin", ACQUISITION_STAGES, buffer_frames=8
+        )
+        writer_tracer = FrameTracer(
+            self.test_dir / "cam.0.trace.writer.bin", WRITER_STAGES, buffer_frames=8
+        )
+        ms = 1_000_000
+        for frame in range(20):
+            t = frame * 10 * ms
+            acquisition_tracer.record(frame, t, t + 1 * ms, t + 2 * ms)
+            # the writer never sees frame 5
+            if frame != 5:
+                writer_tracer.record(frame, t + 4 * ms, t + 7 * ms, t + 8 * ms)
+        acquisition_tracer.close()
+        writer_tracer.close()
+
+        trace = read_trace(self.test_dir / "cam.0.trace.acquisition.bin")
+        self.assertEqual(len(trace), 20)
+        np.testing.assert_array_equal(trace["frame"], np.arange(20))
+
+        summary = summarize_recording(self.test_dir)["cam.0"]
+        self.assertAlmostEqual(summary["ipc"]["p50"], 2.0)
+        self.assertAlmostEqual(summary["encode"]["max"], 3.0)
+        self.assertAlmostEqual(summary["total"]["p99"], 7.0)
+        self.assertEqual(summary["total"]["n"], 19)
@@ -0,0 +1,116 @@
+import unittest
+import csv
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from multicamera_acquisition.trigger_data import TriggerDataLogger, read_trigger_data
+
+
+class TriggerDataTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_csv(self):
+        file_name = self.test_dir / "triggerdata.csv"
+        logger = TriggerDataLogger(file_name, 4, buffer_events=8, flush_interval_s=60)
+        self.assertFalse(logger.log_line("Start"))
+        for i in range(20):
+            self.assertTrue(logger.log_line(f"input: {i % 2},0,1,0,{i},{i * 5}"))
+        # 16 events have been written so far, the rest are buffered
+        with open(file_name, "r") as f:
+            self.assertEqual(len(f.readlines()), 1 + 16)
+        logger.close()
+
+        with open(file_name, "r") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(
+            rows[0], ["pulse_id", "arduino_ms", "flag_0", "flag_1", "flag_2", "flag_3"]
+        )
+        self.assertEqual(rows[4], ["3", "15", "1", "0", "1", "0"])
+        self.assertEqual(len(rows), 21)
+
+        stats = logger.stats()
+        self.assertEqual(stats["events"], 20)
+        self.assertGreater(stats["peak_events_per_s"], 0)
+
+    def test_csv_malformed(self):
+        file_name = self.test_dir / "triggerdata.csv"
+        logger = TriggerDataLogger(file_name, 2)
+        self.assertTrue(logger.log_line("input: 1,0,0,0"))
+        self.assertFalse(logger.log_line("input: 1,x,1,5"))
+        self.assertFalse(logger.log_line("input: 1"))
+        self.assertFalse(logger.log(2, None, [0, 1]))
+        self.assertTrue(logger.log_line("input: 0,1,3,15"))
+        logger.close()
+
+        with open(file_name, "r") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[1:], [["0", "0", "1", "0"], ["3", "15", "0", "1"]])
+        self.assertEqual(logger.stats()["malformed"], 3)
+
+    def test_binary(self):
+        logger = TriggerDataLogger(
+            self.test_dir / "triggerdata.csv", 2, file_format="binary"
+        )
+        self.assertEqual(logger.file_name, self.test_dir / "triggerdata.bin")
+        for i in range(10):
+            logger.log_line(f"input: 1,{i % 2},{i},{i * 5}")
+        logger.log_line("input: 1,x,10,50")
+        logger.close()
+
+        columns = read_trigger_data(logger.file_name)
+        np.testing.assert_array_equal(columns["pulse_id"], np.arange(10))
+        np.testing.assert_array_equal(columns["arduino_ms"], np.arange(10) * 5)
+        np.testing.assert_array_equal(columns["flag_1"], np.arange(10) % 2)
+        self.assertEqual(logger.stats()["malformed"], 1)
+
+    def test_log_batch(self):
+        pulse_ids = np.arange(50)
+        states = np.stack([pulse_ids % 2, pulse_ids % 3 == 0], axis=1)
+        for file_format in ["csv", "binary"]:
+            logger = TriggerDataLogger(
+                self.test_dir / "triggerdata.csv", 2, file_format=file_format
+            )
+            logger.log(-1, 0, [0, 0])
+            logger.log_batch(pulse_ids, pulse_ids * 5, states)
+            logger.close()
+            self.assertEqual(logger.stats()["events"], 51)
+            columns = read_trigger_data(logger.file_name)
+            np.testing.assert_array_equal(columns["pulse_id"][1:], pulse_ids)
+            np.testing.assert_array_equal(columns["flag_1"][1:], states[:, 1])
+
+    def test_mismatched_states(self):
+        for file_format in ["csv", "binary"]:
+            logger = TriggerDataLogger(
+                self.test_dir / "triggerdata.csv", 4, file_format=file_format
+            )
+            logger.log_batch([1, 2], [5, 6], np.ones((2, 2)))
+            logger.log_batch([3], [7], np.ones((1, 6)))
+            logger.log(4, 8, [1, 1, 1])
+            logger.close()
+            self.assertEqual(logger.stats()["mismatched"], 4)
+            columns = read_trigger_data(logger.file_name)
+            np.testing.assert_array_equal(columns["pulse_id"], [1, 2, 3, 4])
+            np.testing.assert_array_equal(columns["flag_1"], [1, 1, 1, 1])
+            np.testing.assert_array_equal(columns["flag_2"], [0, 0, 1, 1])
+            np.testing.assert_array_equal(columns["flag_3"], [0, 0, 1, 0])
+
+    def test_read_csv(self):
+        file_name = self.test_dir / "triggerdata.csv"
+        logger = TriggerDataLogger(file_name, 1)
+        for i in range(5):
+            logger.log(i, i * 5, [1])
+        logger.close()
+        columns = read_trigger_data(file_name)
+        np.testing.assert_array_equal(columns["arduino_ms"], np.arange(5) * 5)
+        np.testing.assert_array_equal(columns["flag_0"], np.ones(5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import shutil
+import tempfile
+from pathlib import Path
+
+import av
+import numpy as np
+
+from multicamera_acquisition.video_io_pyav import PyAVWriter
+
+
+class PyAVWriterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def read_frames(self, video_file, format):
+        with av.open(str(video_file)) as reader:
+            return [frame.to_ndarray(format=format) for frame in reader.decode(video=0)]
+
+    def test_gray8(self):
+        video_file = self.test_dir / "cam.mp4"
+        writer = PyAVWriter(video_file, fps=30, pixel_format="gray8", quality=0)
+        # width is not a multiple of 32, so the luma plane rows are padded
+        for i in range(20):
+            writer.write(np.full((48, 66), 40 + 5 * i, dtype=np.uint8))
+        writer.close()
+        frames = self.read_frames(video_file, "gray")
+        self.assertEqual(len(frames), 20)
+        self.assertEqual(frames[0].shape, (48, 66))
+        luma = [f.mean() for f in self.read_frames(video_file, "yuv420p")]
+        self.assertTrue(np.all(np.diff(luma) > 0))
+
+    def test_gray16_is_lossless(self):
+        video_file = self.test_dir / "cam.avi"
+        writer = PyAVWriter(video_file, fps=30, pixel_format="gray16")
+        rng = np.random.default_rng(0)
+        written = [rng.integers(0, 2**16, (32, 40), dtype=np.uint16) for _ in range(5)]
+        for frame in written:
+            writer.write(frame)
+        writer.close()
+        frames = self.read_frames(video_file, "gray16le")
+        self.assertEqual(len(frames), 5)
+        for frame, expected in zip(frames, written):
+            np.testing.assert_array_equal(frame, expected)
+
+    def test_close_without_frames(self):
+        writer = PyAVWriter(self.test_dir / "empty.mp4", fps=30)
+        writer.close()
+        writer.close()
@@ -0,0 +1,133 @@
+import unittest
+import os
+import select
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import serial
+
+from multicamera_acquisition.interfaces import get_camera
+from multicamera_acquisition.interfaces.arduino import (
+    SerialReader,
+    packIntAsLong,
+    wait_for_serial_confirmation,
+)
+from multicamera_acquisition.interfaces.arduino_emulator import ArduinoEmulator
+from multicamera_acquisition.interfaces.camera_synthetic import TimeoutException
+from multicamera_acquisition.session_metadata import read_session_metadata
+
+
+class ArduinoEmulatorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_handshake_and_triggers(self):
+        trigger_clock = self.test_dir / "trigger_clock.json"
+        cam = get_camera(
+            brand="synthetic", serial="s0", width=32, height=32, trigger_clock=trigger_clock
+        )
+        cam.start()
+        with ArduinoEmulator(input_event_rate=100, trigger_clock=trigger_clock) as emulator:
+            with serial.Serial(emulator.port, timeout=0.1) as arduino:
+                wait_for_serial_confirmation(arduino, "Waiting...", seconds_to_wait=2)
+            arduino = serial.Serial(emulator.port, timeout=0.1)
+            # 50 triggers at 100 Hz, with one extra argument
+            arduino.write(b"".join(map(packIntAsLong, (50, 10000, 7))))
+            wait_for_serial_confirmation(arduino, "Start", seconds_to_wait=3)
+
+            # no frames before the first trigger, then one per trigger
+            timestamps = []
+            with self.assertRaises(TimeoutException):
+                while True:
+                    timestamps.append(cam.get_array(timeout=200, get_timestamp=True)[1])
+
+            reader = SerialReader(arduino)
+            reader.start()
+            events = []
+            while len(events) == 0 or events[-1].kind != "finished":
+                event = reader.get(timeout=1)
+                self.assertIsNotNone(event)
+                events.append(event)
+            reader.stop()
+            arduino.close()
+
+        self.assertEqual(
+            emulator.parameters,
+            {"num_cycles": 50, "inv_framerate": 10000, "arduino_args": [7]},
+        )
+        self.assertEqual(len(timestamps), 50)
+        self.assertAlmostEqual((timestamps[-1] - timestamps[0]) / 1e9, 0.49, places=3)
+        inputs = [e for e in events if e.kind == "input"]
+        self.assertEqual(len(inputs), emulator.n_input_events)
+        self.assertGreater(len(inputs), 40)
+        self.assertEqual(len(inputs[0].states), 4)
+        cam.close()
+
+    def test_acquire_video(self):
+        from multicamera_acquisition.benchmarks.orchestration import run_orchestration
+
+        result = run_orchestration(
+            self.test_dir / "recording",
+            n_cameras=2,
+            fps=30,
+            duration=1,
+            memory_budget_bytes=10**6,
+        )
+        self.assertEqual(result["frames"], {"cam0": 30, "cam1": 30})
+        self.assertEqual(result["input_events_logged"], result["input_events_emitted"])
+
+        metadata = read_session_metadata(self.test_dir / "recording")
+        self.assertEqual(set(metadata["memory_budget"]["cameras"]), {"cam0", "cam1"})
+        self.assertEqual(metadata["memory_budget"]["cameras"]["cam0"]["frames"], 30)
+        self.assertEqual(metadata["memory_budget"]["used_bytes"], 0)
+        for stats in metadata["stream_stats"].values():
+            self.assertEqual(stats["delivered_buffers"], 30)
+            self.assertEqual(stats["lost_frames"], 0)
+
+    def test_output_dropped_as_whole_lines(self):
+        # nobody reads the port at first, so it fills up; lines are then
+        # dropped whole, and a line that was partly written arrives whole
+        emulator = ArduinoEmulator()
+        line = "x" * 97
+        n_lines = 2000
+
+        def write_lines():
+            for _ in range(n_lines):
+                emulator._println(line)
+
+        writer = threading.Thread(target=write_lines)
+        writer.start()
+        try:
+            # until the port is full, and a line is dropped or waits for it
+            time.sleep(0.5)
+            # read the pseudo-terminal directly, as opening the port with
+            # pyserial flushes what is buffered
+            received = b""
+            while True:
+                readable, _, _ = select.select([emulator.slave], [], [], 0.5)
+                if len(readable) == 0:
+                    if not writer.is_alive():
+                        break
+                    continue
+                received += os.read(emulator.slave, 65536)
+            writer.join()
+        finally:
+            emulator.close()
+
+        lines = received.split(b"\r\n")
+        self.assertEqual(lines[-1], b"")
+        self.assertTrue(all(l == line.encode("utf-8") for l in lines[:-1]))
+        self.assertEqual(
+            len(received) + emulator.n_dropped_bytes, n_lines * (len(line) + 2)
+        )
+        self.assertEqual(emulator.n_dropped_bytes % (len(line) + 2), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,8 @@ import unittest
 import os
 import sys
 
+import numpy as np
+
 num_devices = 1
 os.environ["PYLON_CAMEMU"] = f"{num_devices}"
 from pypylon import pylon
@@ -62,4 +64,83 @@ class GrabTestSuite(PylonEmuTestCase):
                 img = grabResult.Array
             grabResult.Release()
         self.assertEqual(countOfImagesToGrab, imageCounter)
-        camera.Close()
\ No newline at end of file
+        camera.Close()
+
+class ResolveDeviceIndicesTestCase(PylonEmuTestCase):
+    def test_resolve_and_open(self):
+        from multicamera_acquisition.interfaces import resolve_device_indices
+        from multicamera_acquisition.interfaces.camera_basler import (
+            BaslerCamera,
+            basler_device_cache,
+        )
+
+        camera_list = [
+            {"name": "top", "brand": "basler", "serial": "0815-0000"},
+            {"name": "synthetic", "brand": "synthetic", "serial": "1"},
+        ]
+        device_indices, stats = resolve_device_indices(camera_list)
+        self.assertEqual(device_indices, {"top": 0})
+        self.assertEqual(stats["basler"]["misses"], 1)
+
+        # opening by serial number makes pylon enumerate, which is counted
+        misses = basler_device_cache.misses
+        camera = BaslerCamera(index="0815-0000", device_index=0)
+        self.assertEqual(basler_device_cache.misses, misses + 1)
+        self.assertEqual(camera.cam.GetDeviceInfo().GetSerialNumber(), "0815-0000")
+        camera.cam.DestroyDevice()
+
+
+class GetArrayOutTestCase(PylonEmuTestCase):
+    def setUp(self):
+        from multicamera_acquisition.interfaces.camera_basler import (
+            EmulatedBaslerCamera,
+        )
+
+        self.camera = EmulatedBaslerCamera()
+        self.camera.init()
+        self.shape = (self.camera.cam.Height.Value, self.camera.cam.Width.Value)
+
+    def tearDown(self):
+        self.camera.cam.StopGrabbing()
+        self.camera.stop()
+        self.camera.cam.DestroyDevice()
+
+    def test_get_array_into_out(self):
+        self.camera.start()
+        out = np.zeros(self.shape, dtype=np.uint8)
+        img = self.camera.get_array(timeout=1000, out=out)
+        # a uint8 frame is written straight into out, without a cast copy
+        self.assertIs(img, out)
+        actual = list(out[0:20, 0])
+        self.assertEqual(actual, [actual[0] + i for i in range(20)])
+
+    def test_copy_grab_result(self):
+        from multicamera_acquisition.interfaces.camera_basler import copy_grab_result
+
+        result = self.camera.cam.GrabOne(1000)
+        expected = result.Array.copy()
+        out = np.zeros(self.shape, dtype=np.uint8)
+        self.assertIs(copy_grab_result(result, out), out)
+        np.testing.assert_array_equal(out, expected)
+
+        out = np.zeros(self.shape, dtype=np.uint16)
+        copy_grab_result(result, out)
+        np.testing.assert_array_equal(out, expected.astype(np.uint16))
+
+    def test_uint16_into_out(self):
+        from multicamera_acquisition.interfaces.camera_basler import copy_grab_result
+
+        # a 12 bit frame keeps its full range in a uint16 destination
+        self.camera.cam.PixelFormat.Value = "Mono12"
+        result = self.camera.cam.GrabOne(1000)
+        expected = result.Array.copy()
+        self.assertGreater(expected.max(), 255)
+        out = np.zeros(self.shape, dtype=np.uint16)
+        copy_grab_result(result, out)
+        np.testing.assert_array_equal(out, expected)
+
+        self.camera.start()
+        out = np.zeros(self.shape, dtype=np.uint16)
+        img = self.camera.get_array(timeout=1000, out=out)
+        self.assertIs(img, out)
+        self.assertGreater(out.max(), 255)
@@ -0,0 +1,55 @@
+import unittest
+import time
+
+import numpy as np
+
+from multicamera_acquisition.interfaces import get_camera
+from multicamera_acquisition.interfaces.camera_synthetic import TimeoutException
+
+
+class SyntheticCameraTestCase(unittest.TestCase):
+    def test_frame_format(self):
+        cam = get_camera(brand="synthetic", serial="s0", width=64, height=48, bit_depth=16, fps=200)
+        cam.start()
+        img, tstamp = cam.get_array(timeout=1000, get_timestamp=True)
+        self.assertEqual(img.shape, (48, 64))
+        self.assertEqual(img.dtype, np.uint16)
+        out = np.empty_like(img)
+        img2 = cam.get_array(timeout=1000, out=out)
+        self.assertIs(img2, out)
+        cam.close()
+
+    def test_frame_rate(self):
+        fps = 100
+        cam = get_camera(brand="synthetic", serial="s0", width=32, height=32, fps=fps)
+        cam.start()
+        start = time.monotonic()
+        timestamps = [cam.get_array(timeout=1000, get_timestamp=True)[1] for _ in range(20)]
+        elapsed = time.monotonic() - start
+        self.assertGreater(elapsed, 18 / fps)
+        np.testing.assert_allclose(np.diff(timestamps), 1e9 / fps, rtol=1e-3)
+        cam.close()
+
+    def test_drops_and_timeouts(self):
+        cam = get_camera(
+            brand="synthetic", serial="s0", width=32, height=32, fps=1000, drop_rate=0.5, seed=0
+        )
+        cam.start()
+        timestamps = [cam.get_array(timeout=1000, get_timestamp=True)[1] for _ in range(50)]
+        self.assertGreater(cam.dropped_frames, 0)
+        self.assertGreater(np.max(np.diff(timestamps)), 1.5e6)
+        cam.close()
+
+        cam = get_camera(brand="synthetic", serial="s0", width=32, height=32, fps=10, timeout_rate=1)
+        cam.start()
+        with self.assertRaises(TimeoutException):
+            cam.get_array(timeout=10)
+
+    def test_azure(self):
+        cam = get_camera(brand="synthetic_azure", serial="a0", fps=200)
+        cam.start()
+        depth, ir, tstamp = cam.get_array(timeout=1000, get_timestamp=True)
+        self.assertEqual(depth.shape, (576, 640))
+        self.assertEqual(depth.dtype, np.uint16)
+        self.assertEqual(ir.dtype, np.uint8)
+        cam.close()
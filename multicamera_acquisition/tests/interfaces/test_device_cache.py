@@ -0,0 +1,49 @@
+import unittest
+
+from multicamera_acquisition.interfaces.camera_base import CameraError
+from multicamera_acquisition.interfaces.device_cache import DeviceCache
+
+
+class DeviceCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.connected = ["111", "222"]
+        self.n_enumerations = 0
+
+        def enumerate_devices():
+            self.n_enumerations += 1
+            return [{"serial": serial} for serial in self.connected]
+
+        self.cache = DeviceCache("test", enumerate_devices, lambda d: d["serial"])
+
+    def test_single_enumeration(self):
+        for serial in ["111", "222", "111"]:
+            self.assertEqual(self.cache.get_device(serial)["serial"], serial)
+        self.assertEqual(self.n_enumerations, 1)
+        self.assertEqual(self.cache.misses, 1)
+        self.assertEqual(self.cache.hits, 2)
+        self.assertEqual(self.cache.get_index("222"), 1)
+
+    def test_refresh_on_miss(self):
+        self.cache.get_devices()
+        self.connected.append("333")
+        self.assertEqual(self.cache.get_device("333")["serial"], "333")
+        self.assertEqual(self.n_enumerations, 2)
+
+    def test_not_found(self):
+        with self.assertRaises(CameraError):
+            self.cache.get_device("999")
+        with self.assertRaises(CameraError):
+            self.cache.get_device("999", refresh_on_miss=False)
+
+    def test_record_enumeration(self):
+        self.cache.get_devices()
+        self.cache.record_enumeration(0.5)
+        stats = self.cache.stats()
+        self.assertEqual(stats["misses"], 2)
+        self.assertGreaterEqual(stats["enumeration_time"], 0.5)
+
+    def test_invalidate(self):
+        self.cache.get_devices()
+        self.cache.invalidate()
+        self.cache.get_devices()
+        self.assertEqual(self.n_enumerations, 2)
@@ -0,0 +1,53 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import time
+import tty
+from pathlib import Path
+
+from multicamera_acquisition.interfaces.arduino import find_arduino
+from multicamera_acquisition.interfaces.arduino_emulator import ArduinoEmulator
+
+
+class FindArduinoTestCase(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+        self.port_cache = self.test_dir / "arduino_port.json"
+        # serial devices that never answer
+        self.silent_ptys = [os.openpty() for _ in range(3)]
+        for _, slave in self.silent_ptys:
+            tty.setraw(slave)
+        self.silent_ports = [os.ttyname(slave) for _, slave in self.silent_ptys]
+
+    def tearDown(self):
+        for fds in self.silent_ptys:
+            for fd in fds:
+                os.close(fd)
+        shutil.rmtree(self.test_dir)
+
+    def test_concurrent_probe_and_cache(self):
+        with ArduinoEmulator(waiting_interval_s=0.2) as emulator:
+            ports = self.silent_ports + [emulator.port]
+            start = time.monotonic()
+            arduino = find_arduino(ports=ports, port_cache=self.port_cache)
+            elapsed = time.monotonic() - start
+            self.assertEqual(arduino.port, emulator.port)
+            # silent ports are probed at the same time, not one after another
+            self.assertLess(elapsed, 1.5)
+            arduino.close()
+            with open(self.port_cache, "r") as f:
+                self.assertEqual(json.load(f)["port"], emulator.port)
+
+            arduino = find_arduino(ports=ports, port_cache=self.port_cache)
+            self.assertEqual(arduino.port, emulator.port)
+            arduino.close()
+
+    def test_not_found(self):
+        with self.assertRaises(RuntimeError):
+            find_arduino(ports=self.silent_ports, port_cache=None, seconds_to_wait=0.3)
+
+
+if __name__ == "__main__":
+    unittest.main()
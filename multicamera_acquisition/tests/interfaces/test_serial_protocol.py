@@ -0,0 +1,96 @@
+import unittest
+import time
+
+import numpy as np
+import serial
+
+from multicamera_acquisition.interfaces.arduino import SerialReader
+from multicamera_acquisition.interfaces.serial_protocol import (
+    BinaryStreamParser,
+    RECORD_BYTES,
+    encode_input_events,
+    unpack_states,
+)
+
+
+def _events(n, n_inputs=4):
+    pulse_ids = np.arange(n)
+    arduino_ms = np.arange(n) * 7 + 1000
+    states = (pulse_ids[:, None] >> np.arange(n_inputs)) & 1
+    return pulse_ids, arduino_ms, states
+
+
+class SerialProtocolTestCase(unittest.TestCase):
+    def _parse(self, data, chunk_size):
+        parser = BinaryStreamParser()
+        items = []
+        for i in range(0, len(data), chunk_size):
+            items += parser.feed(data[i : i + chunk_size])
+        return parser, items
+
+    def test_round_trip(self):
+        pulse_ids, arduino_ms, states = _events(100)
+        data = b"Start\r\n" + encode_input_events(pulse_ids, arduino_ms, states)
+        data += b"Finished\r\n"
+        # the stream may arrive in chunks of any size
+        for chunk_size in [1, 5, RECORD_BYTES, len(data)]:
+            parser, items = self._parse(data, chunk_size)
+            self.assertEqual(items[0], "Start")
+            self.assertEqual(items[-1], "Finished")
+            records = np.concatenate(items[1:-1])
+            np.testing.assert_array_equal(records["pulse_id"], pulse_ids)
+            np.testing.assert_array_equal(records["arduino_ms"], arduino_ms)
+            np.testing.assert_array_equal(unpack_states(records["states"], 4), states)
+            self.assertEqual(parser.n_records, 100)
+            self.assertEqual(parser.buffer, b"")
+
+    def test_corrupt_record_is_skipped(self):
+        data = bytearray(encode_input_events(*_events(10)))
+        data[3 * RECORD_BYTES + 5] ^= 0xFF
+        parser, items = self._parse(bytes(data), len(data))
+        records = np.concatenate(items)
+        self.assertEqual(parser.n_corrupt, 1)
+        self.assertEqual(list(records["pulse_id"]), [0, 1, 2, 4, 5, 6, 7, 8, 9])
+
+    def test_text_after_corrupt_record(self):
+        pulse_ids, arduino_ms, states = _events(3)
+        data = bytearray(encode_input_events(pulse_ids, arduino_ms, states))
+        data[RECORD_BYTES + 5] ^= 0xFF
+        # a record cut short by lost bytes is followed directly by text
+        data += encode_input_events(*_events(1))[:9] + b"Finished\r\n"
+        for chunk_size in [1, 5, len(data)]:
+            parser, items = self._parse(bytes(data), chunk_size)
+            self.assertEqual(items[-1], "Finished")
+            records = np.concatenate(items[:-1])
+            self.assertEqual(list(records["pulse_id"]), [0, 2])
+            self.assertEqual(parser.n_corrupt, 2)
+
+    def test_reader(self):
+        port = serial.serial_for_url("loop://", timeout=0.05)
+        reader = SerialReader(port, protocol="binary")
+        reader.start()
+        pulse_ids, arduino_ms, states = _events(1000)
+        port.write(b"Start\r\n" + encode_input_events(pulse_ids, arduino_ms, states))
+        port.write(b"Finished\r\n")
+
+        events = []
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            event = reader.get(timeout=0.1)
+            if event is not None:
+                events.append(event)
+                if event.kind == "finished":
+                    break
+        reader.stop()
+        port.close()
+
+        self.assertEqual(events[0].kind, "start")
+        batches = [e for e in events if e.kind == "input_batch"]
+        np.testing.assert_array_equal(
+            np.concatenate([e.pulse_id for e in batches]), pulse_ids
+        )
+        np.testing.assert_array_equal(np.concatenate([e.states for e in batches]), states)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import time
+
+import serial
+
+from multicamera_acquisition.interfaces.arduino import (
+    SerialReader,
+    parse_input_line,
+    parse_serial_line,
+)
+
+
+class SerialReaderTestCase(unittest.TestCase):
+    def test_parse_input_line(self):
+        self.assertEqual(
+            parse_input_line("input: 0,1,1,0,42,12345"),
+            ("42", "12345", ["0", "1", "1", "0"]),
+        )
+        self.assertIsNone(parse_input_line("Finished"))
+        self.assertIsNone(parse_input_line(""))
+        with self.assertRaises(ValueError):
+            parse_input_line("input: 5")
+
+    def test_parse_serial_line(self):
+        event = parse_serial_line("input: 0,1,7,1234", host_monotonic_ns=5)
+        self.assertEqual(event.kind, "input")
+        self.assertEqual(event.states, ["0", "1"])
+        self.assertEqual((event.pulse_id, event.arduino_ms), ("7", "1234"))
+        self.assertEqual(event.host_monotonic_ns, 5)
+        self.assertEqual(parse_serial_line("Start").kind, "start")
+        self.assertEqual(parse_serial_line("Finished").kind, "finished")
+        self.assertEqual(parse_serial_line("Waiting...").kind, "message")
+
+    def test_reader(self):
+        # pyserial's loopback port reads back what is written to it
+        port = serial.serial_for_url("loop://", timeout=0.05)
+        reader = SerialReader(port)
+        reader.start()
+        lines = ["Start"] + [f"input: 1,{i},{i * 10}" for i in range(100)] + ["Finished"]
+        port.write("".join(line + "\r\n" for line in lines).encode("utf-8"))
+
+        events = []
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            event = reader.get(timeout=0.1)
+            if event is None:
+                continue
+            events.append(event)
+            if event.kind == "finished":
+                break
+        reader.stop()
+        port.close()
+
+        self.assertFalse(reader.is_alive())
+        self.assertEqual(len(events), 102)
+        self.assertEqual(events[0].kind, "start")
+        self.assertEqual([int(e.pulse_id) for e in events[1:-1]], list(range(100)))
+        self.assertEqual(reader.n_lines, 102)
+
+    def test_truncated_input_line(self):
+        self.assertEqual(parse_serial_line("input: 5").kind, "malformed")
+        port = serial.serial_for_url("loop://", timeout=0.05)
+        reader = SerialReader(port)
+        reader.start()
+        port.write(b"input: 1,0,10\r\ninput: 5\r\ninput: 1,1,20\r\nFinished\r\n")
+        events = []
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and len(events) < 4:
+            event = reader.get(timeout=0.1)
+            if event is not None:
+                events.append(event)
+        self.assertTrue(reader.is_alive())
+        reader.stop()
+        port.close()
+        kinds = [event.kind for event in events]
+        self.assertEqual(kinds, ["input", "malformed", "input", "finished"])
+
+    def test_reader_error(self):
+        # a crash in the reader thread is reported instead of ending it silently
+        port = serial.serial_for_url("loop://", timeout=0.05)
+        reader = SerialReader(port)
+
+        def fail():
+            raise ValueError("unexpected")
+
+        port.readline = fail
+        reader.start()
+        event = reader.get(timeout=2)
+        reader.stop()
+        port.close()
+        self.assertEqual(event.kind, "error")
+        self.assertIn("unexpected", event.text)
+
+
+if __name__ == "__main__":
+    unittest.main()
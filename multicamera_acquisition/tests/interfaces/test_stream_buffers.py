@@ -0,0 +1,67 @@
+import unittest
+
+from multicamera_acquisition.interfaces import get_camera
+from multicamera_acquisition.interfaces.camera_base import (
+    BaseCamera,
+    CameraError,
+    stream_buffer_count,
+)
+
+
+class StreamBuffersTestCase(unittest.TestCase):
+    def test_stream_buffer_count(self):
+        # 250 ms at 200 fps, plus the buffers being filled and read
+        self.assertEqual(stream_buffer_count(1920 * 1200, 200, 250), 52)
+        self.assertEqual(stream_buffer_count(1920 * 1200, 30, 100), 10)
+        # capped by the pool size, but never below min_buffers
+        self.assertEqual(stream_buffer_count(100 * 1024**2, 200, 1000), 10)
+        self.assertEqual(
+            stream_buffer_count(1024**2, 1000, 1000, max_pool_bytes=64 * 1024**2), 64
+        )
+
+    def test_synthetic(self):
+        cam = get_camera(
+            brand="synthetic",
+            serial="s0",
+            width=64,
+            height=64,
+            fps=200,
+            drop_rate=0.2,
+            seed=0,
+            buffer_handling_mode="OldestFirst",
+        )
+        cam.start()
+        for i in range(20):
+            cam.get_array(timeout=1000)
+        stats = cam.stream_stats()
+        cam.close()
+        self.assertEqual(stats["buffer_count"], 52)
+        self.assertEqual(stats["handling_mode"], "OldestFirst")
+        self.assertEqual(stats["delivered_buffers"], 20)
+        self.assertGreater(stats["lost_frames"], 0)
+
+    def test_not_implemented(self):
+        # cameras without buffer settings keep the SDK defaults
+        cam = BaseCamera()
+        with self.assertLogs(level="WARNING"):
+            cam.set_stream_buffers(buffer_count=20)
+        cam.set_stream_buffers(fps=100)
+
+    def test_emulated_basler(self):
+        cam = get_camera(brand="basler_emulated", buffer_count=37)
+        with self.assertRaises(CameraError):
+            cam.set_stream_buffers(handling_mode="NewestFirst")
+        cam.set_stream_buffers(handling_mode="OldestFirst")
+        cam.start()
+        for i in range(5):
+            cam.get_array(timeout=1000)
+        stats = cam.stream_stats()
+        cam.close()
+        self.assertEqual(stats["buffer_count"], 37)
+        self.assertEqual(stats["handling_mode"], "OldestFirst")
+        self.assertGreaterEqual(stats["delivered_buffers"], 5)
+        self.assertEqual(stats["failed_buffers"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+""" Per-frame latency tracing across the acquisition pipeline.
+
+When tracing is enabled, AcquisitionLoop and Writer stamp each frame with
+time.monotonic_ns() at every stage, and append the stamps to a compact binary
+trace file per camera and process:
+
+    {name}.{serial}.trace.acquisition.bin : frame, grab_start, grab, enqueue
+    {name}.{serial}.trace.writer.bin      : frame, dequeue, encode, write
+
+Both processes use the same (system wide) monotonic clock, so the two files
+can be joined on the frame index to find where time is spent. Summarize a
+recording with:
+
+    python -m multicamera_acquisition.tracing /path/to/recording
+"""
+
+import json
+import struct
+import sys
+from pathlib import Path
+
+import numpy as np
+
+ACQUISITION_STAGES = ("grab_start", "grab", "enqueue")
+WRITER_STAGES = ("dequeue", "encode", "write")
+
+# latency of each stage, as (stage name, start stamp, end stamp)
+STAGE_LATENCIES = (
+    ("grab", "grab_start", "grab"),  # time blocked in the camera SDK
+    ("enqueue", "grab", "enqueue"),  # putting the frame on the write queue
+    ("ipc", "enqueue", "dequeue"),  # waiting in the queue
+    ("encode", "dequeue", "encode"),  # metadata and encoding
+    ("write", "encode", "write"),  # handing the encoded frame to the file
+    ("total", "grab", "write"),
+)
+
+_MAGIC = b"MCTRACE1"
+
+
+class FrameTracer(object):
+    """Buffers per-frame stage stamps and appends them to a binary file.
+
+    The file starts with an 8 byte magic string, a uint32 header length and a
+    JSON header naming the stages, followed by fixed size int64 records.
+    """
+
+    def __init__(self, file_name, stages, buffer_frames=4096):
+        """
+        Parameters
+        ----------
+        file_name : str or Path
+            The trace file, which is overwritten.
+        stages : tuple of str
+            Names of the stamps recorded for each frame.
+        buffer_frames : int (default: 4096)
+            Number of records held in memory between writes.
+        """
+        self.file_name = Path(file_name)
+        self.stages = tuple(stages)
+        self.dtype = np.dtype([("frame", "<i8")] + [(s, "<i8") for s in self.stages])
+        self.buffer = np.zeros(buffer_frames, dtype=self.dtype)
+        self.n_buffered = 0
+        self.file = open(self.file_name, "wb")
+        header = json.dumps({"stages": self.stages}).encode("utf-8")
+        self.file.write(_MAGIC + struct.pack("<I", len(header)) + header)
+
+    def record(self, frame, *stamps):
+        """Record the stamps of one frame, in the order of `stages`."""
+        self.buffer[self.n_buffered] = (frame,) + stamps
+        self.n_buffered += 1
+        if self.n_buffered == len(self.buffer):
+            self.flush()
+
+    def flush(self):
+        """Write buffered records to the file."""
+        if self.n_buffered > 0:
+            self.file.write(self.buffer[: self.n_buffered].tobytes())
+            self.n_buffered = 0
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+def read_trace(file_name):
+    """Read a trace file written by FrameTracer.
+
+    Returns
+    -------
+    trace : numpy structured array
+        One record per frame, with a 'frame' field and one field per stage.
+    """
+    with open(file_name, "rb") as f:
+        if f.read(len(_MAGIC)) != _MAGIC:
+            raise ValueError(f"{file_name} is not a trace file")
+        (header_len,) = struct.unpack("<I", f.read(4))
+        stages = json.loads(f.read(header_len).decode("utf-8"))["stages"]
+        dtype = np.dtype([("frame", "<i8")] + [(s, "<i8") for s in stages])
+        data = f.read()
+    n_records = len(data) // dtype.itemsize
+    return np.frombuffer(data[: n_records * dtype.itemsize], dtype=dtype)
+
+
+def join_traces(acquisition_trace, writer_trace):
+    """Join acquisition and writer traces on the frame index.
+
+    Returns
+    -------
+    stamps : dict of numpy arrays
+        One array of stamps per stage, for frames present in both traces.
+    """
+    _, acq_idx, writer_idx = np.intersect1d(
+        acquisition_trace["frame"], writer_trace["frame"], return_indices=True
+    )
+    stamps = {"frame": acquisition_trace["frame"][acq_idx]}
+    for stage in acquisition_trace.dtype.names[1:]:
+        stamps[stage] = acquisition_trace[stage][acq_idx]
+    for stage in writer_trace.dtype.names[1:]:
+        stamps[stage] = writer_trace[stage][writer_idx]
+    return stamps
+
+
+def summarize_latencies(stamps):
+    """Compute p50 / p99 / max latency (in ms) of each pipeline stage.
+
+    Parameters
+    ----------
+    stamps : dict of numpy arrays
+        As returned by `join_traces`.
+
+    Returns
+    -------
+    summary : dict
+        {stage: {'p50': ms, 'p99': ms, 'max': ms, 'n': frames}}
+    """
+    summary = {}
+    for stage, start, end in STAGE_LATENCIES:
+        if start not in stamps or end not in stamps or len(stamps[start]) == 0:
+            continue
+        latency_ms = (stamps[end] - stamps[start]) / 1e6
+        summary[stage] = {
+            "p50": float(np.percentile(latency_ms, 50)),
+            "p99": float(np.percentile(latency_ms, 99)),
+            "max": float(np.max(latency_ms)),
+            "n": int(len(latency_ms)),
+        }
+    return summary
+
+
+def summarize_recording(save_location):
+    """Summarize the latency traces of every camera in a recording.
+
+    Returns
+    -------
+    summaries : dict
+        {camera: summary}, see `summarize_latencies`.
+    """
+    summaries = {}
+    for acquisition_file in sorted(Path(save_location).glob("*.trace.acquisition.bin")):
+        camera = acquisition_file.name[: -len(".trace.acquisition.bin")]
+        acquisition_trace = read_trace(acquisition_file)
+        for stream in [camera, f"{camera}.depth"]:
+            writer_file = Path(save_location) / f"{stream}.trace.writer.bin"
+            if not writer_file.exists():
+                continue
+            stamps = join_traces(acquisition_trace, read_trace(writer_file))
+            summaries[stream] = summarize_latencies(stamps)
+    return summaries
+
+
+def print_summary(summaries):
+    for stream, summary in summaries.items():
+        print(stream)
+        print(f"  {'stage':<8} {'p50 ms':>10} {'p99 ms':>10} {'max ms':>10} {'frames':>8}")
+        for stage, stats in summary.items():
+            print(
+                f"  {stage:<8} {stats['p50']:>10.3f} {stats['p99']:>10.3f} "
+                f"{stats['max']:>10.3f} {stats['n']:>8d}"
+            )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python -m multicamera_acquisition.tracing [recording directory]")
+        sys.exit(1)
+    print_summary(summarize_recording(sys.argv[1]))
@@ -0,0 +1,286 @@
+""" Buffered logging of arduino input (trigger) events.
+
+The arduino reports the state of its input pins with each pulse as a line
+
+    input: {flag_0},{flag_1},...,{pulse_id},{arduino_ms}
+
+TriggerDataLogger parses each line once (with parse_input_line from
+interfaces/arduino.py), checks that its values are integers, keeps the
+output file open and writes events in batches, on an interval and at
+shutdown, so logging never holds up the serial read loop. Events are written
+either as the csv read by the analysis code (pulse_id, arduino_ms, flag_0,
+...) or as fixed-width binary records (see metadata_store.py).
+"""
+
+import csv
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+
+from multicamera_acquisition.interfaces.arduino import parse_input_line
+from multicamera_acquisition.metadata_store import MetadataStore
+
+
+def trigger_columns(n_input_states):
+    """Binary record layout of a trigger event."""
+    return (
+        ("pulse_id", "<i8"),
+        ("arduino_ms", "<i8"),
+        ("host_monotonic_ns", "<i8"),
+    ) + tuple((f"flag_{i}", "<i8") for i in range(n_input_states))
+
+
+class TriggerDataLogger(object):
+    """Writes arduino input events to a file in batches."""
+
+    def __init__(
+        self,
+        file_name,
+        n_input_states,
+        file_format="csv",
+        buffer_events=4096,
+        flush_interval_s=1.0,
+    ):
+        """
+        Parameters
+        ----------
+        file_name : str or Path
+            The trigger data file, which is overwritten. With the binary
+            format its suffix is replaced by .bin.
+        n_input_states : int
+            Number of input pins reported with each event. Events reporting
+            another number of states are padded with zeros or trimmed to
+            this many (and counted as 'mismatched').
+        file_format : str (default: 'csv')
+            'csv' or 'binary'.
+        buffer_events : int (default: 4096)
+            Events are written once this many are buffered...
+        flush_interval_s : float (default: 1.0)
+            ...or once the oldest buffered event is this old.
+        """
+        if file_format not in ["csv", "binary"]:
+            raise ValueError("file_format must be 'csv' or 'binary'")
+        self.file_format = file_format
+        self.n_input_states = n_input_states
+        self.buffer_events = buffer_events
+        self.flush_interval_s = flush_interval_s
+        self.n_events = 0
+        self.n_malformed = 0
+        self.n_mismatched = 0
+        self._first_event = None
+        self._last_event = None
+        self._second = None
+        self._events_this_second = 0
+        self.peak_events_per_s = 0
+
+        file_name = Path(file_name)
+        if file_format == "binary":
+            self.file_name = file_name.with_suffix(".bin")
+            self.store = MetadataStore(
+                self.file_name,
+                columns=trigger_columns(n_input_states),
+                buffer_rows=buffer_events,
+                flush_interval_s=flush_interval_s,
+            )
+            self.file = None
+        else:
+            self.file_name = file_name
+            self.store = None
+            self.file = open(self.file_name, "w", newline="")
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(
+                ["pulse_id", "arduino_ms"] + [f"flag_{i}" for i in range(n_input_states)]
+            )
+            self.file.flush()
+            self.rows = []
+            self._last_flush = time.monotonic()
+
+    def log_line(self, line):
+        """Log a line from the arduino if it is an input event.
+
+        Input lines that cannot be parsed are counted as malformed.
+
+        Returns
+        -------
+        logged : bool
+        """
+        try:
+            event = parse_input_line(line)
+        except ValueError:
+            self.n_malformed += 1
+            return False
+        if event is None:
+            return False
+        pulse_id, arduino_ms, states = event
+        return self.log(pulse_id, arduino_ms, states)
+
+    def log(self, pulse_id, arduino_ms, states, host_monotonic_ns=None):
+        """Log one event.
+
+        Parameters
+        ----------
+        pulse_id, arduino_ms : int or str
+        states : list of int or str
+            One state per input pin.
+        host_monotonic_ns : int (default: None)
+            When the event was read from the serial port. Defaults to now.
+
+        Returns
+        -------
+        logged : bool
+            False if a value is not an integer; the event is then counted as
+            malformed and not written.
+        """
+        now = time.monotonic_ns() if host_monotonic_ns is None else host_monotonic_ns
+        self._count(now)
+        states = list(states)
+        if len(states) != self.n_input_states:
+            self._mismatch(len(states), 1)
+            states = (states + [0] * self.n_input_states)[: self.n_input_states]
+        try:
+            pulse_id, arduino_ms = int(pulse_id), int(arduino_ms)
+            states = [int(s) for s in states]
+        except (ValueError, TypeError):
+            self.n_malformed += 1
+            return False
+        if self.store is not None:
+            self.store.append(pulse_id, arduino_ms, now, *states)
+            return True
+        self.rows.append([pulse_id, arduino_ms] + states)
+        if (
+            len(self.rows) >= self.buffer_events
+            or time.monotonic() - self._last_flush > self.flush_interval_s
+        ):
+            self.flush()
+        return True
+
+    def log_batch(self, pulse_ids, arduino_ms, states, host_monotonic_ns=None):
+        """Log several events at once, e.g. parsed from binary records.
+
+        Parameters
+        ----------
+        pulse_ids, arduino_ms : array-like of int, shape (n_events,)
+        states : array-like of int, shape (n_events, n_input_states)
+        host_monotonic_ns : int (default: None)
+            When the events were read from the serial port. Defaults to now.
+        """
+        now = time.monotonic_ns() if host_monotonic_ns is None else host_monotonic_ns
+        pulse_ids = np.asarray(pulse_ids, dtype=np.int64)
+        if len(pulse_ids) == 0:
+            return
+        self._count(now, len(pulse_ids))
+        states = np.asarray(states, dtype=np.int64).reshape(len(pulse_ids), -1)
+        if states.shape[1] != self.n_input_states:
+            self._mismatch(states.shape[1], len(pulse_ids))
+            fitted = np.zeros((len(pulse_ids), self.n_input_states), dtype=np.int64)
+            n_states = min(states.shape[1], self.n_input_states)
+            fitted[:, :n_states] = states[:, :n_states]
+            states = fitted
+        if self.store is not None:
+            columns = {
+                "pulse_id": pulse_ids,
+                "arduino_ms": arduino_ms,
+                "host_monotonic_ns": now,
+            }
+            for i in range(self.n_input_states):
+                columns[f"flag_{i}"] = states[:, i]
+            self.store.extend(columns)
+            return
+        self.rows += np.column_stack([pulse_ids, arduino_ms, states]).tolist()
+        if (
+            len(self.rows) >= self.buffer_events
+            or time.monotonic() - self._last_flush > self.flush_interval_s
+        ):
+            self.flush()
+
+    def _mismatch(self, n_states, n_events):
+        if self.n_mismatched == 0:
+            logging.log(
+                logging.WARNING,
+                f"Arduino reported {n_states} input states instead of "
+                f"{self.n_input_states}, the trigger data is padded or trimmed",
+            )
+        self.n_mismatched += n_events
+
+    def _count(self, now, n_events=1):
+        if self._first_event is None:
+            self._first_event = now
+        self._last_event = now
+        self.n_events += n_events
+        second = now // 1_000_000_000
+        if second != self._second:
+            self._second = second
+            self._events_this_second = 0
+        self._events_this_second += n_events
+        self.peak_events_per_s = max(self.peak_events_per_s, self._events_this_second)
+
+    def flush(self):
+        """Write buffered events to the file."""
+        if self.store is not None:
+            self.store.flush()
+            return
+        if len(self.rows) > 0:
+            self.writer.writerows(self.rows)
+            self.rows = []
+        self.file.flush()
+        self._last_flush = time.monotonic()
+
+    def stats(self):
+        """Events logged and the rate sustained.
+
+        Returns
+        -------
+        stats : dict
+            'events', 'malformed', 'mismatched' (events with the wrong
+            number of input states), 'duration_s', 'events_per_s' (mean, from
+            the first to the last event) and 'peak_events_per_s' (most events
+            in one second).
+        """
+        duration_s = 0.0
+        if self._first_event is not None:
+            duration_s = (self._last_event - self._first_event) / 1e9
+        return {
+            "events": self.n_events,
+            "malformed": self.n_malformed,
+            "mismatched": self.n_mismatched,
+            "duration_s": duration_s,
+            "events_per_s": self.n_events / duration_s if duration_s > 0 else 0.0,
+            "peak_events_per_s": self.peak_events_per_s,
+        }
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+        elif not self.file.closed:
+            self.flush()
+            self.file.close()
+        stats = self.stats()
+        logging.log(
+            logging.INFO,
+            f"Trigger data: {stats['events']} events in {stats['duration_s']:.1f} s "
+            f"({stats['events_per_s']:.0f}/s mean, {stats['peak_events_per_s']}/s peak)",
+        )
+
+
+def read_trigger_data(file_name):
+    """Read a trigger data file (csv or binary) into numpy arrays.
+
+    Returns
+    -------
+    columns : dict of numpy arrays
+        'pulse_id', 'arduino_ms' and 'flag_{i}' (plus 'host_monotonic_ns'
+        for binary files).
+    """
+    file_name = Path(file_name)
+    if file_name.suffix == ".bin":
+        from multicamera_acquisition.metadata_store import read_metadata
+
+        return read_metadata(file_name)
+    with open(file_name, "r") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = [row for row in reader if len(row) == len(header)]
+    data = np.array(rows, dtype=np.int64).reshape(len(rows), len(header))
+    return {name: data[:, i] for i, name in enumerate(header)}
@@ -1,13 +1,14 @@
 import subprocess
 import numpy as np
-import av
 import os
 import datetime
-import cv2
 import logging
+from multicamera_acquisition.async_sink import AsyncFileSink
 
 
 def count_frames(file_name):
+    import av
+
     if os.path.exists(file_name):
         try:
             with av.open(file_name, "r") as reader:
@@ -130,6 +131,7 @@ def write_frame(
     gpu=None,
     pipe=None,
     depth=False,
+    async_write=True,
 ):
     """
     Write frames to a video file.
@@ -145,6 +147,10 @@ def write_frame(
     gpu: int (default=False)
         Which GPU to use for encoding. If None, the CPU is used.
     pipe (subprocess.Popen, optional): The current pipe to write frames. If None, creates a pipe. Defaults to None.
+    async_write : bool (default: True)
+        If True, frames are written to the pipe from a background thread
+        (`pipe.sink`), so a slow ffmpeg does not block the caller, with at
+        most 100 ms delay. Close the pipe with `close_pipe`.
 
     Returns
     -------
@@ -178,15 +184,27 @@ def write_frame(
                 stdout=f_out,  # standard output is redirected to 'stdout.txt'
                 stderr=f_err,  # standard error is redirected to 'stderr.txt'
             )
+        # ffmpeg gets the frames at least every 100 ms, not in 8 MB bursts
+        pipe.sink = AsyncFileSink(pipe.stdin, max_delay_s=0.1) if async_write else None
+
+    sink = getattr(pipe, "sink", None)
 
     try:
         if pixel_format == "gray8":
             # Convert the frame to uint8 and write it to the pipe's stdin
             # additionally, convert to yuv444p/yuv420 format
-            pipe.stdin.write(frame.astype(np.uint8).tobytes())
+            data = np.ascontiguousarray(frame, dtype=np.uint8)
         elif pixel_format == "gray16":
             # Convert the frame to uint16 and write it to the pipe's stdin
-            pipe.stdin.write(frame.astype(np.uint16).tobytes())
+            data = np.ascontiguousarray(frame, dtype=np.uint16)
+        else:
+            data = None
+        if data is not None:
+            if sink is not None:
+                # copied into the sink's buffer, written on its thread
+                sink.write(data)
+            else:
+                pipe.stdin.write(data.tobytes())
     except BrokenPipeError as e:
         logging.log(
             logging.WARNING,
@@ -200,6 +218,24 @@ def write_frame(
     return pipe
 
 
+def close_pipe(pipe):
+    """Flush any pending frames and close a pipe created by `write_frame`."""
+    sink = getattr(pipe, "sink", None)
+    try:
+        if sink is not None:
+            sink.close()
+    except BrokenPipeError as e:
+        logging.log(
+            logging.WARNING,
+            f"BrokenPipeError. Are video files >5GB & FAT32? Check STDERR {e}.",
+        )
+    finally:
+        try:
+            pipe.stdin.close()
+        except BrokenPipeError:
+            pass
+
+
 def read_frames(
     filename,
     frames,
@@ -0,0 +1,142 @@
+""" In-process video encoding with PyAV.
+
+An alternative to the ffmpeg subprocess pipe in video_io_ffmpeg: frames are
+encoded by libavcodec inside the writing process (with frame / slice
+threading), straight from the numpy array, and muxed into a proper container.
+This avoids the `tobytes()` copy and the kernel pipe hop of `write_frame`.
+"""
+
+import logging
+from fractions import Fraction
+
+import av
+import numpy as np
+
+
+class PyAVWriter(object):
+    """Encodes grayscale frames into a video file.
+
+    By default 8 bit frames are encoded with libx264 (yuv420p) and 16 bit
+    frames losslessly with ffv1 (gray16le). With codec='ffv1', 8 bit frames
+    are also encoded losslessly (gray).
+    """
+
+    def __init__(
+        self,
+        filename,
+        fps,
+        pixel_format="gray8",
+        quality=15,
+        codec=None,
+        threads=0,
+        preset="ultrafast",
+        slices=16,
+    ):
+        """
+        Parameters
+        ----------
+        filename : str or Path
+            The video file. The container format follows the extension (.mp4,
+            .avi, .mkv...).
+        fps : float
+            The frame rate of the video.
+        pixel_format : str (default: 'gray8')
+            'gray8' or 'gray16'.
+        quality : int (default: 15)
+            crf for libx264 (0-51, lower is better). Ignored for ffv1.
+        codec : str (default: None)
+            Override the codec ('libx264' for gray8, 'ffv1' for gray16).
+        threads : int (default: 0)
+            Number of encoder threads, 0 lets libavcodec decide.
+        preset : str (default: 'ultrafast')
+            libx264 preset.
+        slices : int (default: 16)
+            Number of ffv1 slices per frame.
+        """
+        if pixel_format in ["gray8", "grey8"]:
+            self.dtype = np.uint8
+            codec = "libx264" if codec is None else codec
+        elif pixel_format in ["gray16", "grey16"]:
+            self.dtype = np.uint16
+            codec = "ffv1" if codec is None else codec
+        else:
+            raise ValueError(f"Unsupported pixel format {pixel_format}")
+
+        if codec == "ffv1":
+            # lossless, with slices so that frames are encoded in parallel
+            stream_pix_fmt = "gray" if self.dtype == np.uint8 else "gray16le"
+            options = {"level": "3", "slices": str(slices), "slicecrc": "1"}
+        else:
+            stream_pix_fmt = "yuv420p"
+            options = {"preset": preset, "crf": str(quality)}
+
+        self.filename = str(filename)
+        self.pixel_format = pixel_format
+        self.codec = codec
+        self.container = av.open(self.filename, "w")
+        self.stream = self.container.add_stream(
+            codec, rate=Fraction(fps).limit_denominator(1001)
+        )
+        self.stream.pix_fmt = stream_pix_fmt
+        self.stream_pix_fmt = stream_pix_fmt
+        self.stream.options = options
+        self.stream.thread_type = "AUTO"
+        self.stream.thread_count = threads
+        self.frame_count = 0
+        self.closed = False
+        logging.log(
+            logging.DEBUG,
+            f"PyAV writer: {self.filename} ({codec}, {stream_pix_fmt}, {options})",
+        )
+
+    def _open_stream(self, frame):
+        self.stream.height, self.stream.width = frame.shape[:2]
+
+    def _to_video_frame(self, frame):
+        if self.frame_count == 0:
+            self._open_stream(frame)
+        if self.stream_pix_fmt != "yuv420p":
+            video_frame = av.VideoFrame.from_ndarray(
+                np.asarray(frame, dtype=self.dtype), format=self.stream_pix_fmt
+            )
+        else:
+            # write the luma plane directly and leave chroma grey, which
+            # skips the swscale conversion from gray to yuv420p
+            height, width = frame.shape[:2]
+            video_frame = av.VideoFrame(width, height, "yuv420p")
+            luma = video_frame.planes[0]
+            np.copyto(
+                np.frombuffer(luma, np.uint8).reshape(height, luma.line_size)[:, :width],
+                frame,
+                casting="unsafe",
+            )
+            for chroma in video_frame.planes[1:]:
+                np.frombuffer(chroma, np.uint8).fill(128)
+        video_frame.pts = self.frame_count
+        return video_frame
+
+    def encode(self, frame):
+        """Encode a frame (2D numpy array) and return the resulting packets."""
+        packets = self.stream.encode(self._to_video_frame(frame))
+        self.frame_count += 1
+        return packets
+
+    def mux(self, packets):
+        """Write encoded packets to the container."""
+        for packet in packets:
+            self.container.mux(packet)
+
+    def write(self, frame):
+        self.mux(self.encode(frame))
+
+    def close(self):
+        """Flush the encoder and close the file."""
+        if self.closed:
+            return
+        self.closed = True
+        if self.frame_count > 0:
+            self.mux(self.stream.encode(None))
+        self.container.close()
+        logging.log(
+            logging.DEBUG, f"PyAV writer closed: {self.filename}, {self.frame_count} frames"
+        )
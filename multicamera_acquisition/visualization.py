@@ -1,14 +1,13 @@
 import multiprocessing as mp
 
-import tkinter as tk
-import PIL
-from PIL import Image, ImageTk
-import cv2
 import numpy as np
 import logging
 import time
-import matplotlib.pyplot as plt
-import pandas as pd
+
+from multicamera_acquisition.affinity import apply_process_settings
+
+# tkinter, PIL, cv2, matplotlib and pandas are slow to import (and may not be
+# installed on acquisition hosts), so they are imported where they are used
 
 def get_latest(queue, timeout=0.1):
     start_time = time.time()
@@ -41,6 +40,7 @@ class MultiDisplay(mp.Process):
         display_downsample=4,
         cameras_per_row=3,
         display_size=(300, 300),
+        cpu_affinity=None,
     ):
         super().__init__()
         self.pipe = None
@@ -51,9 +51,16 @@ class MultiDisplay(mp.Process):
         self.cameras_per_row = cameras_per_row
         self.display_size = display_size
         self.display_ranges = display_ranges
+        self.cpu_affinity = cpu_affinity
 
     def run(self):
         """Displays an image to a window."""
+        if self.cpu_affinity is not None:
+            apply_process_settings(cpu_affinity=self.cpu_affinity)
+        import tkinter as tk
+        import PIL
+        from PIL import Image, ImageTk
+        import cv2
 
         root = tk.Tk()
         xdim = self.display_size[0] * self.cameras_per_row
@@ -166,6 +173,8 @@ def normalize_array(frame, min_value=None, max_value=None):
 
 
 def plot_video_stats(csv_path, name):
+    import matplotlib.pyplot as plt
+    import pandas as pd
 
     # Load the data
     df = pd.read_csv(csv_path)
@@ -5,9 +5,9 @@ from multicamera_acquisition.interfaces.arduino import (
     packIntAsLong,
     wait_for_serial_confirmation,
 )
-from multicamera_acquisition.visualization import MultiDisplay
 
 import multiprocessing as mp
+import contextlib
 import csv
 import warnings
 import time
@@ -21,7 +21,15 @@ import numpy as np
 import serial
 from pathlib2 import Path
 from multicamera_acquisition.video_io_ffmpeg import count_frames
-import PyNvCodec as nvc
+from multicamera_acquisition.tracing import FrameTracer, WRITER_STAGES
+from multicamera_acquisition.drop_monitor import DropDetector
+from multicamera_acquisition.affinity import apply_process_settings
+from multicamera_acquisition.metadata_store import MetadataStore, NO_TIMESTAMP
+from multicamera_acquisition.encoders import (
+    open_encoder,
+    resolve_encoders,
+    grey2nv12,
+)
 
 # for reference only
 NVIDIA_SETTINGS = """
@@ -76,13 +84,78 @@ class Writer(mp.Process):
         ffmpeg_options,
         max_video_frames=60 * 60,
         depth=False,
+        trace_file=None,
+        drop_counters=None,
+        drop_log_file=None,
+        encoder=None,
+        encoder_fallback=True,
+        metadata_format="csv",
+        cpu_affinity=None,
     ):
+        """
+        Parameters
+        ----------
+        queue : multiprocessing.Queue or SharedMemoryRingBuffer
+            The queue from which (img, camera_timestamp, frame) tuples are read.
+            An empty tuple ends the recording.
+        video_file_name : Path
+            The video file to write.
+        metadata_file_name : Path
+            The csv file to which per-frame metadata is written (with a .bin
+            suffix if metadata_format is 'binary').
+        camera_serial, camera_name, camera_brand : str
+            Identify the camera.
+        fps : int
+            The frame rate of the video.
+        ffmpeg_options : dict
+            Encoder options, e.g. 'gpu' and 'quality'.
+        max_video_frames : int (default: 60 * 60)
+            After this many frames, a new video file is started.
+        depth : bool (default: False)
+            If True, frames are written as 16 bit video.
+        trace_file : str or Path (default: None)
+            If not None, per-frame dequeue, encode and write times are written
+            to this file (see tracing.py).
+        drop_counters : DropCounters (default: None)
+            If not None, dropped frames are detected from the camera
+            timestamps while writing, and counted under camera_name.
+        drop_log_file : str or Path (default: None)
+            If not None (and drop_counters is given), each gap in the camera
+            timestamps is appended to this csv file as it is detected.
+        encoder : str or list of str (default: None)
+            The encoder backend(s) to use, in order of preference (see
+            encoders.py). By default 8 bit video is encoded with NVENC and 16
+            bit video with an ffmpeg subprocess.
+        encoder_fallback : bool (default: True)
+            If True, fall back to the default backends when the chosen ones
+            are not available.
+        metadata_format : str (default: 'csv')
+            'csv' writes one formatted row per frame. 'binary' writes fixed
+            width records (see metadata_store.py), which are cheaper to write
+            and read.
+        cpu_affinity : list of int or str (default: None)
+            If not None, the cpus the writer (and its ffmpeg subprocess) run on
+            (see affinity.py).
+        """
         super().__init__()
-        self.pipe = None
         self.queue = queue
+        # set once the queue is empty and every file is closed
+        self.finalized = mp.Event()
+        self.frames_written = mp.Value("q", 0, lock=False)
+        # bytes waiting to be written by the encoder's sink, mirrored from run
+        self._pending_bytes = mp.Value("q", 0, lock=False)
+        self._peak_pending_bytes = mp.Value("q", 0, lock=False)
+        # the backend that was opened, set in run
+        self._encoder_name = mp.Array("c", 32, lock=False)
         self.video_file_name = video_file_name
         self.ffmpeg_options = ffmpeg_options
+        if metadata_format not in ["csv", "binary"]:
+            raise ValueError("metadata_format must be 'csv' or 'binary'")
+        if metadata_format == "binary":
+            metadata_file_name = metadata_file_name.with_suffix(".bin")
         self.metadata_file_name = metadata_file_name
+        self.metadata_format = metadata_format
+        self.metadata_store = None
         self.camera_name = camera_name
         self.camera_serial = camera_serial
         self.orig_stem = self.video_file_name.stem
@@ -91,22 +164,32 @@ class Writer(mp.Process):
         self.camera_brand = camera_brand
         self.fps = fps
         self.depth = depth
-        self.encFrame = np.ndarray(shape=(0), dtype=np.uint8)
-        self.encFile = None
-        if (camera_brand == "azure") & (depth == True):
+        self.video_encoder = None
+        self.trace_file = trace_file
+        self.cpu_affinity = cpu_affinity
+        self.tracer = None
+        self.drop_counters = drop_counters
+        self.drop_log_file = drop_log_file
+        self.drop_detector = None
+        self._t_encode = 0
+        self._t_write = 0
+        if depth == True:
+            # azure depth, lucid and 16 bit synthetic cameras
             self.pixel_format = "gray16"
         elif (camera_brand == "lucid"):
             self.pixel_format = "gray16"
         else:
             self.pixel_format = "gray8"
-
-        # placeholder for nv12 image
-        self.img_dims = None
-        self.nv12_placeholder = None
+        self.encoder_names = resolve_encoders(
+            encoder, self.pixel_format, fallback=encoder_fallback
+        )
 
         self.initialize_metadata()
 
     def initialize_metadata(self):
+        if self.metadata_format == "binary":
+            # the header is written when the store is opened in run
+            return
         with open(self.metadata_file_name, "w") as metadata_f:
             metadata_writer = csv.writer(metadata_f)
             metadata_writer.writerow(
@@ -115,15 +198,34 @@ class Writer(mp.Process):
 
     def run(self):
         frame_id = 0
-        with open(self.metadata_file_name, "a") as metadata_f:
-            metadata_writer = csv.writer(metadata_f)
+        if self.cpu_affinity is not None:
+            apply_process_settings(cpu_affinity=self.cpu_affinity)
+        if self.trace_file is not None:
+            self.tracer = FrameTracer(self.trace_file, WRITER_STAGES)
+        if self.drop_counters is not None:
+            self.drop_detector = DropDetector(
+                log_file=self.drop_log_file,
+                counters=self.drop_counters,
+                counter_index=self.drop_counters.index(self.camera_name),
+                camera_name=self.camera_name,
+            )
+        if self.metadata_format == "binary":
+            self.metadata_store = MetadataStore(self.metadata_file_name)
+            metadata_f = contextlib.nullcontext()
+        else:
+            metadata_f = open(self.metadata_file_name, "a")
+        with metadata_f:
+            if self.metadata_store is None:
+                metadata_writer = csv.writer(metadata_f)
             while True:
                 data = self.queue.get()
+                if self.tracer is not None:
+                    t_dequeue = time.monotonic_ns()
                 if len(data) == 0:
                     break
                 else:
                     # get the computer datetime of the frame
-                    frame_image_uid = str(round(time.time(), 5)).zfill(5)
+                    host_time = time.time()
                     img, camera_timestamp, current_frame = data
 
                     qsize = self.queue.qsize()
@@ -131,12 +233,29 @@ class Writer(mp.Process):
                     # if the frame is corrupted
                     if img is None:
                         continue
-                    metadata_writer.writerow(
-                        [current_frame, camera_timestamp, frame_image_uid, str(qsize)]
-                    )
+                    if self.metadata_store is not None:
+                        self.metadata_store.append(
+                            current_frame,
+                            NO_TIMESTAMP if camera_timestamp is None else camera_timestamp,
+                            host_time,
+                            time.monotonic_ns(),
+                            qsize,
+                        )
+                    else:
+                        frame_image_uid = str(round(host_time, 5)).zfill(5)
+                        metadata_writer.writerow(
+                            [current_frame, camera_timestamp, frame_image_uid, str(qsize)]
+                        )
+                    if self.drop_detector is not None:
+                        self.drop_detector.update(camera_timestamp, current_frame)
                     self.append(img, frame_id)
+                    if self.tracer is not None:
+                        self.tracer.record(
+                            current_frame, t_dequeue, self._t_encode, self._t_write
+                        )
 
                     frame_id += 1
+                    self.frames_written.value += 1
 
                     # if the current frame is greater than the max, create a new video and metadata file
                     if frame_id > self.max_video_frames:
@@ -148,103 +267,88 @@ class Writer(mp.Process):
                         logging.log(
                             logging.DEBUG, f"Creating new file self.video_file_name"
                         )
-                        self.pipe = None
+                        self.video_encoder = None
                         frame_id = 0
 
             logging.log(logging.DEBUG, f"Closing writer pipe ({self.camera_name})")
             self.close()
+            if self.tracer is not None:
+                self.tracer.close()
+            if self.drop_detector is not None:
+                self.drop_detector.close()
+            if self.metadata_store is not None:
+                self.metadata_store.close()
 
+        self.finalized.set()
         logging.log(logging.DEBUG, f"Writer run finished ({self.camera_name})")
 
     def append(self, data, frame_id):
         # logging.log(logging.DEBUG, f"frame ({data.shape, data.dtype})")
-        if self.pixel_format == "gray8":
-            data = data.astype(np.uint8)
-            if not self.pipe:
-                encoder_dictionary = {
-                    "preset": "P1",  # P1 is fastest, P7 is slowest
-                    "codec": "h264",  # "hevc",
-                    "s": f"{data.shape[1]}x{data.shape[0]}",
-                    "profile": "high",  # "baseline",
-                    "fps": str(int(self.fps)),
-                    "multipass": "0",  # "fullres",  # "0",
-                    "tuning_info": "ultra_low_latency",
-                    "fmt": "YUV420",
-                    # "lookahead": "1", # how far to look ahead (more is slower but better quality)
-                    # "gop": "15", # larger = faster
-                }
-                logging.log(logging.DEBUG, f"encoder dict ({encoder_dictionary})")
-
-                self.pipe = nvc.PyNvEncoder(
-                    encoder_dictionary,
-                    gpu_id=self.ffmpeg_options["gpu"],
-                    format=nvc.PixelFormat.NV12,
-                )
-                self.encFile = open(self.video_file_name, "wb")
-                logging.log(logging.DEBUG, f"Pipe created")
-
-            # convert to nv12, which is dims X by Y*1.5
-            if self.nv12_placeholder is None:
-                nv12_array = grey2nv12(data)
-                self.img_dims = data.shape
-                self.nv12_placeholder = nv12_array
-            else:
-                nv12_array = self.nv12_placeholder
-                nv12_array[: self.img_dims[0], : self.img_dims[1]] = data
-
-            try:
-                success = self.pipe.EncodeSingleFrame(
-                    nv12_array, self.encFrame, sync=False
-                )
-            except Exception as e:
-                success = False
-                logging.log(logging.DEBUG, f"failed to create frame: {e}")
-
-            if success:
-                encByteArray = bytearray(self.encFrame)
-                self.encFile.write(encByteArray)
-
-        else:
-            # write 16 bit images using ffmpeg
-            self.pipe = write_frame(
-                self.video_file_name,
+        if self.video_encoder is None:
+            # the writer's frame rate takes precedence
+            options = {k: v for k, v in self.ffmpeg_options.items() if k != "fps"}
+            self.video_encoder = open_encoder(
+                self.encoder_names,
                 data,
-                fps=self.fps,
-                pipe=self.pipe,
-                depth=self.depth,
+                self.video_file_name,
+                self.fps,
                 pixel_format=self.pixel_format,
-                **self.ffmpeg_options,
+                depth=self.depth,
+                **options,
             )
+            # keep using the same backend for the following files
+            self.encoder_names = self.encoder_names[
+                self.encoder_names.index(self.video_encoder.name) :
+            ]
+            self.video_file_name = self.video_encoder.video_file_name
+            self._encoder_name.value = self.video_encoder.name.encode()
 
-    def close(self):
-        # indicate that no more data will be written
-        # if self.pipe is not None:
-        #    self.pipe.stdin.close()
-        if self.pixel_format == "gray8":
-            if self.encFile is not None:
-                if not self.encFile.closed:
-                    self.encFile.close()
-        else:
-            if self.pipe is not None:
-                self.pipe.stdin.close()
-        logging.log(logging.DEBUG, f"Writer pipe closed ({self.camera_name})")
+        payload = self.video_encoder.encode(data)
+        if self.tracer is not None:
+            self._t_encode = time.monotonic_ns()
+        self.video_encoder.write(payload)
+        if self.tracer is not None:
+            self._t_write = time.monotonic_ns()
+        self._pending_bytes.value = self.video_encoder.pending_bytes
+        self._peak_pending_bytes.value = max(
+            self._peak_pending_bytes.value, self.video_encoder.peak_pending_bytes
+        )
 
+    @property
+    def pending_bytes(self):
+        """Bytes handed to the file (or ffmpeg pipe) but not yet written, as of
+        the last frame. Can be read from any process."""
+        return self._pending_bytes.value
 
-def grey2nv12(frame):
-    """Convert greyscale image to nv12"""
-    # Convert grayscale to Y channel in YUV
-    Y = frame.astype(np.uint8)
+    @property
+    def peak_pending_bytes(self):
+        """The most bytes that have been waiting to be written at once. Can be
+        read from any process."""
+        return self._peak_pending_bytes.value
 
-    # U and V channels are set to 128 (for a grayscale image, chroma channels remain constant)
-    U = np.full((frame.shape[0] // 2, frame.shape[1] // 2), 128, dtype=np.uint8)
-    V = np.full((frame.shape[0] // 2, frame.shape[1] // 2), 128, dtype=np.uint8)
+    @property
+    def encoder_name(self):
+        """The encoder backend in use, or None before the first frame. Can be
+        read from any process."""
+        name = self._encoder_name.value.decode()
+        return name if len(name) > 0 else None
 
-    # Interleave U and V for NV12 format
-    UV = np.empty((U.shape[0], U.shape[1] * 2), dtype=np.uint8)
-    UV[:, 0::2] = U
-    UV[:, 1::2] = V
+    def stats(self):
+        """Encoder, frames written and pending bytes, e.g. for
+        session_metadata.json."""
+        return {
+            "encoder": self.encoder_name,
+            "frames_written": self.frames_written.value,
+            "pending_bytes": self.pending_bytes,
+            "peak_pending_bytes": self.peak_pending_bytes,
+        }
 
-    # Stack Y and UV to create the NV12 format
-    nv12 = np.vstack((Y, UV))
-
-    return nv12
+    def close(self):
+        # indicate that no more data will be written
+        if self.video_encoder is not None:
+            self.video_encoder.close()
+            self._peak_pending_bytes.value = max(
+                self._peak_pending_bytes.value, self.video_encoder.peak_pending_bytes
+            )
+            self._pending_bytes.value = 0
+        logging.log(logging.DEBUG, f"Writer pipe closed ({self.camera_name})")